@@ -9,19 +9,37 @@ https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
 
 import os
 
+from core.utils.provider_registry_utils import StartupTimer, get_provider_registry, get_warmup_providers
+
+startup = StartupTimer()
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+
 from django.core.asgi import get_asgi_application
+
+# Django is set up before the routes are imported, the consumers need the app registry
+with startup.phase("django_setup"):
+    django_asgi_app = get_asgi_application()
+
+from django.urls import get_resolver
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack
-import call_transcriber.routing 
 
+with startup.phase("routes"):
+    import call_transcriber.routing
+    # Imports the views now rather than on the first request
+    get_resolver().url_patterns
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+with startup.phase("warmup"):
+    get_provider_registry().warmup(get_warmup_providers())
 
 application = ProtocolTypeRouter({
-    'http':get_asgi_application(),
+    'http':django_asgi_app,
     'websocket':AuthMiddlewareStack(
         URLRouter(
             call_transcriber.routing.websocket_urlpatterns
         )
     )
 })
+
+startup.log()
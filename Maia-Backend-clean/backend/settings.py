@@ -73,6 +73,7 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    'core.middleware.RequestTracingMiddleware',
 ]
 
 CORS_ALLOW_ALL_ORIGINS = True
@@ -198,15 +199,30 @@ else:
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
+    'filters': {
+        'trace_id': {
+            '()': 'core.utils.metrics_utils.TraceIdFilter',
+        },
+    },
+    'formatters': {
+        'traced': {
+            'format': '{asctime} {levelname} [{trace_id}] {message}',
+            'style': '{',
+        },
+    },
     'handlers': {
         'file': {
             'level': 'DEBUG',
             'class': 'logging.FileHandler',
             'filename': LOG_PATH,
+            'filters': ['trace_id'],
+            'formatter': 'traced',
         },
         'console': {
             'level': 'INFO',
             'class': 'logging.StreamHandler',
+            'filters': ['trace_id'],
+            'formatter': 'traced',
         },
     },
     'loggers': {
@@ -216,4 +232,8 @@ LOGGING = {
             'propagate': True,
         },
     },
-}
\ No newline at end of file
+}
+# Backends behind core.utils.openai_utils and core.utils.opensearch_utils. "fake" and "memory" swap
+# OpenAI and OpenSearch for deterministic local stand-ins, so the stack can be benchmarked offline.
+AI_PROVIDER = os.getenv('AI_PROVIDER', 'openai')
+VECTOR_STORE_PROVIDER = os.getenv('VECTOR_STORE_PROVIDER', 'opensearch')
@@ -5,6 +5,7 @@ from response_generator import urls as response_generator_urls
 from query_classifier import urls as query_classifier_urls
 from customer_profiler import urls as customer_profiler_urls
 from core import urls as core_urls
+from core.views import metrics
 from account import urls as account_urls
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
@@ -31,6 +32,7 @@ urlpatterns = [
     path('api/', include(query_classifier_urls)),
     path('api/', include(core_urls)),
     path('api/', include(account_urls)),
+    path('metrics', metrics, name='metrics'),
     
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc')
@@ -1,24 +1,25 @@
 from channels.generic.websocket import AsyncWebsocketConsumer
-from core.utils.openai_utils import get_transcription
-from .services.openai_service import do_speaker_diarization
-from response_generator.services.chat_service import chat
-from pydub import AudioSegment, silence
+from core.utils.openai_utils import aget_transcription, WHISPER_PROMPT_CONTEXT_CHARS
+from .services.openai_service import ado_speaker_diarization, ado_incremental_speaker_diarization
+from .utils.audio_utils import SilenceSegmenter, VoiceActivityDetector, WavBuffer
+from response_generator.services.chat_service import astream_chat
+from core.utils.metrics_utils import new_trace_id, set_trace_id, set_endpoint
 from typing import List, Dict, Any, Optional
 from collections import deque
-import numpy as np
 import os
 import json
-import wave
 import logging
 import asyncio
-import uuid
 
 logger = logging.getLogger('django')
 
-ENERGY_THRESHOLD = 50
 SAMPLE_WIDTH = 2
 CHANNELS = 1
 RATE = 16000
+TRANSCRIPTION_MODE = os.getenv("TRANSCRIPTION_MODE", "incremental")
+DIARIZATION_CONTEXT_TURNS = 6
+MAX_CONCURRENT_REQUESTS = int(os.getenv("CONSUMER_MAX_CONCURRENT_REQUESTS", "2"))
+WEBSOCKET_ENDPOINT = "ws/socket-server/"
 
 class Transcript:
     def __init__(self):
@@ -38,6 +39,36 @@ class Transcript:
 
             self.transcript_dict.append({"role": curr_speaker, "content": speaker_content})
 
+    def append_turns(self, turns: List[Dict[str, str]]) -> int:
+        """Appends newly finalized turns and returns the index of the first turn that changed."""
+        start_index = len(self.transcript_dict)
+        for turn in turns:
+            if self.transcript_dict and self.transcript_dict[-1]["role"] == turn["role"]:
+                # The speaker carried on across a segment boundary
+                self.transcript_dict[-1]["content"] = f'{self.transcript_dict[-1]["content"]} {turn["content"]}'
+                start_index = min(start_index, len(self.transcript_dict) - 1)
+            else:
+                self.transcript_dict.append(dict(turn))
+        return start_index
+
+    def get_recent_turns(self, count: int) -> List[Dict[str, Any]]:
+        recent_turns = []
+        for turn in reversed(self.transcript_dict):
+            if len(recent_turns) == count:
+                break
+            if turn["role"] != "suggestion":
+                recent_turns.append(turn)
+        return recent_turns[::-1]
+
+    def get_recent_text(self, max_chars: int) -> str:
+        recent_text = ""
+        for turn in reversed(self.transcript_dict):
+            if len(recent_text) >= max_chars:
+                break
+            if turn["role"] != "suggestion":
+                recent_text = f'{turn["content"]} {recent_text}'
+        return recent_text[-max_chars:].strip()
+
     def add_suggestion(self, suggestion: str) -> None:
         self.transcript_dict.append({"role": "suggestion", "content": suggestion})
 
@@ -50,15 +81,50 @@ class AudioConsumer(AsyncWebsocketConsumer):
         self.audio_chunks = deque()
         self.transcript = Transcript()
         self.processing = False
+        self.incremental = TRANSCRIPTION_MODE == "incremental"
+        self.segmenter = SilenceSegmenter()
+        # Running VAD for full mode, fed only the audio that arrived since the last check
+        self.vad = VoiceActivityDetector()
+        self.analysed_bytes = 0
+        # Caps the OpenAI and Opensearch requests a single call can have in flight
+        self.request_limit = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+        self.tasks = set()
+        self.poll_task: Optional[asyncio.Task] = None
+        self.closing = False
 
     async def connect(self) -> None:
+        # The whole call shares one trace ID, tasks started from here inherit it
+        set_trace_id(new_trace_id())
+        set_endpoint(WEBSOCKET_ENDPOINT)
         await self.accept()
         logger.info("WebSocket connection established.")
-        asyncio.create_task(self.process_audio_chunks())
+        self.poll_task = self.start_task(self.process_audio_chunks())
 
     async def disconnect(self, close_code: str) -> None:
+        self.closing = True
+        if self.poll_task is not None:
+            # A segment that is being transcribed is finished first, so the transcript stays in order
+            if not self.processing:
+                self.poll_task.cancel()
+            await asyncio.gather(self.poll_task, return_exceptions=True)
+
+        if self.incremental:
+            # The last utterance has no trailing pause to cut it when the call ends mid-sentence
+            try:
+                await self.process_new_audio(flush=True)
+            except Exception as e:
+                logger.error(f"Error transcribing the end of the call: {e}")
+
+        for task in list(self.tasks):
+            task.cancel()
         logger.info(f"WebSocket disconnected with close code: {close_code}")
 
+    def start_task(self, coroutine) -> asyncio.Task:
+        task = asyncio.create_task(coroutine)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
     async def receive(self, text_data: Optional[str] = None, bytes_data: Optional[bytes] = None) -> None:
         if bytes_data:
             self.audio_chunks.append(bytes_data)
@@ -67,20 +133,42 @@ class AudioConsumer(AsyncWebsocketConsumer):
             try:
                 data = json.loads(text_data)
                 if data.get("type") == "suggestion_request":
-                    self.audio_chunks.clear()
-                    suggestion = chat(chat_history=data["transcript"], call_assistant=True)
-                    self.transcript.add_suggestion(suggestion)
-                    await self.send_transcript(self.transcript.get_transcript())
+                    if not self.incremental:
+                        self.audio_chunks.clear()
+                        self.vad.reset()
+                        self.analysed_bytes = 0
+                    self.start_task(self.send_suggestion(data["transcript"]))
             except json.JSONDecodeError as e:
                 logger.error(f"JSON decode error: {e}")
             except Exception as e:
                 logger.error(f"Error handling text data: {e}")
 
+    async def send_suggestion(self, chat_history: List[Dict[str, Any]]) -> None:
+        # Runs in its own task, so suggestions are measured apart from transcription
+        set_endpoint(f"{WEBSOCKET_ENDPOINT}suggestion")
+        try:
+            suggestion = []
+            async with self.request_limit:
+                # Tokens are forwarded as suggestion_token messages while the suggestion is generated
+                async for event in astream_chat(chat_history=chat_history, call_assistant=True):
+                    if event["type"] == "token":
+                        suggestion.append(event["content"])
+                    await self.send_suggestion_event(event)
+            self.transcript.add_suggestion("".join(suggestion))
+            await self.send_transcript(self.transcript.get_transcript())
+        except Exception as e:
+            logger.error(f"Error generating suggestion: {e}")
+
     async def process_audio_chunks(self) -> None:
-        while True:
+        while not self.closing:
             await asyncio.sleep(1)
             if self.audio_chunks and not self.processing:
                 self.processing = True
+                if self.incremental:
+                    await self.process_new_audio()
+                    self.processing = False
+                    continue
+
                 combined_audio = b''.join(self.audio_chunks)
                 
                 if len(combined_audio) >= RATE * SAMPLE_WIDTH * CHANNELS * 0.1:
@@ -95,49 +183,61 @@ class AudioConsumer(AsyncWebsocketConsumer):
 
                 self.processing = False
 
-    def is_meaningful_audio(self, audio_data: bytes) -> bool:
-        audio_segment = AudioSegment(
-            data=audio_data,
-            sample_width=SAMPLE_WIDTH,
-            frame_rate=RATE,
-            channels=CHANNELS
-        )
-        
-        silent_ranges = silence.detect_silence(audio_segment, min_silence_len=1000, silence_thresh=-40)
-        if len(silent_ranges) == 1 and silent_ranges[0][0] == 0 and silent_ranges[0][1] == len(audio_segment):
-            return False
+    async def process_new_audio(self, flush: bool = False) -> None:
+        new_audio = bytearray()
+        while self.audio_chunks:
+            new_audio.extend(self.audio_chunks.popleft())
 
-        audio_array = np.frombuffer(audio_data, dtype=np.int16)
-        energy = np.sum(audio_array**2) / len(audio_array)
-        if energy < ENERGY_THRESHOLD:
-            return False
+        segments = self.segmenter.add_audio(bytes(new_audio))
+        if flush:
+            segments += self.segmenter.flush()
 
-        return True
+        for segment in segments:
+            # Segments are cut around detected speech, so only very short ones need skipping
+            if len(segment) < RATE * SAMPLE_WIDTH * CHANNELS * 0.1:
+                continue
 
-    async def process_audio_chunk(self, audio_data: bytes) -> str:
-        wav_filename = f'temp_audio_{uuid.uuid4()}.wav'
-        
-        with wave.open(wav_filename, 'wb') as wf:
-            wf.setnchannels(CHANNELS)
-            wf.setsampwidth(SAMPLE_WIDTH)
-            wf.setframerate(RATE)
-            wf.writeframes(audio_data)
+            turns = await self.process_audio_segment(segment)
+            start_index = self.transcript.append_turns(turns)
+            transcript = self.transcript.get_transcript()
+            await self.send_transcript_delta(start_index, transcript[start_index:])
+            # Full transcript is still sent for clients that do not apply deltas
+            await self.send_transcript(transcript)
 
-        transcription = get_transcription(wav_filename)
-        transcription_with_speakers = do_speaker_diarization(transcription)
+    def is_meaningful_audio(self, audio_data: bytes) -> bool:
+        # audio_data only ever grows between resets, so just the unseen tail is analysed
+        self.vad.process(audio_data[self.analysed_bytes:])
+        self.analysed_bytes = len(audio_data)
+        return self.vad.speech_frames >= self.vad.min_speech_frames
 
-        attempts = 0
-        while attempts < 3:
-            try:
-                os.remove(wav_filename)
-                break 
-            except PermissionError:
-                attempts += 1
-                logger.error(f"Error removing file, attempt {attempts}: {wav_filename} is in use. Retrying...")
-                await asyncio.sleep(1)
+    async def process_audio_chunk(self, audio_data: bytes) -> str:
+        async with self.request_limit:
+            transcription = await aget_transcription(WavBuffer(audio_data))
+            transcription_with_speakers = await ado_speaker_diarization(transcription)
 
         return transcription_with_speakers
 
+    async def process_audio_segment(self, audio_data: bytes) -> List[Dict[str, str]]:
+        async with self.request_limit:
+            transcription = await aget_transcription(WavBuffer(audio_data), previous_transcript=self.transcript.get_recent_text(WHISPER_PROMPT_CONTEXT_CHARS))
+
+        async with self.request_limit:
+            return await ado_incremental_speaker_diarization(transcription, self.transcript.get_recent_turns(DIARIZATION_CONTEXT_TURNS))
+
+    async def send_transcript_delta(self, start_index: int, turns: List[Dict[str, Any]]) -> None:
+        try:
+            await self.send(text_data=json.dumps({
+                'type': 'transcript_delta',
+                'start_index': start_index,
+                'message': turns
+            }))
+        except Exception as e:
+            logger.error(f"Error sending transcription delta: {e}")
+            await self.close()
+
+    async def send_suggestion_event(self, event: Dict[str, Any]) -> None:
+        message = {key: value for key, value in event.items() if key != "type"}
+        await self.send(text_data=json.dumps({'type': f'suggestion_{event["type"]}', **message}))
 
     async def send_transcript(self, transcription: str) -> None:
         try:
@@ -1,11 +1,13 @@
 from langchain_core.prompts import ChatPromptTemplate
 from core.utils.openai_utils import get_openai_llm_client
+from core.utils.metrics_utils import track_stage
+from typing import List, Dict, Any, Optional
 import logging
 
 logger = logging.getLogger('django')
 
-def do_speaker_diarization(transcript: str) -> str:
-    prompt = ChatPromptTemplate.from_messages(
+def get_diarization_prompt() -> ChatPromptTemplate:
+    return ChatPromptTemplate.from_messages(
         [
             (
                 "system",
@@ -21,16 +23,105 @@ def do_speaker_diarization(transcript: str) -> str:
             ("human", "TRANSCRIPT: {transcript}"),
         ]
     )
+
+
+def do_speaker_diarization(transcript: str) -> str:
+    chain = get_diarization_prompt() | get_openai_llm_client()
     
-    llm = get_openai_llm_client()
-    chain = prompt | llm
-    
-    response = chain.invoke(
-        {
-            "transcript": transcript,
-        }
-    )
+    with track_stage("diarization", transcript) as tracker:
+        response = chain.invoke(
+            {
+                "transcript": transcript,
+            }
+        )
+        tracker.record_usage(response.usage_metadata)
     
     transcript_with_speakers = response.content
     logger.info("Speaker diarization completed by OpenAI")
     return transcript_with_speakers
+
+
+async def ado_speaker_diarization(transcript: str) -> str:
+    chain = get_diarization_prompt() | get_openai_llm_client()
+
+    with track_stage("diarization", transcript) as tracker:
+        response = await chain.ainvoke(
+            {
+                "transcript": transcript,
+            }
+        )
+        tracker.record_usage(response.usage_metadata)
+
+    transcript_with_speakers = response.content
+    logger.info("Speaker diarization completed by OpenAI")
+    return transcript_with_speakers
+
+
+def get_incremental_diarization_prompt() -> ChatPromptTemplate:
+    return ChatPromptTemplate.from_messages(
+        [
+            (
+                "system",
+                """
+                You will be given the most recent turns of a conversation between a customer service representative (agent) and a caller, followed by a NEW_SEGMENT of transcription that continues the conversation. Perform speaker diarization on the NEW_SEGMENT only. Return each utterance prefixed with `agent:` or `caller:` and delimit utterances by `|`. If there are no previous turns, you may assume that the agent speaks first. Use the content from NEW_SEGMENT only, do not add extra content or repeat the previous turns. The segment may be cut off, do not try to complete it.
+                
+                Example response:
+                agent: Sure, what question do you have? | caller: I would like to ask about NS Pay.
+                
+                If the NEW_SEGMENT is empty, return an empty string.
+                """,
+            ),
+            ("human", "PREVIOUS_TURNS: {previous_turns}\nNEW_SEGMENT: {transcript}"),
+        ]
+    )
+
+
+def do_incremental_speaker_diarization(transcript: str, previous_turns: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    chain = get_incremental_diarization_prompt() | get_openai_llm_client()
+
+    inputs = {
+        "previous_turns": "\n".join(f"{turn['role']}: {turn['content']}" for turn in previous_turns),
+        "transcript": transcript,
+    }
+    with track_stage("diarization", list(inputs.values())) as tracker:
+        response = chain.invoke(inputs)
+        tracker.record_usage(response.usage_metadata)
+
+    turns = parse_diarized_turns(response.content, previous_turns[-1]["role"] if previous_turns else None)
+    logger.info("Incremental speaker diarization completed by OpenAI")
+    return turns
+
+
+async def ado_incremental_speaker_diarization(transcript: str, previous_turns: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    chain = get_incremental_diarization_prompt() | get_openai_llm_client()
+
+    inputs = {
+        "previous_turns": "\n".join(f"{turn['role']}: {turn['content']}" for turn in previous_turns),
+        "transcript": transcript,
+    }
+    with track_stage("diarization", list(inputs.values())) as tracker:
+        response = await chain.ainvoke(inputs)
+        tracker.record_usage(response.usage_metadata)
+
+    turns = parse_diarized_turns(response.content, previous_turns[-1]["role"] if previous_turns else None)
+    logger.info("Incremental speaker diarization completed by OpenAI")
+    return turns
+
+
+def parse_diarized_turns(transcript_with_speakers: str, last_role: Optional[str] = None) -> List[Dict[str, str]]:
+    turns = []
+    for utterance in transcript_with_speakers.split("|"):
+        role, separator, content = utterance.partition(":")
+        role = role.strip().lower()
+
+        if not separator or role not in ("agent", "caller"):
+            # Fall back to alternating speakers when the model leaves out a label
+            content = utterance
+            role = "caller" if last_role == "agent" else "agent"
+
+        content = content.strip()
+        if content:
+            turns.append({"role": role, "content": content})
+            last_role = role
+
+    return turns
@@ -0,0 +1,231 @@
+from typing import List, Optional, Tuple, Union
+import numpy as np
+import logging
+import struct
+import io
+
+logger = logging.getLogger('django')
+
+SAMPLE_WIDTH = 2
+CHANNELS = 1
+RATE = 16000
+BYTES_PER_MS = RATE * SAMPLE_WIDTH * CHANNELS // 1000
+
+SpeechSegment = Tuple[int, int]
+
+
+class VoiceActivityDetector:
+    """
+    Frame-based voice activity detector over 16-bit mono PCM.
+
+    Audio is split into fixed frames and the RMS level of every frame is computed in one vectorized
+    pass. State is carried across calls, so a live stream can be fed chunk by chunk and each sample
+    is analysed exactly once. Boundaries are reported in milliseconds from the start of the stream.
+    """
+
+    def __init__(self, frame_ms: int = 20, silence_thresh: int = -40, min_silence_len: int = 700, min_speech_len: int = 60):
+        self.frame_ms = frame_ms
+        self.frame_bytes = frame_ms * BYTES_PER_MS
+        # dBFS threshold converted to a squared 16-bit amplitude, so frames never need a sqrt or log
+        self.threshold = (32768 * 10 ** (silence_thresh / 20)) ** 2
+        self.min_silence_frames = max(1, min_silence_len // frame_ms)
+        self.min_speech_frames = max(1, min_speech_len // frame_ms)
+        self.reset()
+
+    def reset(self) -> None:
+        self._remainder = b''
+        self.frames_processed = 0
+        self.speech_frames = 0
+        self.speech_start = None
+        self.silence_frames = 0
+
+    @property
+    def position_ms(self) -> int:
+        return self.frames_processed * self.frame_ms
+
+    @property
+    def in_speech(self) -> bool:
+        return self.speech_start is not None
+
+    @property
+    def current_speech_start_ms(self) -> int:
+        return self.speech_start * self.frame_ms if self.in_speech else -1
+
+    def get_frame_speech(self, audio_data: bytes) -> np.ndarray:
+        samples = np.frombuffer(audio_data, dtype='<i2')
+        frame_samples = self.frame_bytes // SAMPLE_WIDTH
+        # Reshaping a contiguous buffer yields a strided view, one row per frame, without copying
+        frames = samples[:len(samples) // frame_samples * frame_samples].reshape(-1, frame_samples)
+        mean_square = np.einsum('ij,ij->i', frames, frames, dtype=np.float64) / frame_samples
+        return mean_square >= self.threshold
+
+    def process(self, audio_data: bytes) -> List[SpeechSegment]:
+        """Analyses new audio and returns the speech segments that ended within it."""
+        data = self._remainder + audio_data
+        usable = len(data) // self.frame_bytes * self.frame_bytes
+        self._remainder = data[usable:]
+        if not usable:
+            return []
+
+        is_speech = self.get_frame_speech(data[:usable])
+        first_frame = self.frames_processed
+        self.frames_processed += len(is_speech)
+
+        # Walk runs of identical frames rather than individual frames
+        run_starts = np.flatnonzero(np.diff(is_speech.astype(np.int8))) + 1
+        run_bounds = zip(np.concatenate(([0], run_starts)), np.concatenate((run_starts, [len(is_speech)])))
+
+        segments = []
+        for run_start, run_end in run_bounds:
+            run_length = int(run_end - run_start)
+            if is_speech[run_start]:
+                if self.speech_start is None:
+                    self.speech_start = first_frame + int(run_start)
+                self.speech_frames += run_length
+                self.silence_frames = 0
+            elif self.speech_start is not None:
+                self.silence_frames += run_length
+                if self.silence_frames >= self.min_silence_frames:
+                    segment = self._end_speech(first_frame + int(run_start) + run_length - self.silence_frames)
+                    if segment:
+                        segments.append(segment)
+
+        return segments
+
+    def flush(self) -> List[SpeechSegment]:
+        """Closes any speech still in progress at the end of the stream."""
+        if self.speech_start is None:
+            return []
+        segment = self._end_speech(self.frames_processed - self.silence_frames)
+        return [segment] if segment else []
+
+    def _end_speech(self, end_frame: int) -> Optional[SpeechSegment]:
+        start_frame = self.speech_start
+        self.speech_start = None
+        self.silence_frames = 0
+        if end_frame - start_frame < self.min_speech_frames:
+            # Too short to be speech, most likely a click or line noise
+            return None
+        return start_frame * self.frame_ms, end_frame * self.frame_ms
+
+
+def detect_speech(audio_data: bytes, **kwargs) -> List[SpeechSegment]:
+    vad = VoiceActivityDetector(**kwargs)
+    return vad.process(audio_data) + vad.flush()
+
+
+class SilenceSegmenter:
+    """
+    Buffers incoming PCM audio and cuts it into segments at silence boundaries.
+
+    Each chunk is passed through a running `VoiceActivityDetector` once, and only the audio since the
+    last cut is kept, so the work per chunk does not grow with the length of the call.
+    """
+
+    def __init__(self, min_silence_len: int = 700, silence_thresh: int = -40, max_segment_ms: int = 15000):
+        self.min_silence_len = min_silence_len
+        self.max_segment_ms = max_segment_ms
+        self.vad = VoiceActivityDetector(silence_thresh=silence_thresh, min_silence_len=min_silence_len)
+        self.buffer = bytearray()
+        # Stream position, in bytes, of the first byte in the buffer
+        self.buffer_offset = 0
+
+    def add_audio(self, audio_data: bytes) -> List[bytes]:
+        self.buffer.extend(audio_data)
+        segments = []
+
+        # Cut in the middle of the pause that ended each utterance
+        for _, speech_end in self.vad.process(audio_data):
+            segments.append(self._cut_at_ms(speech_end + self.min_silence_len // 2))
+
+        if not self.vad.in_speech:
+            if not segments:
+                # Nothing but silence since the last cut, keep only a short lead-in for the next utterance
+                self._drop_before_ms(self.vad.position_ms - self.min_silence_len)
+        elif len(self.buffer) // BYTES_PER_MS >= self.max_segment_ms:
+            logger.info("No pause detected, cutting audio segment at maximum length")
+            segments.append(self._cut(len(self.buffer)))
+
+        return segments
+
+    def flush(self) -> List[bytes]:
+        if not self.vad.flush():
+            # Whatever is left is silence kept as lead-in
+            self._cut(len(self.buffer))
+            return []
+        return [self._cut(len(self.buffer))]
+
+    def _cut_at_ms(self, position_ms: int) -> bytes:
+        return self._cut(max(0, position_ms * BYTES_PER_MS - self.buffer_offset))
+
+    def _drop_before_ms(self, position_ms: int) -> None:
+        offset = position_ms * BYTES_PER_MS - self.buffer_offset
+        if offset > 0:
+            del self.buffer[:offset]
+            self.buffer_offset += offset
+
+    def _cut(self, offset: int) -> bytes:
+        segment = bytes(self.buffer[:offset])
+        del self.buffer[:offset]
+        self.buffer_offset += len(segment)
+        return segment
+
+
+def build_wav_header(data_length: int, rate: int = RATE, channels: int = CHANNELS, sample_width: int = SAMPLE_WIDTH) -> bytes:
+    return struct.pack(
+        '<4sI4s4sIHHIIHH4sI',
+        b'RIFF', 36 + data_length, b'WAVE',
+        b'fmt ', 16, 1, channels, rate, rate * channels * sample_width, channels * sample_width, sample_width * 8,
+        b'data', data_length
+    )
+
+
+class WavBuffer(io.RawIOBase):
+    """
+    Read-only, in-memory WAV file over a PCM buffer.
+
+    The header is generated up front and the samples are read through a memoryview of the caller's
+    buffer, so the audio is never copied into a second buffer or written to disk.
+    """
+
+    def __init__(self, pcm_data: Union[bytes, bytearray, memoryview], name: str = "audio.wav"):
+        super().__init__()
+        self.name = name
+        self._pcm = memoryview(pcm_data).cast('B')
+        self._header = build_wav_header(len(self._pcm))
+        self._size = len(self._header) + len(self._pcm)
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self._size
+        self._position = max(0, min(offset, self._size))
+        return self._position
+
+    def readinto(self, buffer) -> int:
+        target = memoryview(buffer).cast('B')
+        header_length = len(self._header)
+        written = 0
+
+        while written < len(target) and self._position < self._size:
+            if self._position < header_length:
+                source, start = self._header, self._position
+            else:
+                source, start = self._pcm, self._position - header_length
+            count = min(len(target) - written, len(source) - start)
+            target[written:written + count] = source[start:start + count]
+            written += count
+            self._position += count
+
+        return written
@@ -4,3 +4,15 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        # Components keep their own statistics, these read them whenever /metrics is scraped
+        from core.utils.opensearch_utils import register_pool_metrics
+        from core.utils.embedding_cache_utils import register_embedding_cache_metrics
+        from core.utils.query_planner_utils import register_query_planner_metrics
+        from core.utils.semantic_cache_utils import register_semantic_cache_metrics
+
+        register_pool_metrics()
+        register_embedding_cache_metrics()
+        register_query_planner_metrics()
+        register_semantic_cache_metrics()
@@ -0,0 +1,156 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from core.utils.provider_registry_utils import get_provider_registry
+from core.utils.benchmark_utils import (
+    BenchmarkRunner, InProcessClient, RemoteClient, compare_results, get_git_commit,
+    run_classify, run_chat, run_chat_stream, run_profile, make_upload_scenario, make_websocket_scenario,
+)
+from datetime import datetime, timezone
+import asyncio
+import json
+import os
+
+HTTP_SCENARIOS = ["classify", "chat", "chat_stream", "profile"]
+SCENARIOS = HTTP_SCENARIOS + ["upload", "websocket"]
+BENCHMARK_USERNAME = "maia-benchmark"
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the text classifier, chat, streaming chat, customer profiler, file upload and call websocket "
+        "paths with concurrent clients, and save p50/p95/p99 latency, throughput and per-stage timings as JSON. "
+        "By default requests are sent to the ASGI application in this process, using the fake OpenAI and in-memory "
+        "vector store providers; users, uploads and ingestion still write to the configured database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenarios', default=",".join(SCENARIOS), help=f'Comma separated scenarios to run, from {", ".join(SCENARIOS)}')
+        parser.add_argument('--requests', type=int, default=50, help='Requests per HTTP scenario')
+        parser.add_argument('--concurrency', type=int, default=4, help='Concurrent clients per scenario')
+        parser.add_argument('--warmup', type=int, default=2, help='Untimed requests before each scenario')
+        parser.add_argument('--uploads', type=int, default=3, help='Files uploaded in the upload scenario')
+        parser.add_argument('--upload-rows', type=int, default=20, help='Question and answer rows per uploaded workbook')
+        parser.add_argument('--sessions', type=int, default=2, help='Calls streamed in the websocket scenario')
+        parser.add_argument('--utterances', type=int, default=3, help='Speech bursts per call')
+        parser.add_argument('--speech-ms', type=int, default=1500, help='Length of each speech burst')
+        parser.add_argument('--silence-ms', type=int, default=1000, help='Silence after each speech burst')
+        parser.add_argument('--audio-speed', type=float, default=1.0, help='Audio is streamed at this multiple of real time')
+        parser.add_argument('--base-url', help='Benchmark a running server, e.g. http://localhost:8000, instead of this process')
+        parser.add_argument('--username', help='User to request a token for when using --base-url')
+        parser.add_argument('--password', help='Password for --username')
+        parser.add_argument('--live-backends', action='store_true', help='Keep the configured OpenAI and OpenSearch providers for in-process runs')
+        parser.add_argument('--no-semantic-cache', action='store_true', help='Disable the semantic response cache for in-process runs')
+        parser.add_argument('--output', help='Path of the JSON results, defaults to benchmark_results/<time>-<commit>.json')
+        parser.add_argument('--compare', help='Earlier JSON results to report relative changes against')
+
+    def handle(self, *args, **options):
+        scenarios = [name.strip() for name in options['scenarios'].split(",") if name.strip()]
+        unknown = [name for name in scenarios if name not in SCENARIOS]
+        if unknown:
+            raise CommandError(f"Unknown scenarios {unknown}, choose from {SCENARIOS}")
+        if options['base_url'] and not (options['username'] and options['password']):
+            raise CommandError("--base-url needs --username and --password")
+
+        if not options['base_url'] and not options['live_backends']:
+            # Clients are created on first use, so the local stand-ins can still be selected here
+            settings.AI_PROVIDER, settings.VECTOR_STORE_PROVIDER = "fake", "memory"
+            get_provider_registry().reset()
+
+        results = asyncio.run(self.run_benchmark(scenarios, options))
+
+        commit = get_git_commit()
+        output = options['output'] or os.path.join("benchmark_results", f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}-{commit or 'unknown'}.json")
+        if options['compare']:
+            with open(options['compare']) as baseline_file:
+                results["comparison"] = compare_results(json.load(baseline_file), results)
+
+        os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+        with open(output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+
+        self.print_summary(results)
+        self.stdout.write(f"Results saved to {output}")
+
+    async def run_benchmark(self, scenarios, options):
+        if options['base_url']:
+            token = await RemoteClient.get_token(options['base_url'], options['username'], options['password'])
+            client = RemoteClient(options['base_url'], token)
+        else:
+            client = InProcessClient(self.get_application(options), await self.get_token())
+
+        runners = {
+            "classify": (run_classify, options['requests']),
+            "chat": (run_chat, options['requests']),
+            "chat_stream": (run_chat_stream, options['requests']),
+            "profile": (run_profile, options['requests']),
+            "upload": (make_upload_scenario(options['upload_rows']), options['uploads']),
+            "websocket": (make_websocket_scenario(options['utterances'], options['speech_ms'], options['silence_ms'], options['audio_speed']), options['sessions']),
+        }
+
+        runner = BenchmarkRunner(client, record_stages=not options['base_url'])
+        results = {
+            "commit": get_git_commit(),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "mode": "remote" if options['base_url'] else "in_process",
+            "target": options['base_url'],
+            "providers": self.get_providers(options),
+            "options": {key: options[key] for key in ("requests", "concurrency", "warmup", "uploads", "upload_rows", "sessions", "utterances", "speech_ms", "silence_ms", "audio_speed", "no_semantic_cache")},
+            "scenarios": {},
+        }
+        try:
+            for name in scenarios:
+                scenario, requests = runners[name]
+                # Uploads and calls are long running, so they are not warmed up
+                warmup = options['warmup'] if name in HTTP_SCENARIOS else 0
+                self.stdout.write(f"Running {name}: {requests} requests, concurrency {options['concurrency']}")
+                results["scenarios"][name] = await runner.run_scenario(name, scenario, requests, options['concurrency'], warmup)
+        finally:
+            await client.close()
+        return results
+
+    def get_application(self, options):
+        from backend.asgi import application
+        if options['no_semantic_cache']:
+            from core.utils.semantic_cache_utils import get_semantic_cache
+            get_semantic_cache().enabled = False
+        return application
+
+    async def get_token(self) -> str:
+        from asgiref.sync import sync_to_async
+        from django.contrib.auth import get_user_model
+        from rest_framework_simplejwt.tokens import AccessToken
+
+        user, _ = await sync_to_async(get_user_model().objects.get_or_create)(username=BENCHMARK_USERNAME)
+        return str(AccessToken.for_user(user))
+
+    def get_providers(self, options):
+        if options['base_url']:
+            return {"ai": "server", "vector_store": "server"}
+
+        providers = {"ai": settings.AI_PROVIDER, "vector_store": settings.VECTOR_STORE_PROVIDER}
+        if settings.AI_PROVIDER == "fake":
+            from core.utils import fake_openai_utils
+            providers["fake_latency_ms"] = {
+                "embedding": fake_openai_utils.FAKE_EMBEDDING_LATENCY_MS,
+                "llm_first_token": fake_openai_utils.FAKE_LLM_LATENCY_MS,
+                "llm_token": fake_openai_utils.FAKE_LLM_TOKEN_LATENCY_MS,
+                "whisper": fake_openai_utils.FAKE_WHISPER_LATENCY_MS,
+            }
+        return providers
+
+    def print_summary(self, results):
+        self.stdout.write(f"{'scenario':<12} {'requests':>8} {'errors':>6} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+        for name, scenario in results["scenarios"].items():
+            latency = scenario["latency_ms"]
+            self.stdout.write(
+                f"{name:<12} {scenario['requests']:>8} {scenario['errors']:>6} {scenario['throughput_rps']:>8} "
+                f"{latency.get('p50', '-'):>9} {latency.get('p95', '-'):>9} {latency.get('p99', '-'):>9}"
+            )
+            for metric, values in scenario["metrics"].items():
+                self.stdout.write(f"  {metric}: p50 {values.get('p50', '-')} ms, p95 {values.get('p95', '-')} ms")
+            for graph, stages in scenario["stages"].items():
+                slowest = sorted(stages["stages"].items(), key=lambda item: item[1].get("p50", 0), reverse=True)[:4]
+                self.stdout.write(f"  {graph} critical path p50 {stages['critical_path_ms'].get('p50')} ms; " + ", ".join(f"{stage} {values.get('p50')} ms" for stage, values in slowest))
+
+        for name, change in results.get("comparison", {}).items():
+            self.stdout.write(f"{name} vs baseline: " + ", ".join(f"{key} {value:+.1f}%" for key, value in change.items() if value is not None))
@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import get_resolver
+from core.utils.provider_registry_utils import StartupTimer, get_provider_registry
+import json
+
+
+class Command(BaseCommand):
+    help = (
+        "Import the application and load the models and API clients in the provider registry, then report how long "
+        "each took. Use it to check that a build can load its models before it takes traffic; to warm up the server "
+        "workers themselves, set PROVIDER_WARMUP."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--providers', help='Comma separated providers to load, defaults to all of them')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+
+    def handle(self, *args, **options):
+        startup = StartupTimer()
+        with startup.phase("routes"):
+            # Providers are registered by the modules that use them, which the URL and websocket routes import
+            get_resolver().url_patterns
+            import call_transcriber.routing  # noqa: F401
+
+        registry = get_provider_registry()
+        names = [name.strip() for name in options['providers'].split(",") if name.strip()] if options['providers'] else registry.names()
+        unknown = [name for name in names if name not in registry.names()]
+        if unknown:
+            raise CommandError(f"Unknown providers {unknown}, choose from {registry.names()}")
+
+        with startup.phase("warmup"):
+            registry.warmup(names)
+        report = startup.get_report()
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.print_report(report)
+
+        failed = [name for name, provider in report["providers"].items() if provider.get("error")]
+        if failed:
+            raise CommandError(f"Providers failed to load: {', '.join(failed)}")
+
+    def print_report(self, report):
+        self.stdout.write(f"{'provider':<22} {'loaded':>6} {'init ms':>9} {'warmup ms':>10}")
+        for name, provider in report["providers"].items():
+            init_ms = '-' if provider['init_ms'] is None else provider['init_ms']
+            warmup_ms = '-' if provider['warmup_ms'] is None else provider['warmup_ms']
+            self.stdout.write(f"{name:<22} {str(provider['loaded']):>6} {init_ms:>9} {warmup_ms:>10}")
+            if provider.get("error"):
+                self.stdout.write(f"  error: {provider['error']}")
+        phases = ", ".join(f"{name} {ms} ms" for name, ms in report["phases_ms"].items())
+        self.stdout.write(f"Total {report['total_ms']} ms ({phases}), max RSS {report['max_rss_mb']} MB")
@@ -0,0 +1,67 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from core.utils.metrics_utils import get_metrics_registry, new_trace_id, set_trace_id, set_endpoint, trace_id_var, endpoint_var, METRICS_ENABLED
+import time
+import re
+
+TRACE_ID_HEADER = "X-Trace-ID"
+TRACE_ID_PATTERN = re.compile(r"^[A-Za-z0-9-]{1,64}$")
+
+
+class RequestTracingMiddleware:
+    """
+    Gives each request a trace ID, taken from the `X-Trace-ID` header when the caller sends one, that is
+    added to its log lines and returned in the response, and records request counts and durations by
+    endpoint. Endpoints are labelled by URL pattern, e.g. `api/jobs/<int:pk>/`.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        start_time = self.start(request)
+        response = self.get_response(request)
+        return self.finish(request, response, start_time)
+
+    async def __acall__(self, request):
+        start_time = self.start(request)
+        response = await self.get_response(request)
+        return self.finish(request, response, start_time)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        set_endpoint(self.get_endpoint(request))
+        return None
+
+    def start(self, request) -> float:
+        trace_id = request.headers.get(TRACE_ID_HEADER, "")
+        request.trace_id = trace_id if TRACE_ID_PATTERN.match(trace_id) else new_trace_id()
+        # Restored once the response is ready, so a worker thread does not carry them into its next request
+        request._tracing_tokens = (set_trace_id(request.trace_id), set_endpoint("unmatched"))
+        return time.perf_counter()
+
+    def finish(self, request, response, start_time: float):
+        # Streaming responses are timed until their headers are ready, not until the last event is sent
+        response[TRACE_ID_HEADER] = request.trace_id
+        if METRICS_ENABLED:
+            endpoint = self.get_endpoint(request)
+            registry = get_metrics_registry()
+            registry.http_requests.inc(endpoint, request.method, str(response.status_code))
+            registry.http_duration.observe(time.perf_counter() - start_time, endpoint, request.method)
+
+        if not response.streaming:
+            # A streamed body is generated after this returns and still needs the request's trace ID
+            trace_id_token, endpoint_token = request._tracing_tokens
+            trace_id_var.reset(trace_id_token)
+            endpoint_var.reset(endpoint_token)
+        return response
+
+    def get_endpoint(self, request) -> str:
+        resolver_match = getattr(request, "resolver_match", None)
+        return resolver_match.route if resolver_match is not None else "unmatched"
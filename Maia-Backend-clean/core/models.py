@@ -30,6 +30,21 @@ class KbEmbedding(models.Model):
     def __str__(self):
         return str(self.id)
 
+class EmbeddingCacheEntry(models.Model):
+    model = models.CharField(max_length=100)
+    dimensions = models.IntegerField()
+    text_hash = models.CharField(max_length=64) # sha256 of the embedded text
+    vector = models.BinaryField() # float32 little-endian
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        db_table = 'embedding_cache'
+        unique_together = ('model', 'dimensions', 'text_hash')
+
+    def __str__(self):
+        return f'{self.model}/{self.dimensions} {self.text_hash}'
+
 class Customer(models.Model):
     first_name = models.CharField(max_length=50)
     last_name = models.CharField(max_length=50)
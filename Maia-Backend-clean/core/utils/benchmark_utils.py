@@ -0,0 +1,537 @@
+from core.utils.execution_graph_utils import add_report_listener, remove_report_listener
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import numpy as np
+import subprocess
+import itertools
+import asyncio
+import logging
+import json
+import time
+import io
+
+logger = logging.getLogger('django')
+
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2
+AUDIO_CHUNK_MS = 100
+JOB_POLL_INTERVAL = 0.2
+JOB_TIMEOUT = 300
+WEBSOCKET_TIMEOUT = 60
+
+SAMPLE_CASES = [
+    "Caller John Tan (S1234567D, 91234567) has not received his NS make-up pay for the in-camp training in March.",
+    "Customer asks how to defer enlistment for university studies overseas and which documents are needed.",
+    "Email from mary.lim@example.com: my son's medical review for PES grading was rescheduled twice, please help.",
+    "NSman wants to update his mailing address to Blk 123 Ang Mo Kio Ave 3 #12-345 Singapore 560123.",
+    "Pre-enlistee reports that the OneNS portal shows the wrong date of enlistment after his FRO was issued.",
+    "Caller is unhappy that the IPPT booking page keeps timing out and wants to know if the deadline will be extended.",
+    "Customer asks whether the SAFVC training allowance is taxable and how it appears on the notice of assessment.",
+    "Parent wants to know if her son can travel overseas for two weeks before his full medical examination.",
+]
+
+SAMPLE_QUESTIONS = [
+    "How is NS make-up pay calculated for self-employed NSmen?",
+    "Can I defer my enlistment to finish my polytechnic diploma?",
+    "What should I bring for my full medical examination?",
+    "How do I apply for an exit permit to travel overseas?",
+    "When will I receive my IPPT incentive payment?",
+    "How do I change my mailing address on OneNS?",
+    "What is the difference between an NSF and an NSman?",
+    "Who do I contact if my FRO date clashes with my exams?",
+]
+
+SAMPLE_PROFILES = [
+    {"first_name": "John", "last_name": "Tan", "country_code": "65", "phone_number": "91234567", "email": "john.tan@example.com"},
+    {"first_name": "Mary", "last_name": "Lim", "country_code": "65", "phone_number": "82345678", "email": "mary.lim@example.com"},
+    {"first_name": "Ahmad", "last_name": "Ismail", "country_code": "65", "phone_number": "93456789", "email": "ahmad.ismail@example.com"},
+    {"first_name": "Priya", "last_name": "Raj", "country_code": "65", "phone_number": "84567890", "email": "priya.raj@example.com"},
+]
+
+
+@dataclass
+class HttpResult:
+    status: int
+    chunks: List[Tuple[float, bytes]]
+    started_at: float
+
+    @property
+    def body(self) -> bytes:
+        return b"".join(chunk for _, chunk in self.chunks)
+
+    def json(self) -> Any:
+        return json.loads(self.body)
+
+    @property
+    def first_byte_ms(self) -> Optional[float]:
+        return next(((received_at - self.started_at) * 1000 for received_at, chunk in self.chunks if chunk), None)
+
+
+@dataclass
+class RequestResult:
+    latency_ms: float
+    ok: bool
+    error: Optional[str] = None
+    metrics: Dict[str, List[float]] = field(default_factory=dict)
+
+    def add_metric(self, name: str, value: Optional[float]) -> None:
+        if value is not None:
+            self.metrics.setdefault(name, []).append(value)
+
+
+def summarise(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {"count": 0}
+    array = np.asarray(values, dtype=np.float64)
+    p50, p95, p99 = np.percentile(array, [50, 95, 99])
+    return {
+        "count": len(values),
+        "mean": round(float(array.mean()), 1),
+        "p50": round(float(p50), 1),
+        "p95": round(float(p95), 1),
+        "p99": round(float(p99), 1),
+        "max": round(float(array.max()), 1),
+    }
+
+
+def get_git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+class StageRecorder:
+    """Collects the execution graph reports of the requests served in this process, by graph name."""
+
+    def __init__(self):
+        self.reports: List[Tuple[str, Dict[str, Any]]] = []
+
+    def __call__(self, name: str, report: Dict[str, Any]) -> None:
+        self.reports.append((name, report))
+
+    def start(self) -> None:
+        self.reports = []
+        add_report_listener(self)
+
+    def stop(self) -> None:
+        remove_report_listener(self)
+
+    def summary(self) -> Dict[str, Any]:
+        graphs: Dict[str, Dict[str, List[float]]] = {}
+        for name, report in self.reports:
+            graph = graphs.setdefault(name, {"total_ms": [], "critical_path_ms": [], "stage_sum_ms": []})
+            for key in ("total_ms", "critical_path_ms", "stage_sum_ms"):
+                graph[key].append(report[key])
+            for stage, span in report["stages"].items():
+                graph.setdefault(f"stage:{stage}", []).append(span["end_ms"] - span["start_ms"])
+
+        return {
+            name: {
+                "total_ms": summarise(graph.pop("total_ms")),
+                "critical_path_ms": summarise(graph.pop("critical_path_ms")),
+                "stage_sum_ms": summarise(graph.pop("stage_sum_ms")),
+                "stages": {key.split(":", 1)[1]: summarise(values) for key, values in graph.items()},
+            }
+            for name, graph in graphs.items()
+        }
+
+
+class InProcessWebsocket:
+    def __init__(self, application, path: str):
+        from asgiref.testing import ApplicationCommunicator
+        path = f"/{path.lstrip('/')}"
+        scope = {
+            "type": "websocket",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": b"",
+            "headers": [(b"host", b"localhost")],
+            "subprotocols": [],
+            "client": ("127.0.0.1", 0),
+            "server": ("localhost", 80),
+        }
+        self.communicator = ApplicationCommunicator(application, scope)
+
+    async def connect(self) -> None:
+        await self.communicator.send_input({"type": "websocket.connect"})
+        response = await self.communicator.receive_output(WEBSOCKET_TIMEOUT)
+        if response["type"] != "websocket.accept":
+            raise ConnectionError("Websocket connection rejected")
+
+    async def send_bytes(self, data: bytes) -> None:
+        await self.communicator.send_input({"type": "websocket.receive", "bytes": data})
+
+    async def send_json(self, data: Dict[str, Any]) -> None:
+        await self.communicator.send_input({"type": "websocket.receive", "text": json.dumps(data)})
+
+    async def receive_json(self, timeout: float) -> Dict[str, Any]:
+        message = await self.communicator.receive_output(timeout)
+        if message["type"] != "websocket.send":
+            raise ConnectionError(f"Websocket closed: {message}")
+        return json.loads(message["text"])
+
+    async def close(self) -> None:
+        await self.communicator.send_input({"type": "websocket.disconnect", "code": 1000})
+        try:
+            await self.communicator.wait(1)
+        except asyncio.TimeoutError:
+            pass
+
+
+class InProcessClient:
+    """
+    Calls the project's ASGI application directly, so requests go through the full Django and Channels
+    stack (middleware, authentication, views, consumers) without a server or network in between.
+    """
+
+    def __init__(self, application, token: str):
+        self.application = application
+        self.token = token
+
+    async def request(self, method: str, path: str, json_body: Optional[Dict[str, Any]] = None, form: Optional[Dict[str, Any]] = None) -> HttpResult:
+        headers = [(b"authorization", f"Bearer {self.token}".encode()), (b"host", b"localhost")]
+        body = b""
+        if json_body is not None:
+            body = json.dumps(json_body).encode()
+            headers.append((b"content-type", b"application/json"))
+        elif form is not None:
+            from django.test.client import encode_multipart, BOUNDARY, MULTIPART_CONTENT
+            body = encode_multipart(BOUNDARY, form)
+            headers.append((b"content-type", MULTIPART_CONTENT.encode()))
+        headers.append((b"content-length", str(len(body)).encode()))
+
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": b"",
+            "root_path": "",
+            "headers": headers,
+            "client": ("127.0.0.1", 0),
+            "server": ("localhost", 80),
+        }
+        request_sent = False
+        finished = asyncio.Event()
+        result = HttpResult(0, [], time.perf_counter())
+
+        async def receive() -> Dict[str, Any]:
+            nonlocal request_sent
+            if not request_sent:
+                request_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            await finished.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                result.status = message["status"]
+            elif message["type"] == "http.response.body":
+                result.chunks.append((time.perf_counter(), message.get("body", b"")))
+                if not message.get("more_body", False):
+                    finished.set()
+
+        await self.application(scope, receive, send)
+        finished.set()
+        return result
+
+    def websocket(self, path: str) -> InProcessWebsocket:
+        return InProcessWebsocket(self.application, path)
+
+    async def close(self) -> None:
+        pass
+
+
+class RemoteWebsocket:
+    def __init__(self, session, url: str):
+        self.session = session
+        self.url = url
+        self.connection = None
+
+    async def connect(self) -> None:
+        self.connection = await self.session.ws_connect(self.url)
+
+    async def send_bytes(self, data: bytes) -> None:
+        await self.connection.send_bytes(data)
+
+    async def send_json(self, data: Dict[str, Any]) -> None:
+        await self.connection.send_str(json.dumps(data))
+
+    async def receive_json(self, timeout: float) -> Dict[str, Any]:
+        return json.loads(await self.connection.receive_str(timeout=timeout))
+
+    async def close(self) -> None:
+        if self.connection is not None:
+            await self.connection.close()
+
+
+class RemoteClient:
+    """Sends the same requests over HTTP and websockets to a running server."""
+
+    def __init__(self, base_url: str, token: str):
+        import aiohttp
+        self.base_url = base_url.rstrip("/")
+        self.token = token
+        self.session = aiohttp.ClientSession(headers={"Authorization": f"Bearer {token}"}, timeout=aiohttp.ClientTimeout(total=None))
+
+    @staticmethod
+    async def get_token(base_url: str, username: str, password: str) -> str:
+        import aiohttp
+        async with aiohttp.ClientSession() as session:
+            async with session.post(f"{base_url.rstrip('/')}/api/auth/token/", json={"username": username, "password": password}) as response:
+                response.raise_for_status()
+                return (await response.json())["access"]
+
+    async def request(self, method: str, path: str, json_body: Optional[Dict[str, Any]] = None, form: Optional[Dict[str, Any]] = None) -> HttpResult:
+        import aiohttp
+        data = None
+        if form is not None:
+            data = aiohttp.FormData()
+            for key, value in form.items():
+                if hasattr(value, "read"):
+                    data.add_field(key, value.read(), filename=value.name, content_type=getattr(value, "content_type", None))
+                else:
+                    data.add_field(key, str(value))
+
+        result = HttpResult(0, [], time.perf_counter())
+        async with self.session.request(method, f"{self.base_url}{path}", json=json_body, data=data) as response:
+            result.status = response.status
+            async for chunk in response.content.iter_any():
+                result.chunks.append((time.perf_counter(), chunk))
+        return result
+
+    def websocket(self, path: str) -> RemoteWebsocket:
+        return RemoteWebsocket(self.session, f"{self.base_url.replace('http', 'ws', 1)}/{path.lstrip('/')}")
+
+    async def close(self) -> None:
+        await self.session.close()
+
+
+def check_status(result: HttpResult, expected: int = 200) -> Optional[str]:
+    if result.status != expected:
+        return f"HTTP {result.status}: {result.body[:200].decode('utf-8', 'replace')}"
+    return None
+
+
+async def run_classify(client, index: int) -> RequestResult:
+    result = await client.request("POST", "/api/query/text/", json_body={"case_information": SAMPLE_CASES[index % len(SAMPLE_CASES)]})
+    error = check_status(result)
+    return RequestResult((result.chunks[-1][0] - result.started_at) * 1000, error is None, error)
+
+
+async def run_chat(client, index: int) -> RequestResult:
+    chat_history = [{"role": "user", "content": SAMPLE_QUESTIONS[index % len(SAMPLE_QUESTIONS)]}]
+    result = await client.request("POST", "/api/chat/", json_body={"chat_history": chat_history})
+    error = check_status(result)
+    return RequestResult((result.chunks[-1][0] - result.started_at) * 1000, error is None, error)
+
+
+async def run_chat_stream(client, index: int) -> RequestResult:
+    chat_history = [{"role": "user", "content": SAMPLE_QUESTIONS[index % len(SAMPLE_QUESTIONS)]}]
+    result = await client.request("POST", "/api/chat/stream/", json_body={"chat_history": chat_history})
+    error = check_status(result) or (None if b"event: done" in result.body else "Stream ended without a done event")
+
+    request_result = RequestResult((result.chunks[-1][0] - result.started_at) * 1000, error is None, error)
+    request_result.add_metric("first_byte_ms", result.first_byte_ms)
+    request_result.add_metric("first_token_ms", next(((received_at - result.started_at) * 1000 for received_at, chunk in result.chunks if b"event: token" in chunk), None))
+    return request_result
+
+
+async def run_profile(client, index: int) -> RequestResult:
+    result = await client.request("POST", "/api/profile/", json_body=SAMPLE_PROFILES[index % len(SAMPLE_PROFILES)])
+    error = check_status(result)
+    return RequestResult((result.chunks[-1][0] - result.started_at) * 1000, error is None, error)
+
+
+def build_faq_workbook(rows: int, index: int) -> bytes:
+    from openpyxl import Workbook
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(["Question", "Answer"])
+    for row in range(rows):
+        question = SAMPLE_QUESTIONS[row % len(SAMPLE_QUESTIONS)]
+        sheet.append([f"{question} (benchmark {index}.{row})", f"Answer {row} for benchmark upload {index}: {SAMPLE_CASES[row % len(SAMPLE_CASES)]}"])
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def make_upload_scenario(rows: int) -> Callable[[Any, int], Awaitable[RequestResult]]:
+    async def run_upload(client, index: int) -> RequestResult:
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        upload = SimpleUploadedFile(f"benchmark-{index}.xlsx", build_faq_workbook(rows, index), content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+        result = await client.request("POST", "/api/file/", form={"file": upload, "name": f"benchmark-{index}", "tag": "benchmark"})
+        error = check_status(result, 202)
+        request_result = RequestResult((result.chunks[-1][0] - result.started_at) * 1000, error is None, error)
+        if error:
+            return request_result
+
+        # Upload latency is the time to accept the file; ingestion runs on the workers and is polled to completion
+        job_id = result.json()["job_id"]
+        deadline = result.started_at + JOB_TIMEOUT
+        while time.perf_counter() < deadline:
+            job = (await client.request("GET", f"/api/jobs/{job_id}/")).json()
+            if job["status"] in ("completed", "failed"):
+                request_result.add_metric("ingestion_ms", (time.perf_counter() - result.started_at) * 1000)
+                if job["status"] == "failed":
+                    request_result.ok, request_result.error = False, f"Ingestion failed: {job.get('error')}"
+                return request_result
+            await asyncio.sleep(JOB_POLL_INTERVAL)
+
+        request_result.ok, request_result.error = False, "Ingestion timed out"
+        return request_result
+
+    return run_upload
+
+
+def build_utterance(duration_ms: int, seed: int) -> bytes:
+    # Noise modulated at a syllable rate, loud enough for the voice activity detector to treat as speech
+    samples = duration_ms * SAMPLE_RATE // 1000
+    generator = np.random.default_rng(seed)
+    envelope = 0.6 + 0.4 * np.sin(np.linspace(0, duration_ms / 1000 * 2 * np.pi * 4, samples))
+    audio = generator.normal(0, 6000, samples) * envelope
+    return np.clip(audio, -32768, 32767).astype('<i2').tobytes()
+
+
+def build_silence(duration_ms: int) -> bytes:
+    return bytes(duration_ms * SAMPLE_RATE // 1000 * SAMPLE_WIDTH)
+
+
+def make_websocket_scenario(utterances: int, speech_ms: int, silence_ms: int, speed: float) -> Callable[[Any, int], Awaitable[RequestResult]]:
+    async def run_websocket(client, index: int) -> RequestResult:
+        """
+        Streams a synthetic call of `utterances` speech bursts separated by silence, paced at `speed` times
+        real time, then asks for a suggestion. Each transcript update is timed from the end of the speech it
+        follows; the request latency is the time from the suggestion request to its last token.
+        """
+        websocket = client.websocket("ws/socket-server/")
+        request_result = RequestResult(0.0, True)
+        speech_ends: List[float] = []
+        transcripts: List[Any] = []
+        start_time = time.perf_counter()
+
+        async def receive_transcripts() -> None:
+            while True:
+                message = await websocket.receive_json(timeout=WEBSOCKET_TIMEOUT)
+                if message.get("type") == "transcript":
+                    transcripts.append(message["message"])
+                    if len(transcripts) <= len(speech_ends):
+                        request_result.add_metric("speech_end_to_transcript_ms", (time.perf_counter() - speech_ends[len(transcripts) - 1]) * 1000)
+
+        await websocket.connect()
+        receiver = asyncio.create_task(receive_transcripts())
+        try:
+            for utterance in range(utterances):
+                for part, is_speech in ((build_utterance(speech_ms, index * 1000 + utterance), True), (build_silence(silence_ms), False)):
+                    chunk_size = AUDIO_CHUNK_MS * SAMPLE_RATE // 1000 * SAMPLE_WIDTH
+                    for offset in range(0, len(part), chunk_size):
+                        await websocket.send_bytes(part[offset:offset + chunk_size])
+                        await asyncio.sleep(AUDIO_CHUNK_MS / 1000 / speed)
+                    if is_speech:
+                        speech_ends.append(time.perf_counter())
+
+            deadline = time.perf_counter() + WEBSOCKET_TIMEOUT
+            while len(transcripts) < utterances and time.perf_counter() < deadline and not receiver.done():
+                await asyncio.sleep(0.05)
+            receiver.cancel()
+
+            transcript = transcripts[-1] if transcripts else [{"role": "customer", "content": SAMPLE_QUESTIONS[index % len(SAMPLE_QUESTIONS)]}]
+            suggestion_start = time.perf_counter()
+            await websocket.send_json({"type": "suggestion_request", "transcript": transcript})
+            while True:
+                message = await websocket.receive_json(timeout=WEBSOCKET_TIMEOUT)
+                if message.get("type") == "suggestion_token" and "suggestion_first_token_ms" not in request_result.metrics:
+                    request_result.add_metric("suggestion_first_token_ms", (time.perf_counter() - suggestion_start) * 1000)
+                if message.get("type") == "suggestion_done":
+                    break
+            request_result.latency_ms = (time.perf_counter() - suggestion_start) * 1000
+            request_result.add_metric("session_ms", (time.perf_counter() - start_time) * 1000)
+            if len(transcripts) < utterances:
+                request_result.ok, request_result.error = False, f"{len(transcripts)} of {utterances} transcripts received"
+        finally:
+            receiver.cancel()
+            await websocket.close()
+        return request_result
+
+    return run_websocket
+
+
+class BenchmarkRunner:
+    """
+    Runs each scenario with `concurrency` concurrent workers until `requests` requests have completed,
+    after `warmup` untimed requests, and summarises latency, throughput, extra per-request metrics and,
+    for in-process runs, the execution graph stages of the requests served.
+    """
+
+    def __init__(self, client, record_stages: bool = True):
+        self.client = client
+        self.stage_recorder = StageRecorder() if record_stages else None
+
+    async def run_scenario(self, name: str, scenario: Callable[[Any, int], Awaitable[RequestResult]], requests: int, concurrency: int, warmup: int = 0) -> Dict[str, Any]:
+        for index in range(warmup):
+            await self.run_request(scenario, -index - 1)
+
+        if self.stage_recorder:
+            self.stage_recorder.start()
+        results: List[RequestResult] = []
+        counter = itertools.count()
+
+        async def worker() -> None:
+            while (index := next(counter)) < requests:
+                results.append(await self.run_request(scenario, index))
+
+        start_time = time.perf_counter()
+        try:
+            await asyncio.gather(*[worker() for _ in range(min(concurrency, requests))])
+        finally:
+            if self.stage_recorder:
+                self.stage_recorder.stop()
+        duration = time.perf_counter() - start_time
+
+        metrics: Dict[str, List[float]] = {}
+        for result in results:
+            for metric, values in result.metrics.items():
+                metrics.setdefault(metric, []).extend(values)
+        errors = [result.error for result in results if not result.ok]
+        if errors:
+            logger.error(f"Benchmark scenario {name}: {len(errors)} of {len(results)} requests failed, first error: {errors[0]}")
+
+        return {
+            "requests": len(results),
+            "errors": len(errors),
+            "error_samples": list(dict.fromkeys(errors))[:5],
+            "concurrency": concurrency,
+            "duration_s": round(duration, 3),
+            "throughput_rps": round(len(results) / duration, 2) if duration else 0.0,
+            "latency_ms": summarise([result.latency_ms for result in results if result.ok]),
+            "metrics": {metric: summarise(values) for metric, values in metrics.items()},
+            "stages": self.stage_recorder.summary() if self.stage_recorder else {},
+        }
+
+    async def run_request(self, scenario: Callable[[Any, int], Awaitable[RequestResult]], index: int) -> RequestResult:
+        start_time = time.perf_counter()
+        try:
+            return await scenario(self.client, index)
+        except Exception as e:
+            return RequestResult((time.perf_counter() - start_time) * 1000, False, f"{type(e).__name__}: {e}")
+
+
+def compare_results(baseline: Dict[str, Any], current: Dict[str, Any]) -> Dict[str, Dict[str, Optional[float]]]:
+    """Relative change of p50, p95 and throughput per scenario; positive latency changes are regressions."""
+    changes = {}
+    for name, scenario in current["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        change = {}
+        for key in ("p50", "p95", "p99"):
+            before, after = previous["latency_ms"].get(key), scenario["latency_ms"].get(key)
+            change[f"{key}_ms"] = round((after - before) / before * 100, 1) if before and after is not None else None
+        before, after = previous["throughput_rps"], scenario["throughput_rps"]
+        change["throughput_rps"] = round((after - before) / before * 100, 1) if before else None
+        changes[name] = change
+    return changes
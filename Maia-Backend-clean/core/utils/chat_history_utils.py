@@ -0,0 +1,204 @@
+from core.utils.openai_utils import get_openai_llm_client
+from core.utils.metrics_utils import track_stage
+from core.utils.provider_registry_utils import get_provider_registry
+from langchain_core.prompts import ChatPromptTemplate
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+import threading
+import hashlib
+import logging
+import json
+import os
+
+logger = logging.getLogger('django')
+
+CHAT_HISTORY_TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "2000"))
+CHAT_HISTORY_KEEP_TURNS = int(os.getenv("CHAT_HISTORY_KEEP_TURNS", "6"))
+CHAT_HISTORY_FOLD_TURNS = int(os.getenv("CHAT_HISTORY_FOLD_TURNS", "4"))
+CHAT_HISTORY_SUMMARY_CACHE_SIZE = int(os.getenv("CHAT_HISTORY_SUMMARY_CACHE_SIZE", "1000"))
+TOKENIZER_MODEL = "gpt-4o"
+TOKENS_PER_TURN = 4 # role and message framing
+
+Turn = Dict[str, Any]
+
+def load_encoding():
+    try:
+        import tiktoken
+        return tiktoken.encoding_for_model(TOKENIZER_MODEL)
+    except Exception as e:
+        # The BPE ranks are downloaded on first use; without them, fall back to ~4 characters per token
+        logger.error(f"Tokenizer for {TOKENIZER_MODEL} unavailable, estimating token counts: {e}")
+        return False
+
+
+get_provider_registry().register("tokenizer", load_encoding, warmup=lambda encoding: encoding and encoding.encode("warmup"))
+
+
+def get_encoding():
+    return get_provider_registry().get("tokenizer")
+
+
+def count_tokens(text: str) -> int:
+    encoding = get_encoding()
+    if encoding:
+        return len(encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+def count_turn_tokens(turn: Turn) -> int:
+    return count_tokens(f"{turn.get('role', '')}: {turn.get('content', '')}") + TOKENS_PER_TURN
+
+
+def chain_hash(previous: str, turn: Turn) -> str:
+    return hashlib.sha256(f"{previous}\x1e{turn.get('role', '')}\x1f{turn.get('content', '')}".encode('utf-8')).hexdigest()
+
+
+@dataclass
+class CompactedHistory:
+    summary: Optional[str]
+    turns: List[Turn]
+    summarised_turns: int = 0
+    tokens: int = 0
+    # Previous summary, hash of the turns the new summary will cover and the turns still to fold into it
+    pending: Optional[Tuple[str, str, List[Turn]]] = field(default=None, repr=False)
+
+    def to_turns(self) -> List[Turn]:
+        if not self.summary:
+            return list(self.turns)
+        return [{"role": "summary", "content": self.summary}] + list(self.turns)
+
+
+def get_history_summary_prompt() -> ChatPromptTemplate:
+    return ChatPromptTemplate.from_messages(
+        [
+            (
+                "system",
+                "You maintain a running summary of a customer service conversation. Update the SUMMARY with the NEW_MESSAGES. Keep names of schemes, products, dates, amounts, the customer's situation and any open questions. Reply with the updated summary only, under 150 words.",
+            ),
+            ("human", "SUMMARY: {summary}\nNEW_MESSAGES: {messages}"),
+        ]
+    )
+
+
+class ChatHistoryManager:
+    """
+    Keeps a conversation within a token budget before it is put into a prompt.
+
+    The last `keep_turns` turns are kept verbatim. Older turns are folded into a rolling summary, cached by
+    a hash chained over the turns it covers, so each request of a growing conversation finds the summary
+    of its earlier turns and only folds the turns that have aged out since. Folding happens in steps of
+    `fold_turns`, so the summary is not regenerated on every new message.
+    """
+
+    def __init__(self, token_budget: int = CHAT_HISTORY_TOKEN_BUDGET, keep_turns: int = CHAT_HISTORY_KEEP_TURNS, fold_turns: int = CHAT_HISTORY_FOLD_TURNS, cache_size: int = CHAT_HISTORY_SUMMARY_CACHE_SIZE):
+        self.token_budget = token_budget
+        self.keep_turns = keep_turns
+        self.fold_turns = fold_turns
+        self.cache_size = cache_size
+        self._summaries: OrderedDict[str, str] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def compact(self, turns: List[Turn]) -> CompactedHistory:
+        history = self._plan(turns)
+        if history.pending:
+            previous_summary, _, new_turns = history.pending
+            try:
+                history.summary = self._summarise(previous_summary, new_turns)
+            except Exception as e:
+                logger.error(f"Error summarising chat history: {e}")
+                return self._unfolded(history)
+            self._finish(history)
+        return history
+
+    async def acompact(self, turns: List[Turn]) -> CompactedHistory:
+        history = self._plan(turns)
+        if history.pending:
+            previous_summary, _, new_turns = history.pending
+            try:
+                history.summary = await self._asummarise(previous_summary, new_turns)
+            except Exception as e:
+                logger.error(f"Error summarising chat history: {e}")
+                return self._unfolded(history)
+            self._finish(history)
+        return history
+
+    def _plan(self, turns: List[Turn]) -> CompactedHistory:
+        turn_tokens = [count_turn_tokens(turn) for turn in turns]
+        if sum(turn_tokens) <= self.token_budget and len(turns) <= self.keep_turns + self.fold_turns:
+            return CompactedHistory(None, list(turns), 0, sum(turn_tokens))
+
+        # Recent turns stay verbatim, fewer of them if they alone exceed the budget
+        keep = min(self.keep_turns, len(turns))
+        while keep > 1 and sum(turn_tokens[-keep:]) > self.token_budget:
+            keep -= 1
+        foldable = len(turns) - keep
+
+        hashes = [""]
+        for turn in turns[:foldable]:
+            hashes.append(chain_hash(hashes[-1], turn))
+
+        with self._lock:
+            covered = next((count for count in range(foldable, 0, -1) if hashes[count] in self._summaries), 0)
+            summary = self._summaries.get(hashes[covered]) if covered else None
+            if covered:
+                self._summaries.move_to_end(hashes[covered])
+
+        gap = turns[covered:foldable]
+        summary_tokens = count_tokens(summary) if summary else 0
+        gap_tokens = sum(turn_tokens[covered:foldable])
+        recent_tokens = sum(turn_tokens[foldable:])
+
+        if len(gap) < self.fold_turns and summary_tokens + gap_tokens + recent_tokens <= self.token_budget:
+            # Not worth another summarisation yet, the few turns since the last fold are kept verbatim
+            return CompactedHistory(summary, list(turns[covered:]), covered, summary_tokens + gap_tokens + recent_tokens)
+
+        return CompactedHistory(summary, list(turns[foldable:]), foldable, recent_tokens, pending=(summary or "", hashes[foldable], gap) if gap else None)
+
+    def _unfolded(self, history: CompactedHistory) -> CompactedHistory:
+        # Without a new summary the turns it would have covered are sent as they are, over budget
+        previous_summary, _, new_turns = history.pending
+        turns = new_turns + history.turns
+        tokens = (count_tokens(previous_summary) if previous_summary else 0) + sum(count_turn_tokens(turn) for turn in turns)
+        return CompactedHistory(previous_summary or None, turns, history.summarised_turns - len(new_turns), tokens)
+
+    def _finish(self, history: CompactedHistory) -> None:
+        _, covered_hash, _ = history.pending
+        history.pending = None
+        history.tokens += count_tokens(history.summary)
+
+        with self._lock:
+            self._summaries[covered_hash] = history.summary
+            self._summaries.move_to_end(covered_hash)
+            while len(self._summaries) > self.cache_size:
+                self._summaries.popitem(last=False)
+        logger.info(f"Chat history compacted: {history.summarised_turns} turns summarised, {len(history.turns)} kept, {history.tokens} tokens")
+
+    def _summarise(self, previous_summary: str, turns: List[Turn]) -> str:
+        chain = get_history_summary_prompt() | get_openai_llm_client()
+        inputs = {"summary": previous_summary or "None", "messages": json.dumps(turns)}
+        with track_stage("history_summarisation", list(inputs.values())) as tracker:
+            response = chain.invoke(inputs)
+            tracker.record_usage(response.usage_metadata)
+        return response.content
+
+    async def _asummarise(self, previous_summary: str, turns: List[Turn]) -> str:
+        chain = get_history_summary_prompt() | get_openai_llm_client()
+        inputs = {"summary": previous_summary or "None", "messages": json.dumps(turns)}
+        with track_stage("history_summarisation", list(inputs.values())) as tracker:
+            response = await chain.ainvoke(inputs)
+            tracker.record_usage(response.usage_metadata)
+        return response.content
+
+
+_history_manager: Optional[ChatHistoryManager] = None
+_history_manager_lock = threading.Lock()
+
+
+def get_history_manager() -> ChatHistoryManager:
+    global _history_manager
+    if _history_manager is None:
+        with _history_manager_lock:
+            if _history_manager is None:
+                _history_manager = ChatHistoryManager()
+    return _history_manager
@@ -0,0 +1,197 @@
+from core.models import EmbeddingCacheEntry
+from core.utils.metrics_utils import get_metrics_registry, CollectedMetric, LabelValues
+from django.utils import timezone
+from collections import OrderedDict, Counter
+from datetime import timedelta
+from typing import List, Dict, Any, Optional, Tuple
+from dotenv import load_dotenv
+import numpy as np
+import threading
+import hashlib
+import logging
+import os
+
+load_dotenv()
+
+logger = logging.getLogger('django')
+
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+EMBEDDING_CACHE_DB_ENABLED = os.getenv("EMBEDDING_CACHE_DB_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_DB_MAX_ROWS = int(os.getenv("EMBEDDING_CACHE_DB_MAX_ROWS", "500000"))
+EMBEDDING_CACHE_EVICTION_INTERVAL = 1000
+EMBEDDING_CACHE_TOUCH_AFTER = timedelta(hours=1)
+
+CacheKey = Tuple[str, int, str]
+
+
+def hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def encode_vector(embedding: List[float]) -> bytes:
+    return np.asarray(embedding, dtype='<f4').tobytes()
+
+
+def decode_vector(blob: bytes) -> List[float]:
+    return np.frombuffer(bytes(blob), dtype='<f4').tolist()
+
+
+class EmbeddingCache:
+    """
+    Two-tier cache of embeddings keyed by (model, dimensions, sha256(text)).
+
+    The first tier is an in-process LRU of float32 blobs. The second tier is the `embedding_cache`
+    table, shared by every worker and kept under `db_max_rows` by evicting the least recently used rows.
+    """
+
+    def __init__(self, max_size: int = EMBEDDING_CACHE_SIZE, db_enabled: bool = EMBEDDING_CACHE_DB_ENABLED, db_max_rows: int = EMBEDDING_CACHE_DB_MAX_ROWS):
+        self.max_size = max_size
+        self.db_enabled = db_enabled
+        self.db_max_rows = db_max_rows
+        self._entries: OrderedDict[CacheKey, bytes] = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = Counter()
+        self._inserts_since_eviction = 0
+
+    def get_many(self, model: str, dimensions: int, texts: List[str]) -> Dict[str, List[float]]:
+        keys = {text: (model, dimensions, hash_text(text)) for text in dict.fromkeys(texts)}
+        found = {}
+
+        with self._lock:
+            for text, key in keys.items():
+                blob = self._entries.get(key)
+                if blob is not None:
+                    self._entries.move_to_end(key)
+                    found[text] = blob
+            self._stats["memory_hits"] += len(found)
+
+        missing = {key[2]: text for text, key in keys.items() if text not in found}
+        if missing and self.db_enabled:
+            db_found = self._get_from_db(model, dimensions, missing)
+            self._set_memory({keys[text]: blob for text, blob in db_found.items()})
+            found.update(db_found)
+            self._count("db_hits", len(db_found))
+
+        self._count("misses", len(keys) - len(found))
+        return {text: decode_vector(blob) for text, blob in found.items()}
+
+    def set_many(self, model: str, dimensions: int, embeddings: Dict[str, List[float]]) -> None:
+        blobs = {(model, dimensions, hash_text(text)): encode_vector(embedding) for text, embedding in embeddings.items()}
+        self._set_memory(blobs)
+        if self.db_enabled:
+            self._set_db(blobs)
+
+    def _set_memory(self, blobs: Dict[CacheKey, bytes]) -> None:
+        with self._lock:
+            for key, blob in blobs.items():
+                self._entries[key] = blob
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._stats["memory_evictions"] += 1
+
+    def _get_from_db(self, model: str, dimensions: int, missing: Dict[str, str]) -> Dict[str, bytes]:
+        try:
+            rows = EmbeddingCacheEntry.objects.filter(model=model, dimensions=dimensions, text_hash__in=missing.keys()).values_list('id', 'text_hash', 'vector', 'last_used_at')
+            found, stale_ids = {}, []
+            touch_before = timezone.now() - EMBEDDING_CACHE_TOUCH_AFTER
+            for row_id, text_hash, vector, last_used_at in rows:
+                found[missing[text_hash]] = bytes(vector)
+                if last_used_at < touch_before:
+                    stale_ids.append(row_id)
+
+            # Recency is only refreshed once per hour per row to keep cache hits read-only
+            if stale_ids:
+                EmbeddingCacheEntry.objects.filter(id__in=stale_ids).update(last_used_at=timezone.now())
+            return found
+        except Exception as e:
+            logger.error(f"Error reading embedding cache: {e}")
+            self._count("db_errors")
+            return {}
+
+    def _set_db(self, blobs: Dict[CacheKey, bytes]) -> None:
+        now = timezone.now()
+        entries = [
+            EmbeddingCacheEntry(model=model, dimensions=dimensions, text_hash=text_hash, vector=blob, last_used_at=now)
+            for (model, dimensions, text_hash), blob in blobs.items()
+        ]
+        try:
+            EmbeddingCacheEntry.objects.bulk_create(entries, ignore_conflicts=True)
+        except Exception as e:
+            logger.error(f"Error writing embedding cache: {e}")
+            self._count("db_errors")
+            return
+
+        with self._lock:
+            self._inserts_since_eviction += len(entries)
+            evict = self._inserts_since_eviction >= EMBEDDING_CACHE_EVICTION_INTERVAL
+            if evict:
+                self._inserts_since_eviction = 0
+        if evict:
+            self.evict_db()
+
+    def evict_db(self) -> int:
+        try:
+            excess = EmbeddingCacheEntry.objects.count() - self.db_max_rows
+            if excess <= 0:
+                return 0
+            oldest_ids = list(EmbeddingCacheEntry.objects.order_by('last_used_at').values_list('id', flat=True)[:excess])
+            deleted, _ = EmbeddingCacheEntry.objects.filter(id__in=oldest_ids).delete()
+            self._count("db_evictions", deleted)
+            logger.info(f"{deleted} entries evicted from embedding cache")
+            return deleted
+        except Exception as e:
+            logger.error(f"Error evicting embedding cache: {e}")
+            self._count("db_errors")
+            return 0
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        # Lookups run on many threads at once, counters outside the lock would lose updates
+        with self._lock:
+            self._stats[name] += amount
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._entries)
+        lookups = stats.get("memory_hits", 0) + stats.get("db_hits", 0) + stats.get("misses", 0)
+        stats["hit_rate"] = round((lookups - stats.get("misses", 0)) / lookups, 4) if lookups else 0.0
+        return stats
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._stats.clear()
+
+
+_embedding_cache: Optional[EmbeddingCache] = None
+_embedding_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    global _embedding_cache
+    if _embedding_cache is None:
+        with _embedding_cache_lock:
+            if _embedding_cache is None:
+                _embedding_cache = EmbeddingCache()
+    return _embedding_cache
+
+
+def register_embedding_cache_metrics() -> None:
+    """Exports the hit, miss and eviction counts of the embedding cache to the metrics registry."""
+    registry = get_metrics_registry()
+
+    def collect(names: Dict[str, str]) -> Dict[LabelValues, float]:
+        stats = get_embedding_cache().get_stats()
+        return {(label,): stats.get(name, 0) for name, label in names.items()}
+
+    registry.register(CollectedMetric(
+        "maia_embedding_cache_lookups_total", "Embedding cache lookups, by result.", ["result"],
+        lambda: collect({"memory_hits": "memory_hit", "db_hits": "db_hit", "misses": "miss"}), "counter",
+    ))
+    registry.register(CollectedMetric(
+        "maia_embedding_cache_evictions_total", "Embeddings evicted from the cache, by tier.", ["tier"],
+        lambda: collect({"memory_evictions": "memory", "db_evictions": "db"}), "counter",
+    ))
+    registry.register(CollectedMetric("maia_embedding_cache_db_errors_total", "Failed reads and writes of the embedding cache table.", [], lambda: {(): get_embedding_cache().get_stats().get("db_errors", 0)}, "counter"))
+    registry.register(CollectedMetric("maia_embedding_cache_memory_entries", "Embeddings held in this process's memory tier.", [], lambda: {(): get_embedding_cache().get_stats()["memory_entries"]}))
@@ -0,0 +1,201 @@
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from dataclasses import dataclass
+from django.db import close_old_connections
+from typing import Any, Callable, Dict, List, Optional, Sequence
+import contextvars
+import threading
+import asyncio
+import logging
+import time
+import os
+
+logger = logging.getLogger('django')
+
+EXECUTION_GRAPH_MAX_WORKERS = int(os.getenv("EXECUTION_GRAPH_MAX_WORKERS", "16"))
+
+ReportListener = Callable[[str, Dict[str, Any]], None]
+_report_listeners: List[ReportListener] = []
+
+
+def add_report_listener(listener: ReportListener) -> None:
+    """Registers a callback that receives the name and `get_report()` of every graph that finishes."""
+    _report_listeners.append(listener)
+
+
+def remove_report_listener(listener: ReportListener) -> None:
+    if listener in _report_listeners:
+        _report_listeners.remove(listener)
+
+
+@dataclass
+class Stage:
+    name: str
+    func: Callable[..., Any]
+    depends_on: Sequence[str]
+
+
+@dataclass
+class StageSpan:
+    name: str
+    start: float
+    end: float
+    error: Optional[str] = None
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+
+class ExecutionGraph:
+    """
+    Runs the stages of a request pipeline as soon as their dependencies have finished.
+
+    Each stage is called with the results of the stages it depends on, in the order they are listed.
+    `run` executes stages on a shared, bounded thread pool; `arun` awaits coroutine stages on the event
+    loop and sends plain functions to the same pool. Both record a span per stage, so `get_report`
+    can compare the wall time with the critical path and with the sum of all stages.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.stages: Dict[str, Stage] = {}
+        self.spans: Dict[str, StageSpan] = {}
+        self._started_at = 0.0
+        self._finished_at = 0.0
+
+    def add_stage(self, name: str, func: Callable[..., Any], depends_on: Sequence[str] = ()) -> "ExecutionGraph":
+        missing = [dependency for dependency in depends_on if dependency not in self.stages]
+        if missing:
+            raise ValueError(f"Stage {name} depends on unknown stages {missing}")
+        self.stages[name] = Stage(name, func, tuple(depends_on))
+        return self
+
+    def run(self) -> Dict[str, Any]:
+        results: Dict[str, Any] = {}
+        pending = dict(self.stages)
+        running: Dict[Future, str] = {}
+        executor = get_stage_executor()
+        self._started_at = time.perf_counter()
+
+        try:
+            while pending or running:
+                for name in [name for name, stage in pending.items() if all(dependency in results for dependency in stage.depends_on)]:
+                    stage = pending.pop(name)
+                    # Stages run in a copy of the caller's context so they keep its trace ID
+                    context = contextvars.copy_context()
+                    running[executor.submit(context.run, self._run_stage, stage, [results[dependency] for dependency in stage.depends_on])] = name
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[running.pop(future)] = future.result()
+        finally:
+            for future in running:
+                future.cancel()
+            self._finish()
+
+        return results
+
+    async def arun(self) -> Dict[str, Any]:
+        results: Dict[str, Any] = {}
+        pending = dict(self.stages)
+        running: Dict[asyncio.Task, str] = {}
+        self._started_at = time.perf_counter()
+
+        try:
+            while pending or running:
+                for name in [name for name, stage in pending.items() if all(dependency in results for dependency in stage.depends_on)]:
+                    stage = pending.pop(name)
+                    running[asyncio.create_task(self._arun_stage(stage, [results[dependency] for dependency in stage.depends_on]))] = name
+
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    results[running.pop(task)] = task.result()
+        finally:
+            for task in running:
+                task.cancel()
+            self._finish()
+
+        return results
+
+    def _run_stage(self, stage: Stage, args: List[Any]) -> Any:
+        start = time.perf_counter()
+        try:
+            result = run_in_worker(stage.func, *args)
+        except Exception as e:
+            self._record(stage.name, start, str(e))
+            raise
+        self._record(stage.name, start)
+        return result
+
+    async def _arun_stage(self, stage: Stage, args: List[Any]) -> Any:
+        start = time.perf_counter()
+        try:
+            if asyncio.iscoroutinefunction(stage.func):
+                result = await stage.func(*args)
+            else:
+                context = contextvars.copy_context()
+                result = await asyncio.get_running_loop().run_in_executor(get_stage_executor(), context.run, run_in_worker, stage.func, *args)
+        except Exception as e:
+            self._record(stage.name, start, str(e))
+            raise
+        self._record(stage.name, start)
+        return result
+
+    def _record(self, name: str, start: float, error: Optional[str] = None) -> None:
+        self.spans[name] = StageSpan(name, start - self._started_at, time.perf_counter() - self._started_at, error)
+
+    def _finish(self) -> None:
+        self._finished_at = time.perf_counter()
+        report = self.get_report()
+        stages = ", ".join(f"{name} {span['start_ms']}-{span['end_ms']}ms" for name, span in report["stages"].items())
+        logger.info(f"{self.name} finished in {report['total_ms']}ms, critical path {report['critical_path_ms']}ms, stage sum {report['stage_sum_ms']}ms: {stages}")
+        for listener in list(_report_listeners):
+            try:
+                listener(self.name, report)
+            except Exception as e:
+                logger.error(f"Error in execution graph report listener: {e}")
+
+    def get_critical_path(self) -> float:
+        longest: Dict[str, float] = {}
+        for name, stage in self.stages.items():
+            span = self.spans.get(name)
+            longest[name] = (span.duration if span else 0.0) + max((longest[dependency] for dependency in stage.depends_on), default=0.0)
+        return max(longest.values(), default=0.0)
+
+    def get_report(self) -> Dict[str, Any]:
+        return {
+            "total_ms": round((self._finished_at - self._started_at) * 1000, 1),
+            "critical_path_ms": round(self.get_critical_path() * 1000, 1),
+            "stage_sum_ms": round(sum(span.duration for span in self.spans.values()) * 1000, 1),
+            "stages": {
+                name: {
+                    "start_ms": round(span.start * 1000, 1),
+                    "end_ms": round(span.end * 1000, 1),
+                    **({"error": span.error} if span.error else {}),
+                }
+                for name, span in sorted(self.spans.items(), key=lambda item: item[1].start)
+            },
+        }
+
+
+def run_in_worker(func: Callable[..., Any], *args: Any) -> Any:
+    # Pool threads outlive requests, so Django's request-end cleanup never replaces a connection that the
+    # database closed or that passed its CONN_MAX_AGE; each stage checks before and after it runs instead
+    close_old_connections()
+    try:
+        return func(*args)
+    finally:
+        close_old_connections()
+
+
+_stage_executor: Optional[ThreadPoolExecutor] = None
+_stage_executor_lock = threading.Lock()
+
+
+def get_stage_executor() -> ThreadPoolExecutor:
+    global _stage_executor
+    if _stage_executor is None:
+        with _stage_executor_lock:
+            if _stage_executor is None:
+                _stage_executor = ThreadPoolExecutor(max_workers=EXECUTION_GRAPH_MAX_WORKERS, thread_name_prefix="stage")
+    return _stage_executor
@@ -0,0 +1,197 @@
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.output_parsers import JsonOutputParser
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+import numpy as np
+import dataclasses
+import asyncio
+import hashlib
+import json
+import time
+import os
+import re
+
+FAKE_EMBEDDING_LATENCY_MS = float(os.getenv("FAKE_EMBEDDING_LATENCY_MS", "50"))
+FAKE_LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "300"))
+FAKE_LLM_TOKEN_LATENCY_MS = float(os.getenv("FAKE_LLM_TOKEN_LATENCY_MS", "10"))
+FAKE_LLM_RESPONSE_WORDS = int(os.getenv("FAKE_LLM_RESPONSE_WORDS", "40"))
+FAKE_WHISPER_LATENCY_MS = float(os.getenv("FAKE_WHISPER_LATENCY_MS", "500"))
+
+TOKEN_PATTERN = re.compile(r"\w+")
+FAKE_TRANSCRIPTS = [
+    "Hello, thank you for calling. How can I help you today?",
+    "I would like to ask about my NS pay for the last in-camp training.",
+    "Sure, may I have your NRIC number so I can check your records?",
+    "I have not received the make-up pay and it has been three weeks.",
+    "Let me check the status of your claim, please hold on for a moment.",
+    "Can I also update my mailing address while I am on the line?",
+]
+
+
+def hash_features(text: str) -> List[str]:
+    words = TOKEN_PATTERN.findall(text.lower())
+    return words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+
+
+def sleep_ms(milliseconds: float) -> None:
+    if milliseconds > 0:
+        time.sleep(milliseconds / 1000)
+
+
+async def asleep_ms(milliseconds: float) -> None:
+    if milliseconds > 0:
+        await asyncio.sleep(milliseconds / 1000)
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Deterministic embeddings built by hashing words and word pairs into `dimensions` signed buckets.
+
+    Texts that share words are close in cosine similarity, which is enough for retrieval, caching and
+    category shortlisting to behave realistically without calling OpenAI.
+    """
+
+    def __init__(self, model: str = "fake-hash-embedding", dimensions: int = 1536, latency_ms: float = FAKE_EMBEDDING_LATENCY_MS):
+        self.model = model
+        self.dimensions = dimensions
+        self.latency_ms = latency_ms
+
+    def embed_text(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        features = hash_features(text) or [text]
+        digests = [hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest() for feature in features]
+        indices = np.array([int.from_bytes(digest, 'little') % self.dimensions for digest in digests])
+        signs = np.array([1.0 if digest[-1] & 1 else -1.0 for digest in digests], dtype=np.float32)
+        np.add.at(vector, indices, signs)
+        vector /= max(float(np.linalg.norm(vector)), 1e-12)
+        return vector.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        sleep_ms(self.latency_ms)
+        return [self.embed_text(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        await asleep_ms(self.latency_ms)
+        return [self.embed_text(text) for text in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model that answers with the opening words of the last message after a fixed delay.
+
+    `latency_ms` is the time to first token and `token_latency_ms` the time per further word, so both
+    `invoke` and streaming have the timing profile of a real model. With `with_structured_output` it
+    returns a JSON object with a placeholder for each field of the schema.
+    """
+
+    model_name: str = "fake-chat"
+    latency_ms: float = FAKE_LLM_LATENCY_MS
+    token_latency_ms: float = FAKE_LLM_TOKEN_LATENCY_MS
+    response_words: int = FAKE_LLM_RESPONSE_WORDS
+    json_keys: Optional[List[str]] = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def with_structured_output(self, schema: Any, *, include_raw: bool = False, **kwargs: Any):
+        if dataclasses.is_dataclass(schema):
+            keys = [field.name for field in dataclasses.fields(schema)]
+        else:
+            keys = list(getattr(schema, "__fields__", {}) or schema.get("properties", {}))
+        structured_model = FakeChatModel(latency_ms=self.latency_ms, token_latency_ms=self.token_latency_ms, response_words=self.response_words, json_keys=keys)
+        return structured_model | JsonOutputParser()
+
+    def get_response_tokens(self, messages: List[BaseMessage]) -> List[str]:
+        if self.json_keys is not None:
+            return [json.dumps({key: f"Fake {key}" for key in self.json_keys})]
+        words = str(messages[-1].content).split()[:self.response_words] if messages else []
+        return [word if i == 0 else f" {word}" for i, word in enumerate(words)]
+
+    def get_usage(self, messages: List[BaseMessage], tokens: List[str]) -> Dict[str, int]:
+        input_tokens = sum(len(str(message.content).split()) for message in messages)
+        output_tokens = len(tokens)
+        return {"input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens}
+
+    def get_result(self, messages: List[BaseMessage], tokens: List[str]) -> ChatResult:
+        message = AIMessage(content="".join(tokens), usage_metadata=self.get_usage(messages, tokens))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        tokens = self.get_response_tokens(messages)
+        sleep_ms(self.latency_ms + self.token_latency_ms * max(len(tokens) - 1, 0))
+        return self.get_result(messages, tokens)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        tokens = self.get_response_tokens(messages)
+        await asleep_ms(self.latency_ms + self.token_latency_ms * max(len(tokens) - 1, 0))
+        return self.get_result(messages, tokens)
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        tokens = self.get_response_tokens(messages)
+        for i, token in enumerate(tokens):
+            sleep_ms(self.latency_ms if i == 0 else self.token_latency_ms)
+            # Like OpenAI with `include_usage`, the last chunk carries the usage of the whole response
+            usage_metadata = self.get_usage(messages, tokens) if i == len(tokens) - 1 else None
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token, usage_metadata=usage_metadata))
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        tokens = self.get_response_tokens(messages)
+        for i, token in enumerate(tokens):
+            await asleep_ms(self.latency_ms if i == 0 else self.token_latency_ms)
+            # Like OpenAI with `include_usage`, the last chunk carries the usage of the whole response
+            usage_metadata = self.get_usage(messages, tokens) if i == len(tokens) - 1 else None
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token, usage_metadata=usage_metadata))
+
+
+def read_audio_bytes(file: Any) -> bytes:
+    if isinstance(file, tuple):
+        return file[1]
+    data = file.read()
+    file.seek(0)
+    return data
+
+
+def get_fake_transcript(audio: bytes) -> str:
+    index = int.from_bytes(hashlib.blake2b(audio, digest_size=4).digest(), 'little')
+    return FAKE_TRANSCRIPTS[index % len(FAKE_TRANSCRIPTS)]
+
+
+class FakeTranscriptions:
+    def __init__(self, latency_ms: float):
+        self.latency_ms = latency_ms
+
+    def create(self, file: Any, **kwargs: Any) -> str:
+        sleep_ms(self.latency_ms)
+        return get_fake_transcript(read_audio_bytes(file))
+
+
+class AsyncFakeTranscriptions(FakeTranscriptions):
+    async def create(self, file: Any, **kwargs: Any) -> str:
+        await asleep_ms(self.latency_ms)
+        return get_fake_transcript(read_audio_bytes(file))
+
+
+class FakeAudio:
+    def __init__(self, transcriptions: FakeTranscriptions):
+        self.transcriptions = transcriptions
+
+
+class FakeWhisperClient:
+    """Stands in for the OpenAI client's `audio.transcriptions.create`, returning a canned sentence chosen by the audio's hash."""
+
+    def __init__(self, latency_ms: float = FAKE_WHISPER_LATENCY_MS):
+        self.audio = FakeAudio(FakeTranscriptions(latency_ms))
+
+
+class AsyncFakeWhisperClient:
+    def __init__(self, latency_ms: float = FAKE_WHISPER_LATENCY_MS):
+        self.audio = FakeAudio(AsyncFakeTranscriptions(latency_ms))
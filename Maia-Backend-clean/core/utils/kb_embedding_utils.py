@@ -16,6 +16,15 @@ def create_kb_embedding(data: Dict[str, Any]) -> Dict[str, Any]:
     else:
         raise ValidationError(serializer.errors)
 
+def bulk_create_kb_embeddings(kb_resource_id: int, contents: List[str]) -> List[int]:
+    embeddings = [KbEmbedding(kb_resource_id=kb_resource_id, content=content) for content in contents]
+    embeddings = KbEmbedding.objects.bulk_create(embeddings)
+    return [embedding.id for embedding in embeddings]
+
+def bulk_update_vector_db_ids(vector_db_ids: Dict[int, str]) -> None:
+    embeddings = [KbEmbedding(id=embedding_id, vector_db_id=vector_db_id) for embedding_id, vector_db_id in vector_db_ids.items()]
+    KbEmbedding.objects.bulk_update(embeddings, ["vector_db_id"])
+
 def get_kb_embedding_by_id(embedding_id: int) -> Dict[str, Any]:
     try:
         embedding = KbEmbedding.objects.get(id=embedding_id)
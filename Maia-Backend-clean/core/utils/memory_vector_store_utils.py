@@ -0,0 +1,173 @@
+from core.models import KbEmbedding
+from core.utils.openai_utils import get_embeddings
+from opensearchpy.serializer import JSONSerializer
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+import numpy as np
+import threading
+import asyncio
+import logging
+import json
+import os
+
+logger = logging.getLogger('django')
+
+MEMORY_VECTOR_STORE_SEED = os.getenv("MEMORY_VECTOR_STORE_SEED", "true").lower() == "true"
+MEMORY_VECTOR_STORE_SEED_BATCH_SIZE = 256
+
+
+class MemoryIndex:
+    def __init__(self):
+        self.documents: Dict[str, Dict[str, Any]] = {}
+        self._matrix: Optional[np.ndarray] = None
+        self._ids: List[str] = []
+
+    def add(self, document_id: str, document: Dict[str, Any]) -> None:
+        self.documents[document_id] = document
+        self._matrix = None
+
+    def search(self, embedding: List[float], size: int, min_score: float) -> List[Dict[str, Any]]:
+        if not self.documents:
+            return []
+        if self._matrix is None:
+            self._ids = list(self.documents.keys())
+            matrix = np.asarray([self.documents[document_id]["embedding"] for document_id in self._ids], dtype=np.float32)
+            self._matrix = matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+        vector = np.asarray(embedding, dtype=np.float32)
+        vector /= max(float(np.linalg.norm(vector)), 1e-12)
+        # OpenSearch's knn_score script scores cosinesimil as 1 + cosine similarity
+        scores = 1.0 + self._matrix @ vector
+        top = np.argsort(-scores)[:size]
+        return [
+            {
+                "_id": self._ids[i],
+                "_score": float(scores[i]),
+                "_source": {key: value for key, value in self.documents[self._ids[i]].items() if key != "embedding"},
+            }
+            for i in top if scores[i] >= min_score
+        ]
+
+
+class MemoryIndices:
+    def __init__(self, store: "MemoryVectorStore"):
+        self.store = store
+
+    def exists(self, index: str, **kwargs: Any) -> bool:
+        return index in self.store.indexes
+
+    def create(self, index: str, body: Optional[Dict[str, Any]] = None, **kwargs: Any) -> Dict[str, Any]:
+        with self.store.lock:
+            self.store.indexes.setdefault(index, MemoryIndex())
+        return {"acknowledged": True, "index": index}
+
+    def put_mapping(self, index: str, body: Optional[Dict[str, Any]] = None, **kwargs: Any) -> Dict[str, Any]:
+        return {"acknowledged": True}
+
+    def delete(self, index: str, **kwargs: Any) -> Dict[str, Any]:
+        with self.store.lock:
+            self.store.indexes.pop(index, None)
+            self.store.seeded.add(index)
+        return {"acknowledged": True}
+
+
+class MemoryVectorStore:
+    """
+    In-process stand-in for the parts of the OpenSearch client this app uses: index management, `index`,
+    `bulk` (so `streaming_bulk` works unchanged) and `msearch` with the script scoring kNN query from
+    `build_knn_query`, answered by brute-force cosine similarity.
+
+    Unless seeding is disabled, each index is filled from the `kb_embedding` table the first time it is
+    searched or written to, embedded with the configured embedding client, so a fresh process serves the
+    existing knowledge base.
+    """
+
+    def __init__(self, seed: bool = MEMORY_VECTOR_STORE_SEED):
+        self.seed = seed
+        self.indexes: Dict[str, MemoryIndex] = {}
+        self.seeded = set()
+        self.lock = threading.RLock()
+        self.indices = MemoryIndices(self)
+        self.transport = SimpleNamespace(serializer=JSONSerializer())
+
+    def get_index(self, index: str) -> MemoryIndex:
+        with self.lock:
+            return self.indexes.setdefault(index, MemoryIndex())
+
+    def index(self, index: str, body: Dict[str, Any], id: Optional[str] = None, **kwargs: Any) -> Dict[str, Any]:
+        self.seed_index(index)
+        document_id = str(id if id is not None else body.get("postgresql_id", len(self.get_index(index).documents)))
+        with self.lock:
+            self.get_index(index).add(document_id, body)
+        return {"_index": index, "_id": document_id, "result": "created"}
+
+    def bulk(self, body: str, *args: Any, **kwargs: Any) -> Dict[str, Any]:
+        lines = [json.loads(line) for line in body.splitlines() if line.strip()]
+        for index in {action["index"]["_index"] for action in lines[::2]}:
+            self.seed_index(index)
+        items = []
+        with self.lock:
+            for action, document in zip(lines[::2], lines[1::2]):
+                metadata = action["index"]
+                self.get_index(metadata["_index"]).add(str(metadata["_id"]), document)
+                items.append({"index": {"_index": metadata["_index"], "_id": str(metadata["_id"]), "status": 201}})
+        return {"took": 0, "errors": False, "items": items}
+
+    def needs_seed(self, index: str) -> bool:
+        return self.seed and index not in self.seeded
+
+    def seed_index(self, index: str) -> None:
+        if not self.needs_seed(index):
+            return
+        with self.lock:
+            if not self.needs_seed(index):
+                return
+            self.seeded.add(index)
+
+            rows = list(KbEmbedding.objects.values_list("id", "content"))
+            for start in range(0, len(rows), MEMORY_VECTOR_STORE_SEED_BATCH_SIZE):
+                batch = rows[start:start + MEMORY_VECTOR_STORE_SEED_BATCH_SIZE]
+                embeddings = get_embeddings([content for _, content in batch])
+                for (kb_embedding_id, content), embedding in zip(batch, embeddings):
+                    self.get_index(index).add(str(kb_embedding_id), {"embedding": embedding, "content": content, "postgresql_id": kb_embedding_id})
+        logger.info(f"In-memory vector store index {index} seeded with {len(rows)} kb_embeddings")
+
+    def msearch(self, body: List[Dict[str, Any]], **kwargs: Any) -> Dict[str, Any]:
+        responses = []
+        for header, query in zip(body[::2], body[1::2]):
+            index = header["index"]
+            self.seed_index(index)
+            params = query["query"]["script_score"]["script"]["params"]
+            with self.lock:
+                hits = self.get_index(index).search(params["query_value"], query.get("size", 10), query.get("min_score", 0.0))
+            responses.append({"hits": {"total": {"value": len(hits)}, "hits": hits}, "status": 200})
+        return {"responses": responses}
+
+
+class AsyncMemoryVectorStore:
+    def __init__(self, store: MemoryVectorStore):
+        self.store = store
+
+    async def msearch(self, body: List[Dict[str, Any]], **kwargs: Any) -> Dict[str, Any]:
+        indexes = {header["index"] for header in body[::2]}
+        if any(self.store.needs_seed(index) for index in indexes):
+            # Seeding reads the database, which must not happen on the event loop
+            return await asyncio.to_thread(self.store.msearch, body)
+        return self.store.msearch(body)
+
+
+_memory_vector_store: Optional[MemoryVectorStore] = None
+_memory_vector_store_lock = threading.Lock()
+
+
+def get_memory_vector_store() -> MemoryVectorStore:
+    global _memory_vector_store
+    if _memory_vector_store is None:
+        with _memory_vector_store_lock:
+            if _memory_vector_store is None:
+                _memory_vector_store = MemoryVectorStore()
+    return _memory_vector_store
+
+
+def get_async_memory_vector_store() -> AsyncMemoryVectorStore:
+    return AsyncMemoryVectorStore(get_memory_vector_store())
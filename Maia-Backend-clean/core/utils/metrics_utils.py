@@ -0,0 +1,239 @@
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+import threading
+import logging
+import bisect
+import uuid
+import time
+import os
+
+logger = logging.getLogger('django')
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+
+trace_id_var: ContextVar[str] = ContextVar("trace_id", default="-")
+endpoint_var: ContextVar[str] = ContextVar("endpoint", default="background")
+
+LabelValues = Tuple[str, ...]
+
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def get_trace_id() -> str:
+    return trace_id_var.get()
+
+
+def set_trace_id(trace_id: str) -> Token:
+    return trace_id_var.set(trace_id)
+
+
+def get_endpoint() -> str:
+    return endpoint_var.get()
+
+
+def set_endpoint(endpoint: str) -> Token:
+    return endpoint_var.set(endpoint)
+
+
+class TraceIdFilter(logging.Filter):
+    """Adds the current request's trace ID to every log record, for the `{trace_id}` format field."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.trace_id = trace_id_var.get()
+        return True
+
+
+def escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{escape_label_value(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, description: str, labels: Sequence[str]):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def get_values(self) -> Dict[LabelValues, float]:
+        with self._lock:
+            return dict(self._values)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{format_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, description: str, labels: Sequence[str], buckets: Sequence[float] = DURATION_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str) -> None:
+        with self._lock:
+            counts, totals = self._values.setdefault(label_values, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            totals[0] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_values, (counts, totals) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(float(bound))
+                    lines.append(f"{self.name}_bucket{format_labels(self.labels, label_values, ('le', le))} {cumulative}")
+                lines.append(f"{self.name}_sum{format_labels(self.labels, label_values)} {totals[0]}")
+                lines.append(f"{self.name}_count{format_labels(self.labels, label_values)} {cumulative}")
+        return lines
+
+
+class CollectedMetric:
+    """
+    A gauge or counter whose values are read from `collect` when the metrics are rendered, for numbers
+    that a component already keeps, such as the statistics of a cache or a connection pool.
+    """
+
+    def __init__(self, name: str, description: str, labels: Sequence[str], collect: Callable[[], Dict[LabelValues, float]], metric_type: str = "gauge"):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self.collect = collect
+        self.metric_type = metric_type
+
+    def render(self) -> List[str]:
+        try:
+            values = self.collect()
+        except Exception as e:
+            # A failing component must not take the other metrics down with it
+            logger.error(f"Error collecting metric {self.name}: {e}")
+            return []
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.metric_type}"]
+        for label_values, value in sorted(values.items()):
+            lines.append(f"{self.name}{format_labels(self.labels, label_values)} {float(value)}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Process-wide metrics for the AI pipelines and HTTP endpoints, rendered in the Prometheus text format.
+
+    Each uvicorn worker keeps its own registry, so each worker is scraped separately.
+    """
+
+    def __init__(self):
+        self.http_requests = Counter("maia_http_requests_total", "HTTP requests by endpoint, method and status.", ["endpoint", "method", "status"])
+        self.http_duration = Histogram("maia_http_request_duration_seconds", "Time to produce the HTTP response, by endpoint and method.", ["endpoint", "method"])
+        self.stage_duration = Histogram("maia_stage_duration_seconds", "Duration of AI pipeline stages, by endpoint and stage.", ["endpoint", "stage"])
+        self.stage_errors = Counter("maia_stage_errors_total", "Failed AI pipeline stages, by endpoint and stage.", ["endpoint", "stage"])
+        self.tokens = Counter("maia_llm_tokens_total", "Prompt and completion tokens, by endpoint and stage.", ["endpoint", "stage", "type"])
+        self.payload_bytes = Histogram("maia_stage_payload_bytes", "Size of the text or audio sent to each AI pipeline stage.", ["endpoint", "stage"], SIZE_BUCKETS)
+        self.metrics = [self.http_requests, self.http_duration, self.stage_duration, self.stage_errors, self.tokens, self.payload_bytes]
+
+    def register(self, metric: CollectedMetric) -> None:
+        # Replaces a metric of the same name, so registering twice does not render it twice
+        self.metrics = [existing for existing in self.metrics if existing.name != metric.name] + [metric]
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self.metrics):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+_metrics_registry: Optional[MetricsRegistry] = None
+_metrics_registry_lock = threading.Lock()
+
+
+def get_metrics_registry() -> MetricsRegistry:
+    global _metrics_registry
+    if _metrics_registry is None:
+        with _metrics_registry_lock:
+            if _metrics_registry is None:
+                _metrics_registry = MetricsRegistry()
+    return _metrics_registry
+
+
+def get_payload_size(payload: Any) -> int:
+    if payload is None:
+        return 0
+    if isinstance(payload, int) and not isinstance(payload, bool):
+        return payload
+    if isinstance(payload, (bytes, bytearray, memoryview)):
+        return len(payload)
+    if isinstance(payload, str):
+        return len(payload.encode('utf-8'))
+    if isinstance(payload, (list, tuple)):
+        return sum(get_payload_size(item) for item in payload)
+    return len(str(payload).encode('utf-8'))
+
+
+class StageTracker:
+    def __init__(self, stage: str, endpoint: str):
+        self.stage = stage
+        self.endpoint = endpoint
+
+    def record_usage(self, usage_metadata: Optional[Dict[str, Any]]) -> None:
+        """Counts tokens from a LangChain message's `usage_metadata`, when the provider reports it."""
+        if not METRICS_ENABLED or not usage_metadata:
+            return
+        registry = get_metrics_registry()
+        registry.tokens.inc(self.endpoint, self.stage, "prompt", amount=usage_metadata.get("input_tokens", 0))
+        registry.tokens.inc(self.endpoint, self.stage, "completion", amount=usage_metadata.get("output_tokens", 0))
+
+    def callbacks(self) -> Dict[str, Any]:
+        """Runnable config that counts the tokens of every chat model call in a chain, including streamed ones."""
+        # Imported here so that the logging config, which loads this module, does not pull in LangChain
+        from core.utils.openai_utils import TokenUsageCallback
+
+        return {"callbacks": [TokenUsageCallback(self)]}
+
+
+@contextmanager
+def track_stage(stage: str, payload: Any = None) -> Iterator[StageTracker]:
+    """
+    Times an AI pipeline stage and counts it as failed if it raises, labelled with the endpoint of the
+    current request. `payload` is the text or audio sent to the stage, or its size in bytes.
+    """
+    endpoint = get_endpoint()
+    tracker = StageTracker(stage, endpoint)
+    if not METRICS_ENABLED:
+        yield tracker
+        return
+
+    registry = get_metrics_registry()
+    if payload is not None:
+        registry.payload_bytes.observe(get_payload_size(payload), endpoint, stage)
+
+    start_time = time.perf_counter()
+    try:
+        yield tracker
+    except Exception:
+        registry.stage_errors.inc(endpoint, stage)
+        raise
+    finally:
+        registry.stage_duration.observe(time.perf_counter() - start_time, endpoint, stage)
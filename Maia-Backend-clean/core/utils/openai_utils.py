@@ -1,33 +1,62 @@
-from langchain_openai import OpenAIEmbeddings
-from langchain_openai import ChatOpenAI
-from langchain_openai import OpenAIEmbeddings
-from langchain.chains import OpenAIModerationChain
-from openai import OpenAI as BaseOpenAI
-from typing import Dict, List
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.outputs import LLMResult
+from asgiref.sync import sync_to_async
+from core.utils.embedding_cache_utils import get_embedding_cache
+from core.utils.metrics_utils import StageTracker, track_stage
+from core.utils.provider_registry_utils import get_provider_registry
+from django.conf import settings
+from typing import Any, Dict, List, Optional, Union, BinaryIO, Tuple, TYPE_CHECKING
 from dotenv import load_dotenv
 import logging
+import io
 import os
 
+if TYPE_CHECKING:
+    from langchain.chains import OpenAIModerationChain
+    from openai import OpenAI as BaseOpenAI
+    from openai import AsyncOpenAI
+
 load_dotenv()
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 logger = logging.getLogger('django')
 
-def get_openai_moderation_client() -> OpenAIModerationChain:
+WHISPER_PROMPT_CONTEXT_CHARS = 400
+
+# The OpenAI SDK and LangChain integrations are imported by the factories below, so importing this
+# module stays cheap; clients are created on first use through the provider registry and then shared.
+
+def get_openai_moderation_client() -> "OpenAIModerationChain":
+    from langchain.chains import OpenAIModerationChain
+
     moderate = OpenAIModerationChain()
     logger.info("OpenAI Moderation client initialised")
     return moderate
 
-def get_openai_embedding_client() -> OpenAIEmbeddings:
+def is_fake_provider() -> bool:
+    return settings.AI_PROVIDER == "fake"
+
+def create_openai_embedding_client() -> Embeddings:
+    if is_fake_provider():
+        from core.utils.fake_openai_utils import FakeEmbeddings
+
+        logger.info("Fake Embedding client initialised")
+        return FakeEmbeddings()
+    from langchain_openai import OpenAIEmbeddings
+
     logger.info("OpenAI Embedding client initialised")
     return OpenAIEmbeddings(model="text-embedding-3-small", dimensions=1536, api_key=OPENAI_API_KEY)
 
-def get_embedding(content: str, embedding_client: OpenAIEmbeddings = get_openai_embedding_client()) -> List[float]:   
-    embedding = embedding_client.embed_query(content)
-    logger.info("Text converted to embeddings")
-    return embedding
+def create_openai_llm_client() -> BaseChatModel:
+    if is_fake_provider():
+        from core.utils.fake_openai_utils import FakeChatModel
+
+        logger.info("Fake LLM client initialised")
+        return FakeChatModel()
+    from langchain_openai import ChatOpenAI
 
-def get_openai_llm_client() -> ChatOpenAI:
     llm = ChatOpenAI(
         model="gpt-4o",
         temperature=0,
@@ -39,20 +68,153 @@ def get_openai_llm_client() -> ChatOpenAI:
     logger.info("OpenAI LLM client initialised")
     return llm
 
-def get_whisper_client() -> BaseOpenAI:
+def create_whisper_client() -> "BaseOpenAI":
+    if is_fake_provider():
+        from core.utils.fake_openai_utils import FakeWhisperClient
+
+        logger.info("Fake Whisper client initialised")
+        return FakeWhisperClient()
+    from openai import OpenAI as BaseOpenAI
+
     client = BaseOpenAI(api_key=OPENAI_API_KEY)
     logger.info("OpenAI Whisper client initialised")
     return client
 
-def get_transcription(file_path: str, client: BaseOpenAI = get_whisper_client()) -> str:
+def create_async_whisper_client() -> "AsyncOpenAI":
+    if is_fake_provider():
+        from core.utils.fake_openai_utils import AsyncFakeWhisperClient
+
+        logger.info("Async fake Whisper client initialised")
+        return AsyncFakeWhisperClient()
+    from openai import AsyncOpenAI
+
+    client = AsyncOpenAI(api_key=OPENAI_API_KEY)
+    logger.info("Async OpenAI Whisper client initialised")
+    return client
+
+provider_registry = get_provider_registry()
+provider_registry.register("embedding_client", create_openai_embedding_client)
+provider_registry.register("llm_client", create_openai_llm_client)
+provider_registry.register("whisper_client", create_whisper_client)
+provider_registry.register("async_whisper_client", create_async_whisper_client)
+
+def get_openai_embedding_client() -> Embeddings:
+    return get_provider_registry().get("embedding_client")
+
+def get_openai_llm_client() -> BaseChatModel:
+    return get_provider_registry().get("llm_client")
+
+def get_whisper_client() -> "BaseOpenAI":
+    return get_provider_registry().get("whisper_client")
+
+def get_async_whisper_client() -> "AsyncOpenAI":
+    return get_provider_registry().get("async_whisper_client")
+
+class TokenUsageCallback(BaseCallbackHandler):
+    # Runs on the event loop rather than in an executor, it only updates counters
+    run_inline = True
+
+    def __init__(self, tracker: StageTracker):
+        self.tracker = tracker
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                self.tracker.record_usage(getattr(message, "usage_metadata", None))
+
+def get_embedding(content: str, embedding_client: Optional[Embeddings] = None) -> List[float]:
+    embedding = get_embeddings([content], embedding_client)[0]
+    logger.info("Text converted to embeddings")
+    return embedding
+
+def get_embeddings(contents: List[str], embedding_client: Optional[Embeddings] = None) -> List[List[float]]:
+    if not contents:
+        return []
+
+    embedding_client = embedding_client or get_openai_embedding_client()
+    embedding_cache = get_embedding_cache()
+    embeddings = embedding_cache.get_many(embedding_client.model, embedding_client.dimensions, contents)
+    missing = [content for content in dict.fromkeys(contents) if content not in embeddings]
+
+    if missing:
+        with track_stage("embedding", missing):
+            new_embeddings = dict(zip(missing, embedding_client.embed_documents(missing)))
+        embedding_cache.set_many(embedding_client.model, embedding_client.dimensions, new_embeddings)
+        embeddings.update(new_embeddings)
+        logger.info(f"{len(missing)} texts converted to embeddings, {len(contents) - len(missing)} served from cache")
+
+    return [embeddings[content] for content in contents]
+
+async def aget_embeddings(contents: List[str], embedding_client: Optional[Embeddings] = None) -> List[List[float]]:
+    if not contents:
+        return []
+
+    embedding_client = embedding_client or get_openai_embedding_client()
+    # The cache's database tier uses the ORM, which must not run on the event loop
+    embedding_cache = get_embedding_cache()
+    embeddings = await sync_to_async(embedding_cache.get_many, thread_sensitive=False)(embedding_client.model, embedding_client.dimensions, contents)
+    missing = [content for content in dict.fromkeys(contents) if content not in embeddings]
+
+    if missing:
+        with track_stage("embedding", missing):
+            new_embeddings = dict(zip(missing, await embedding_client.aembed_documents(missing)))
+        await sync_to_async(embedding_cache.set_many, thread_sensitive=False)(embedding_client.model, embedding_client.dimensions, new_embeddings)
+        embeddings.update(new_embeddings)
+        logger.info(f"{len(missing)} texts converted to embeddings, {len(contents) - len(missing)} served from cache")
+
+    return [embeddings[content] for content in contents]
+
+def get_transcription_prompt(previous_transcript: str = "") -> str:
     prompt = "This audio chunk is part of a conversation between a call center staff and a customer. Do not attempt to complete any cut-off words; transcribe only what is clearly audible."
-    
-    with open(file_path, "rb") as audio_file:
+    if previous_transcript:
+        # Whisper only reads the last 224 tokens of the prompt, so pass just the end of the call so far
+        prompt = f"{prompt} {previous_transcript[-WHISPER_PROMPT_CONTEXT_CHARS:]}"
+    return prompt
+
+AudioInput = Union[str, BinaryIO, Tuple[str, bytes]]
+
+def get_audio_size(audio: AudioInput) -> int:
+    if isinstance(audio, tuple):
+        return len(audio[1])
+    position = audio.tell()
+    size = audio.seek(0, io.SEEK_END)
+    audio.seek(position)
+    return size
+
+def get_transcription(audio: AudioInput, client: Optional["BaseOpenAI"] = None, previous_transcript: str = "") -> str:
+    # Accepts a file path, or a file-like object / (filename, bytes) tuple that is sent without touching disk
+    if isinstance(audio, str):
+        with open(audio, "rb") as audio_file:
+            return get_transcription(audio_file, client, previous_transcript)
+
+    client = client or get_whisper_client()
+    with track_stage("whisper", get_audio_size(audio)):
         transcription = client.audio.transcriptions.create(
             model="whisper-1",
-            file=audio_file,
+            file=audio,
+            temperature=0,
+            prompt=get_transcription_prompt(previous_transcript),
+            language="en",
+            response_format="text"
+        )
+
+    transcript = transcription.replace("...", "")
+    logger.info("Audio transcription is completed")
+    return transcript
+
+async def aget_transcription(audio: AudioInput, client: Optional["AsyncOpenAI"] = None, previous_transcript: str = "") -> str:
+    if isinstance(audio, str):
+        with open(audio, "rb") as audio_file:
+            return await aget_transcription(audio_file, client, previous_transcript)
+
+    client = client or get_async_whisper_client()
+    with track_stage("whisper", get_audio_size(audio)):
+        transcription = await client.audio.transcriptions.create(
+            model="whisper-1",
+            file=audio,
             temperature=0,
-            prompt=prompt,
+            prompt=get_transcription_prompt(previous_transcript),
             language="en",
             response_format="text"
         )
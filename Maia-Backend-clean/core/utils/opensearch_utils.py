@@ -1,13 +1,20 @@
-from core.utils.openai_utils import get_openai_embedding_client
+from core.utils.openai_utils import get_openai_embedding_client, get_embeddings, aget_embeddings
+from core.utils.memory_vector_store_utils import get_memory_vector_store, get_async_memory_vector_store
+from core.utils.metrics_utils import track_stage, get_metrics_registry, CollectedMetric, LabelValues
 from langchain_community.vectorstores import OpenSearchVectorSearch
+from opensearchpy import OpenSearch, AsyncOpenSearch, RequestsHttpConnection, AWSV4SignerAsyncAuth
+from opensearchpy.helpers import streaming_bulk
 from requests_aws4auth import AWS4Auth
-from opensearchpy import RequestsHttpConnection
-from opensearchpy import OpenSearch, RequestsHttpConnection
-from requests_aws4auth import AWS4Auth
-from typing import List
+from collections import Counter
+from typing import List, Dict, Any, AsyncIterator, Optional, Tuple
 from dotenv import load_dotenv
+from django.conf import settings
+import threading
+import asyncio
+import weakref
 import boto3
 import logging
+import time
 import os
 
 load_dotenv()
@@ -16,22 +23,316 @@ logger = logging.getLogger('django')
 AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
 AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
 
+OPENSEARCH_DOMAIN = "vector-kb"
+OPENSEARCH_REGION = "ap-southeast-1"
+OPENSEARCH_INDEX = "vector-kb-index"
+OPENSEARCH_ENDPOINT_TTL = int(os.getenv("OPENSEARCH_ENDPOINT_TTL", "3600"))
+OPENSEARCH_POOL_MAXSIZE = int(os.getenv("OPENSEARCH_POOL_MAXSIZE", "20"))
+OPENSEARCH_TIMEOUT = 30
+KNN_TOP_K = 4
+KNN_SCORE_THRESHOLD = 1.5
+
+
+class OpenSearchConnectionManager:
+    """
+    Process-wide cache of OpenSearch endpoints and clients.
+
+    The domain endpoint is resolved through the AWS control plane once and refreshed after
+    `endpoint_ttl` seconds. One pooled client is kept per domain and one vector store per
+    domain/index, so requests reuse open TLS connections instead of building new clients.
+    """
+
+    def __init__(self, endpoint_ttl: int = OPENSEARCH_ENDPOINT_TTL, pool_maxsize: int = OPENSEARCH_POOL_MAXSIZE):
+        self.endpoint_ttl = endpoint_ttl
+        self.pool_maxsize = pool_maxsize
+        self._lock = threading.RLock()
+        self._endpoints: Dict[Tuple[str, str], Tuple[str, float]] = {}
+        self._refreshing = set()
+        self._auths: Dict[str, AWS4Auth] = {}
+        self._clients: Dict[Tuple[str, str], Tuple[str, OpenSearch]] = {}
+        self._vector_stores: Dict[Tuple[str, str, str, bool], Tuple[str, OpenSearchVectorSearch]] = {}
+        # aiohttp sessions belong to the event loop that created them, so async clients are kept per loop
+        self._async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple[str, str], Tuple[str, AsyncOpenSearch]]]" = weakref.WeakKeyDictionary()
+        self._loop_watchers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncIterator[None]]" = weakref.WeakKeyDictionary()
+        self._stats = Counter()
+
+    def get_auth(self, region: str) -> AWS4Auth:
+        with self._lock:
+            if region not in self._auths:
+                self._auths[region] = AWS4Auth(AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, region, 'es', session_token=None)
+            return self._auths[region]
+
+    def get_endpoint(self, domain_name: str, region: str) -> str:
+        key = (domain_name, region)
+        with self._lock:
+            cached = self._endpoints.get(key)
+            if cached is not None:
+                endpoint, resolved_at = cached
+                if time.monotonic() - resolved_at < self.endpoint_ttl or key in self._refreshing:
+                    # Other threads keep using the current endpoint while one thread refreshes it
+                    return endpoint
+            self._refreshing.add(key)
+
+        try:
+            endpoint = get_opensearch_endpoint(domain_name, region)
+        except Exception as e:
+            if cached is None:
+                raise
+            logger.error(f"Failed to refresh Opensearch endpoint, using cached value: {e}")
+            with self._lock:
+                self._stats["endpoint_refresh_failures"] += 1
+            endpoint = cached[0]
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+        with self._lock:
+            self._endpoints[key] = (endpoint, time.monotonic())
+            self._stats["endpoint_resolutions"] += 1
+        return endpoint
+
+    def get_cluster_client(self, domain_name: str, region: str) -> OpenSearch:
+        key = (domain_name, region)
+        endpoint = self.get_endpoint(domain_name, region)
+
+        with self._lock:
+            cached = self._clients.get(key)
+            if cached is not None and cached[0] == endpoint:
+                self._stats["client_hits"] += 1
+                return cached[1]
+
+            opensearch_client = OpenSearch(
+                hosts=[{'host': endpoint, 'port': 443}],
+                http_auth=self.get_auth(region),
+                use_ssl=True,
+                verify_certs=True,
+                connection_class=RequestsHttpConnection,
+                pool_maxsize=self.pool_maxsize,
+                timeout=OPENSEARCH_TIMEOUT
+            )
+            self._clients[key] = (endpoint, opensearch_client)
+            self._stats["client_misses"] += 1
+
+        logger.info("Opensearch cluster client initialised")
+        return opensearch_client
+
+    def get_vector_store(self, domain_name: str, region: str, index_name: str, is_aoss: bool = False) -> OpenSearchVectorSearch:
+        key = (domain_name, region, index_name, is_aoss)
+        endpoint = self.get_endpoint(domain_name, region)
+
+        with self._lock:
+            cached = self._vector_stores.get(key)
+            if cached is not None and cached[0] == endpoint:
+                self._stats["vector_store_hits"] += 1
+                return cached[1]
+
+            docsearch = OpenSearchVectorSearch(
+                index_name=index_name,
+                embedding_function=get_openai_embedding_client(),
+                opensearch_url=f"https://{endpoint}",
+                http_auth=self.get_auth(region),
+                timeout=OPENSEARCH_TIMEOUT,
+                is_aoss=is_aoss,
+                connection_class=RequestsHttpConnection,
+                pool_maxsize=self.pool_maxsize,
+                use_ssl=True,
+                verify_certs=True,
+            )
+            self._vector_stores[key] = (endpoint, docsearch)
+            self._stats["vector_store_misses"] += 1
+
+        logger.info("Opensearch vector store initialised")
+        return docsearch
+
+    def _is_fresh(self, domain_name: str, region: str) -> bool:
+        cached = self._endpoints.get((domain_name, region))
+        return cached is not None and time.monotonic() - cached[1] < self.endpoint_ttl
+
+    async def aget_cluster_client(self, domain_name: str, region: str) -> OpenSearch:
+        # Cold or expired lookups hit the AWS control plane, so keep them off the event loop
+        if self._is_fresh(domain_name, region):
+            return self.get_cluster_client(domain_name, region)
+        return await asyncio.to_thread(self.get_cluster_client, domain_name, region)
+
+    async def aget_vector_store(self, domain_name: str, region: str, index_name: str, is_aoss: bool = False) -> OpenSearchVectorSearch:
+        if self._is_fresh(domain_name, region):
+            return self.get_vector_store(domain_name, region, index_name, is_aoss)
+        return await asyncio.to_thread(self.get_vector_store, domain_name, region, index_name, is_aoss)
+
+    async def aget_async_cluster_client(self, domain_name: str, region: str) -> AsyncOpenSearch:
+        if self._is_fresh(domain_name, region):
+            endpoint = self.get_endpoint(domain_name, region)
+        else:
+            endpoint = await asyncio.to_thread(self.get_endpoint, domain_name, region)
+
+        loop = asyncio.get_running_loop()
+        key = (domain_name, region)
+        replaced = None
+        with self._lock:
+            self._drop_closed_loops()
+            loop_clients = self._async_clients.setdefault(loop, {})
+            cached = loop_clients.get(key)
+            if cached is not None and cached[0] == endpoint:
+                self._stats["async_client_hits"] += 1
+                return cached[1]
+            replaced = cached[1] if cached is not None else None
+
+            credentials = boto3.Session(aws_access_key_id=AWS_ACCESS_KEY_ID, aws_secret_access_key=AWS_SECRET_ACCESS_KEY).get_credentials()
+            async_client = AsyncOpenSearch(
+                hosts=[{'host': endpoint, 'port': 443}],
+                http_auth=AWSV4SignerAsyncAuth(credentials, region, 'es'),
+                use_ssl=True,
+                verify_certs=True,
+                maxsize=self.pool_maxsize,
+                timeout=OPENSEARCH_TIMEOUT
+            )
+            loop_clients[key] = (endpoint, async_client)
+            self._stats["async_client_misses"] += 1
+            watcher = None
+            if loop not in self._loop_watchers:
+                watcher = self._loop_watchers[loop] = self._close_on_loop_shutdown()
+
+        if watcher is not None:
+            # Starts the watcher on this loop, which finalises it, and so closes the clients, when it shuts down
+            await watcher.__anext__()
+        if replaced is not None:
+            # The endpoint changed, the old client's connections are of no further use
+            await replaced.close()
+        logger.info("Async Opensearch cluster client initialised")
+        return async_client
+
+    async def _close_on_loop_shutdown(self) -> AsyncIterator[None]:
+        """
+        Suspended until the event loop finalises its async generators, which `asyncio.run`, uvicorn and
+        asgiref do before closing it, and then closes the loop's clients while the loop can still run them.
+        """
+        try:
+            yield
+        finally:
+            await self.aclose_async_clients()
+
+    async def aclose_async_clients(self) -> None:
+        """Closes the async clients created on the running event loop."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            loop_clients = self._async_clients.pop(loop, {})
+            self._loop_watchers.pop(loop, None)
+        for endpoint, async_client in loop_clients.values():
+            try:
+                await async_client.close()
+            except Exception as e:
+                logger.error(f"Error closing async Opensearch client for {endpoint}: {e}")
+        if loop_clients:
+            logger.info(f"{len(loop_clients)} async Opensearch clients closed")
+
+    def _drop_closed_loops(self) -> None:
+        # Loops closed without finalising their async generators leave clients that can no longer be closed
+        for loop in [loop for loop in self._async_clients.keys() if loop.is_closed()]:
+            logger.warning(f"Dropping {len(self._async_clients[loop])} async Opensearch clients of a closed event loop")
+            del self._async_clients[loop]
+            self._loop_watchers.pop(loop, None)
+
+    def get_pool_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            clients = [(f"{domain}/{region}", endpoint, client) for (domain, region), (endpoint, client) in self._clients.items()]
+            clients += [(f"{domain}/{region}/{index}", endpoint, store.client) for (domain, region, index, _), (endpoint, store) in self._vector_stores.items()]
+            stats = dict(self._stats)
+
+        stats["endpoints"] = len(self._endpoints)
+        stats["async_clients"] = sum(len(loop_clients) for loop_clients in list(self._async_clients.values()))
+        stats["pools"] = [
+            {"name": name, "endpoint": endpoint, "connections": _get_connection_stats(client)}
+            for name, endpoint, client in clients
+        ]
+        return stats
+
+    def reset(self) -> None:
+        with self._lock:
+            self._endpoints.clear()
+            self._clients.clear()
+            self._vector_stores.clear()
+            self._async_clients.clear()
+            self._loop_watchers.clear()
+            self._stats.clear()
+
+
+def _get_connection_stats(opensearch_client: OpenSearch) -> List[Dict[str, Any]]:
+    connection_stats = []
+    for connection in opensearch_client.transport.connection_pool.connections:
+        session = getattr(connection, "session", None)
+        if session is None:
+            continue
+        for prefix, adapter in session.adapters.items():
+            pool_manager = getattr(adapter, "poolmanager", None)
+            if pool_manager is None:
+                continue
+            for pool_key in pool_manager.pools.keys():
+                pool = pool_manager.pools[pool_key]
+                connection_stats.append({
+                    "host": pool.host,
+                    "max_size": pool.pool.maxsize if pool.pool is not None else 0,
+                    "idle": pool.pool.qsize() if pool.pool is not None else 0,
+                    "opened": pool.num_connections,
+                    "requests": pool.num_requests,
+                })
+    return connection_stats
+
+
+_connection_manager: Optional[OpenSearchConnectionManager] = None
+_connection_manager_lock = threading.Lock()
+
+
+def get_connection_manager() -> OpenSearchConnectionManager:
+    global _connection_manager
+    if _connection_manager is None:
+        with _connection_manager_lock:
+            if _connection_manager is None:
+                _connection_manager = OpenSearchConnectionManager()
+    return _connection_manager
+
+
+def get_opensearch_pool_stats() -> Dict[str, Any]:
+    return get_connection_manager().get_pool_stats()
+
+
+def _collect_connection_stats(field: str) -> Dict[LabelValues, float]:
+    values: Dict[LabelValues, float] = {}
+    for pool in get_opensearch_pool_stats()["pools"]:
+        for connection in pool["connections"]:
+            label_values = (pool["name"], connection["host"])
+            values[label_values] = values.get(label_values, 0) + connection[field]
+    return values
+
+
+def register_pool_metrics() -> None:
+    """Exports the client cache and connection pool statistics of `get_opensearch_pool_stats` to the metrics registry."""
+    registry = get_metrics_registry()
+    registry.register(CollectedMetric(
+        "maia_opensearch_client_events_total", "OpenSearch client cache hits and misses and endpoint resolutions, by event.", ["event"],
+        lambda: {(event,): value for event, value in get_opensearch_pool_stats().items() if event not in ("endpoints", "async_clients", "pools")},
+        "counter",
+    ))
+    registry.register(CollectedMetric("maia_opensearch_async_clients", "Async OpenSearch clients open across event loops.", [], lambda: {(): get_opensearch_pool_stats()["async_clients"]}))
+    registry.register(CollectedMetric("maia_opensearch_pool_max_connections", "Connections each OpenSearch pool keeps, by client and host.", ["pool", "host"], lambda: _collect_connection_stats("max_size")))
+    registry.register(CollectedMetric("maia_opensearch_pool_idle_connections", "Idle connections in each OpenSearch pool, by client and host.", ["pool", "host"], lambda: _collect_connection_stats("idle")))
+    registry.register(CollectedMetric("maia_opensearch_pool_connections_opened_total", "Connections opened by each OpenSearch pool, by client and host.", ["pool", "host"], lambda: _collect_connection_stats("opened"), "counter"))
+    registry.register(CollectedMetric("maia_opensearch_pool_requests_total", "Requests sent through each OpenSearch pool, by client and host.", ["pool", "host"], lambda: _collect_connection_stats("requests"), "counter"))
+
+
+def is_memory_vector_store() -> bool:
+    return settings.VECTOR_STORE_PROVIDER == "memory"
+
+
 def get_opensearch_cluster_client(domain_name: str, region: str) -> OpenSearch:
-    
-    aws_auth = AWS4Auth(AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, region, 'es', session_token=None)
-    opensearch_endpoint = get_opensearch_endpoint(domain_name, region)
-
-    opensearch_client = OpenSearch(
-        hosts=[{'host': opensearch_endpoint, 'port': 443}],
-        http_auth=aws_auth,
-        use_ssl=True,
-        verify_certs=True,
-        connection_class=RequestsHttpConnection,
-        timeout=30
-    )
-    
-    logger.info("Opensearch cluster client initialised")
-    return opensearch_client
+    if is_memory_vector_store():
+        return get_memory_vector_store()
+    return get_connection_manager().get_cluster_client(domain_name, region)
+
+
+async def aget_opensearch_cluster_client(domain_name: str, region: str) -> AsyncOpenSearch:
+    if is_memory_vector_store():
+        return get_async_memory_vector_store()
+    return await get_connection_manager().aget_async_cluster_client(domain_name, region)
 
 
 def get_opensearch_endpoint(domain_name: str, region: str) -> str:
@@ -94,6 +395,38 @@ def add_document(opensearch_client: OpenSearch, index_name: str, embedding: List
     return response['_id']
 
 
+def add_documents_bulk(opensearch_client: OpenSearch, index_name: str, documents: List[Dict[str, Any]], chunk_size: int = 500) -> Tuple[List[str], List[str]]:
+    # Documents are indexed under their postgresql_id so that retrying a failed item never duplicates it
+    actions = (
+        {
+            "_index": index_name,
+            "_id": str(document["postgresql_id"]),
+            "_source": document,
+        }
+        for document in documents
+    )
+
+    indexed_ids, failed_ids = [], []
+    for ok, item in streaming_bulk(
+        opensearch_client,
+        actions,
+        chunk_size=chunk_size,
+        max_retries=2,
+        raise_on_error=False,
+        raise_on_exception=False,
+        yield_ok=True,
+    ):
+        result = item.get("index", {})
+        if ok:
+            indexed_ids.append(result["_id"])
+        else:
+            logger.error(f"Failed to add document {result.get('_id')} to opensearch: {result.get('error')}")
+            failed_ids.append(result.get("_id"))
+
+    logger.info(f"{len(indexed_ids)} documents added to opensearch in bulk")
+    return indexed_ids, failed_ids
+
+
 def delete_opensearch_index(opensearch_client: str, index_name: str) -> bool:
     logger.info(f"Trying to delete index {index_name}")
     try:
@@ -105,35 +438,76 @@ def delete_opensearch_index(opensearch_client: str, index_name: str) -> bool:
         return True
 
 
-def search_vector_db(query: str, _is_aoss=False) -> List[str]:
-    
-    aws_auth = AWS4Auth(AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, "ap-southeast-1", 'es', session_token=None)
-    opensearch_endpoint = get_opensearch_endpoint("vector-kb", "ap-southeast-1")
-
-    docsearch = OpenSearchVectorSearch(
-        index_name="vector-kb-index",
-        embedding_function=get_openai_embedding_client(),
-        opensearch_url=f"https://{opensearch_endpoint}",
-        http_auth=aws_auth,
-        timeout=30,
-        is_aoss=_is_aoss,
-        connection_class=RequestsHttpConnection,
-        use_ssl=True,
-        verify_certs=True,
-    )
+def search_vector_db(query: str) -> List[Tuple[int, str]]:
+    # Goes through the configured vector store provider like the batch search
+    return search_vector_db_batch([query]).get(query, [])
 
-    docs = docsearch.similarity_search_with_score(
-        query,
-        search_type="script_scoring",
-        space_type="cosinesimil",
-        vector_field="embedding",
-        text_field="content",
-        score_threshold=1.5
-    )
 
-    contexts = []
-    for doc in docs:
-        contexts.append((doc[0].metadata["postgresql_id"], doc[0].page_content))
-    
-    logger.info("Similar documents retrieved from Opensearch for context")
-    return contexts
\ No newline at end of file
+def build_knn_query(embedding: List[float], k: int = KNN_TOP_K, score_threshold: float = KNN_SCORE_THRESHOLD) -> Dict[str, Any]:
+    # Same script scoring query as OpenSearchVectorSearch, without returning the stored vectors
+    return {
+        "size": k,
+        "min_score": score_threshold,
+        "_source": {"excludes": ["embedding"]},
+        "query": {
+            "script_score": {
+                "query": {"match_all": {}},
+                "script": {
+                    "source": "knn_score",
+                    "lang": "knn",
+                    "params": {
+                        "field": "embedding",
+                        "query_value": embedding,
+                        "space_type": "cosinesimil",
+                    },
+                },
+            }
+        },
+    }
+
+
+def build_msearch_body(embeddings: List[List[float]]) -> List[Dict[str, Any]]:
+    body = []
+    for embedding in embeddings:
+        body.append({"index": OPENSEARCH_INDEX})
+        body.append(build_knn_query(embedding))
+    return body
+
+
+def parse_msearch_response(queries: List[str], response: Dict[str, Any]) -> Dict[str, List[Tuple[int, str]]]:
+    contexts = {}
+    for query, result in zip(queries, response["responses"]):
+        if "error" in result:
+            logger.error(f"Opensearch search failed for summarised query: {result['error']}")
+            contexts[query] = []
+            continue
+        contexts[query] = [(hit["_source"]["postgresql_id"], hit["_source"]["content"]) for hit in result["hits"]["hits"]]
+
+    logger.info(f"Similar documents retrieved from Opensearch for {len(queries)} queries in one request")
+    return contexts
+
+
+def search_vector_db_batch(queries: List[str]) -> Dict[str, List[Tuple[int, str]]]:
+    unique_queries = list(dict.fromkeys(queries))
+    if not unique_queries:
+        return {}
+
+    embeddings = get_embeddings(unique_queries)
+    opensearch_client = get_opensearch_cluster_client(OPENSEARCH_DOMAIN, OPENSEARCH_REGION)
+    with track_stage("vector_search"):
+        response = opensearch_client.msearch(body=build_msearch_body(embeddings))
+
+    return parse_msearch_response(unique_queries, response)
+
+
+async def asearch_vector_db_batch(queries: List[str]) -> Dict[str, List[Tuple[int, str]]]:
+    unique_queries = list(dict.fromkeys(queries))
+    if not unique_queries:
+        return {}
+
+    embeddings = await aget_embeddings(unique_queries)
+    opensearch_client = await aget_opensearch_cluster_client(OPENSEARCH_DOMAIN, OPENSEARCH_REGION)
+    with track_stage("vector_search"):
+        response = await opensearch_client.msearch(body=build_msearch_body(embeddings))
+
+    return parse_msearch_response(unique_queries, response)
\ No newline at end of file
@@ -0,0 +1,170 @@
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+import threading
+import logging
+import time
+import sys
+import os
+
+logger = logging.getLogger('django')
+
+# Providers to load when a worker starts: empty for none, "all", or comma separated provider names
+PROVIDER_WARMUP = os.getenv("PROVIDER_WARMUP", "")
+
+
+@dataclass
+class Provider:
+    name: str
+    factory: Callable[[], Any]
+    warmup: Optional[Callable[[Any], None]] = None
+    instance: Any = None
+    loaded: bool = False
+    init_seconds: Optional[float] = None
+    warmup_seconds: Optional[float] = None
+    error: Optional[str] = None
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+class ProviderRegistry:
+    """
+    Heavy models and API clients, created on first use and shared by the whole process after that.
+
+    Modules register a factory when they are imported, which costs nothing, so management commands and
+    migrations never load a model they do not use. `warmup` creates providers ahead of traffic and runs
+    their optional warmup hook, e.g. a first inference that initialises the model's weights.
+    """
+
+    def __init__(self):
+        self._providers: Dict[str, Provider] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, factory: Callable[[], Any], warmup: Optional[Callable[[Any], None]] = None) -> None:
+        with self._lock:
+            if name not in self._providers:
+                self._providers[name] = Provider(name, factory, warmup)
+
+    def names(self) -> List[str]:
+        return list(self._providers)
+
+    def is_loaded(self, name: str) -> bool:
+        return self._get_provider(name).loaded
+
+    def get(self, name: str) -> Any:
+        provider = self._get_provider(name)
+        if not provider.loaded:
+            with provider.lock:
+                if not provider.loaded:
+                    start_time = time.perf_counter()
+                    provider.instance = provider.factory()
+                    provider.init_seconds = time.perf_counter() - start_time
+                    provider.loaded = True
+                    logger.info(f"Provider {name} initialised in {provider.init_seconds * 1000:.1f}ms")
+        return provider.instance
+
+    def reset(self, name: Optional[str] = None) -> None:
+        """Drops loaded providers, so the next `get` creates them again, e.g. after a settings change."""
+        for provider in [self._get_provider(name)] if name else list(self._providers.values()):
+            with provider.lock:
+                provider.instance = None
+                provider.loaded = False
+                provider.init_seconds = provider.warmup_seconds = None
+                provider.error = None
+
+    def warmup(self, names: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, Any]]:
+        """Loads and warms up the given providers, or all of them. A provider that fails is logged and skipped."""
+        for name in list(names) if names is not None else self.names():
+            try:
+                provider = self._get_provider(name)
+            except ValueError as e:
+                # A typo in PROVIDER_WARMUP must not stop the worker from starting
+                logger.error(f"Warmup of provider {name} skipped: {e}")
+                continue
+            try:
+                instance = self.get(name)
+                if provider.warmup and provider.warmup_seconds is None:
+                    start_time = time.perf_counter()
+                    provider.warmup(instance)
+                    provider.warmup_seconds = time.perf_counter() - start_time
+            except Exception as e:
+                provider.error = str(e)
+                logger.error(f"Warmup of provider {name} failed: {e}")
+        return self.get_report()
+
+    def get_report(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            name: {
+                "loaded": provider.loaded,
+                "init_ms": round(provider.init_seconds * 1000, 1) if provider.init_seconds is not None else None,
+                "warmup_ms": round(provider.warmup_seconds * 1000, 1) if provider.warmup_seconds is not None else None,
+                **({"error": provider.error} if provider.error else {}),
+            }
+            for name, provider in self._providers.items()
+        }
+
+    def _get_provider(self, name: str) -> Provider:
+        provider = self._providers.get(name)
+        if provider is None:
+            raise ValueError(f"Unknown provider {name}, registered providers are {self.names()}")
+        return provider
+
+
+_provider_registry: Optional[ProviderRegistry] = None
+_provider_registry_lock = threading.Lock()
+
+
+def get_provider_registry() -> ProviderRegistry:
+    global _provider_registry
+    if _provider_registry is None:
+        with _provider_registry_lock:
+            if _provider_registry is None:
+                _provider_registry = ProviderRegistry()
+    return _provider_registry
+
+
+def get_warmup_providers(setting: str = PROVIDER_WARMUP) -> List[str]:
+    if setting.strip().lower() == "all":
+        return get_provider_registry().names()
+    return [name.strip() for name in setting.split(",") if name.strip()]
+
+
+def get_max_rss_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:
+        # Not available on Windows
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS and in kilobytes elsewhere
+    return round(max_rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+class StartupTimer:
+    """Times the phases of a process start and reports them with the providers that were loaded."""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = time.perf_counter() - start_time
+
+    def get_report(self) -> Dict[str, Any]:
+        return {
+            "total_ms": round((time.perf_counter() - self.started_at) * 1000, 1),
+            "phases_ms": {name: round(seconds * 1000, 1) for name, seconds in self.phases.items()},
+            "max_rss_mb": get_max_rss_mb(),
+            "providers": get_provider_registry().get_report(),
+        }
+
+    def log(self) -> Dict[str, Any]:
+        report = self.get_report()
+        phases = ", ".join(f"{name} {ms}ms" for name, ms in report["phases_ms"].items())
+        loaded = [name for name, provider in report["providers"].items() if provider["loaded"]]
+        logger.info(f"Startup completed in {report['total_ms']}ms ({phases}), max RSS {report['max_rss_mb']}MB, providers loaded: {', '.join(loaded) or 'none'}")
+        return report
@@ -0,0 +1,131 @@
+from core.utils.metrics_utils import get_metrics_registry, CollectedMetric
+from dataclasses import dataclass
+from collections import Counter
+from typing import List, Dict, Any, Optional, Union
+import threading
+import logging
+import os
+import re
+
+logger = logging.getLogger('django')
+
+QUERY_PLANNER_ENABLED = os.getenv("QUERY_PLANNER_ENABLED", "true").lower() == "true"
+QUERY_PLANNER_MAX_WORDS = int(os.getenv("QUERY_PLANNER_MAX_WORDS", "40"))
+
+QUESTION_START_PATTERN = re.compile(r"(?:^|[.?!;]\s+)(?:how|what|when|where|why|who|which|can|could|is|are|do|does|did|will|would|should|may|am)\b", re.IGNORECASE)
+MULTI_INTENT_PATTERN = re.compile(r"\b(?:also|another|additionally|secondly|besides|as well as|apart from|on top of that|and then)\b|^\s*(?:\d+[.)]|[-*•])\s", re.IGNORECASE | re.MULTILINE)
+
+
+@dataclass
+class QueryPlan:
+    needs_summary: bool
+    reason: str
+    queries: Optional[List[str]] = None
+
+
+class QueryPlanner:
+    """
+    Decides before retrieval whether a query has to be split into sub-queries by the LLM.
+
+    Short queries that read as a single question or request go straight to retrieval as they are.
+    Transcripts, long texts and texts with several questions or enumeration cues are still summarised.
+    Every decision is counted, together with the latency and tokens of the summaries that did run,
+    so `get_stats` can estimate what the skipped summaries saved.
+    """
+
+    def __init__(self, enabled: bool = QUERY_PLANNER_ENABLED, max_words: int = QUERY_PLANNER_MAX_WORDS):
+        self.enabled = enabled
+        self.max_words = max_words
+        self._lock = threading.Lock()
+        self._decisions = Counter()
+        self._summary_stats = Counter()
+
+    def plan(self, query: Union[str, List[Dict[str, Any]]]) -> QueryPlan:
+        query_plan = self._plan(query)
+        with self._lock:
+            self._decisions[query_plan.reason] += 1
+        logger.info(f"Query plan: {'summarise' if query_plan.needs_summary else 'skip summary'} ({query_plan.reason})")
+        return query_plan
+
+    def _plan(self, query: Union[str, List[Dict[str, Any]]]) -> QueryPlan:
+        if not self.enabled:
+            return QueryPlan(True, "planner_disabled")
+        if not isinstance(query, str):
+            return QueryPlan(True, "conversation")
+
+        text = query.strip()
+        if not text:
+            return QueryPlan(True, "empty")
+        if len(text.split()) > self.max_words:
+            return QueryPlan(True, "long_query")
+        if text.count("?") > 1 or len(QUESTION_START_PATTERN.findall(text)) > 1:
+            return QueryPlan(True, "multiple_questions")
+        if MULTI_INTENT_PATTERN.search(text):
+            return QueryPlan(True, "multi_intent_cue")
+        return QueryPlan(False, "single_intent", [text])
+
+    def record_summary(self, seconds: float, usage: Optional[Dict[str, Any]] = None) -> None:
+        usage = usage or {}
+        with self._lock:
+            self._summary_stats["count"] += 1
+            self._summary_stats["seconds"] += seconds
+            self._summary_stats["input_tokens"] += usage.get("input_tokens", 0)
+            self._summary_stats["output_tokens"] += usage.get("output_tokens", 0)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            decisions = dict(self._decisions)
+            summary_stats = dict(self._summary_stats)
+
+        skipped = decisions.get("single_intent", 0)
+        summaries = summary_stats.get("count", 0)
+        stats = {
+            "decisions": decisions,
+            "skipped": skipped,
+            "summarised": summaries,
+            "summary_seconds": round(summary_stats.get("seconds", 0.0), 4),
+            "summary_input_tokens": summary_stats.get("input_tokens", 0),
+            "summary_output_tokens": summary_stats.get("output_tokens", 0),
+        }
+        if summaries:
+            average_seconds = summary_stats["seconds"] / summaries
+            average_tokens = (summary_stats["input_tokens"] + summary_stats["output_tokens"]) / summaries
+            stats["average_summary_seconds"] = round(average_seconds, 4)
+            stats["average_summary_tokens"] = round(average_tokens, 1)
+            # Skipped queries are short, so this overestimates tokens slightly and is a fair guess for latency
+            stats["estimated_saved_seconds"] = round(skipped * average_seconds, 2)
+            stats["estimated_saved_tokens"] = round(skipped * average_tokens)
+        return stats
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self._decisions.clear()
+            self._summary_stats.clear()
+
+
+_query_planner: Optional[QueryPlanner] = None
+_query_planner_lock = threading.Lock()
+
+
+def get_query_planner() -> QueryPlanner:
+    global _query_planner
+    if _query_planner is None:
+        with _query_planner_lock:
+            if _query_planner is None:
+                _query_planner = QueryPlanner()
+    return _query_planner
+
+
+def register_query_planner_metrics() -> None:
+    """Exports the planner's decisions and the cost of the summaries that still ran to the metrics registry."""
+    registry = get_metrics_registry()
+    registry.register(CollectedMetric(
+        "maia_query_planner_decisions_total", "Query planner decisions, by reason; single_intent queries skip the summary.", ["reason"],
+        lambda: {(reason,): count for reason, count in get_query_planner().get_stats()["decisions"].items()}, "counter",
+    ))
+    registry.register(CollectedMetric("maia_query_planner_summaries_total", "Queries summarised by the LLM.", [], lambda: {(): get_query_planner().get_stats()["summarised"]}, "counter"))
+    registry.register(CollectedMetric("maia_query_planner_summary_seconds_total", "Time spent summarising queries.", [], lambda: {(): get_query_planner().get_stats()["summary_seconds"]}, "counter"))
+    registry.register(CollectedMetric(
+        "maia_query_planner_summary_tokens_total", "Tokens used to summarise queries, by type.", ["type"],
+        lambda: {(token_type,): get_query_planner().get_stats()[f"summary_{token_type}_tokens"] for token_type in ("input", "output")}, "counter",
+    ))
@@ -0,0 +1,217 @@
+from core.models import KbResource, KbEmbedding
+from core.utils.metrics_utils import get_metrics_registry, CollectedMetric, LabelValues
+from asgiref.sync import sync_to_async
+from django.db.models import Count, Max
+from collections import OrderedDict, Counter
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+import threading
+import logging
+import time
+import os
+
+logger = logging.getLogger('django')
+
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.97"))
+SEMANTIC_CACHE_TTL = int(os.getenv("SEMANTIC_CACHE_TTL", "3600"))
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "1000"))
+KB_VERSION_CHECK_INTERVAL = float(os.getenv("KB_VERSION_CHECK_INTERVAL", "5"))
+
+
+def get_kb_version() -> str:
+    # Changes whenever a resource is added, updated or deleted, or chunks are added to one, in any process
+    resources = KbResource.objects.aggregate(count=Count('id'), updated_at=Max('updated_at'))
+    embeddings = KbEmbedding.objects.aggregate(count=Count('id'), last_id=Max('id'))
+    return f"{resources['count']}:{resources['updated_at']}:{embeddings['count']}:{embeddings['last_id']}"
+
+
+def get_query_vector(embeddings: List[List[float]]) -> np.ndarray:
+    """Mean of the unit vectors of the (summarised) queries, itself scaled to unit length."""
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    vector = vectors.mean(axis=0)
+    return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+
+@dataclass
+class SemanticCacheEntry:
+    vector: np.ndarray
+    value: Any
+    created_at: float
+    key: Optional[str] = None
+
+
+class SemanticCache:
+    """
+    Stores answers by query embedding and serves one when a new query's cosine similarity to a stored
+    query reaches `threshold`.
+
+    Entries live in separate namespaces, e.g. one per `call_assistant` mode, and are never matched
+    across them. An entry stored with a `key` is only served to lookups with the same key, for answers
+    that must not be shared between similar but different requests. Each namespace is an LRU of at most `max_size` entries that expire after `ttl` seconds.
+    Everything is dropped when the knowledge base version changes or `invalidate` is called.
+    """
+
+    def __init__(self, threshold: float = SEMANTIC_CACHE_THRESHOLD, ttl: int = SEMANTIC_CACHE_TTL, max_size: int = SEMANTIC_CACHE_SIZE, enabled: bool = SEMANTIC_CACHE_ENABLED):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_size = max_size
+        self.enabled = enabled
+        self._namespaces: Dict[str, OrderedDict] = {}
+        self._matrices: Dict[str, Optional[Tuple[List[int], np.ndarray]]] = {}
+        self._next_key = 0
+        self._kb_version: Optional[str] = None
+        self._kb_version_checked_at = 0.0
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Counter] = {}
+
+    def get(self, namespace: str, vector: np.ndarray, key: Optional[str] = None) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        self._check_kb_version()
+
+        with self._lock:
+            stats = self._stats.setdefault(namespace, Counter())
+            entries = self._namespaces.get(namespace)
+            if not entries:
+                stats["misses"] += 1
+                return None
+
+            keys, matrix = self._get_matrix(namespace)
+            scores = matrix @ vector
+            candidates = [int(i) for i in np.flatnonzero(scores >= self.threshold) if entries[keys[i]].key == key]
+            if not candidates:
+                stats["misses"] += 1
+                return None
+
+            best = max(candidates, key=lambda i: scores[i])
+            entry = entries[keys[best]]
+            if time.monotonic() - entry.created_at > self.ttl:
+                self._remove(namespace, keys[best])
+                stats["expired"] += 1
+                stats["misses"] += 1
+                return None
+
+            entries.move_to_end(keys[best])
+            stats["hits"] += 1
+        logger.info(f"Semantic cache hit in {namespace} with similarity {scores[best]:.4f}")
+        return entry.value
+
+    async def aget(self, namespace: str, vector: np.ndarray, key: Optional[str] = None) -> Optional[Any]:
+        # The knowledge base version check uses the ORM, which must not run on the event loop
+        return await sync_to_async(self.get, thread_sensitive=False)(namespace, vector, key)
+
+    def set(self, namespace: str, vector: np.ndarray, value: Any, key: Optional[str] = None) -> None:
+        if not self.enabled:
+            return
+
+        with self._lock:
+            entries = self._namespaces.setdefault(namespace, OrderedDict())
+            entries[self._next_key] = SemanticCacheEntry(vector, value, time.monotonic(), key)
+            self._next_key += 1
+            while len(entries) > self.max_size:
+                entries.popitem(last=False)
+                self._stats.setdefault(namespace, Counter())["evictions"] += 1
+            self._matrices[namespace] = None
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._clear()
+            # Forces the next lookup to read the knowledge base version again
+            self._kb_version_checked_at = 0.0
+        logger.info("Semantic cache invalidated")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            namespaces = {namespace: dict(stats) for namespace, stats in self._stats.items()}
+            for namespace, entries in self._namespaces.items():
+                namespaces.setdefault(namespace, {})["entries"] = len(entries)
+
+        for stats in namespaces.values():
+            lookups = stats.get("hits", 0) + stats.get("misses", 0)
+            stats["hit_rate"] = round(stats.get("hits", 0) / lookups, 4) if lookups else 0.0
+        hits = sum(stats.get("hits", 0) for stats in namespaces.values())
+        lookups = hits + sum(stats.get("misses", 0) for stats in namespaces.values())
+        return {
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "kb_version": self._kb_version,
+            "namespaces": namespaces,
+        }
+
+    def _check_kb_version(self) -> None:
+        now = time.monotonic()
+        if now - self._kb_version_checked_at < KB_VERSION_CHECK_INTERVAL:
+            return
+        self._kb_version_checked_at = now
+
+        try:
+            kb_version = get_kb_version()
+        except Exception as e:
+            logger.error(f"Error reading knowledge base version: {e}")
+            return
+
+        with self._lock:
+            if kb_version != self._kb_version:
+                if self._kb_version is not None:
+                    logger.info("Knowledge base changed, semantic cache cleared")
+                self._clear()
+                self._kb_version = kb_version
+
+    def _get_matrix(self, namespace: str) -> Tuple[List[int], np.ndarray]:
+        # Rebuilt only after the namespace has changed, lookups are then a single matrix-vector product
+        entries = self._namespaces[namespace]
+        if self._matrices.get(namespace) is None:
+            self._matrices[namespace] = (list(entries.keys()), np.stack([entry.vector for entry in entries.values()]))
+        return self._matrices[namespace]
+
+    def _remove(self, namespace: str, key: int) -> None:
+        del self._namespaces[namespace][key]
+        self._matrices[namespace] = None
+
+    def _clear(self) -> None:
+        for namespace, entries in self._namespaces.items():
+            if entries:
+                self._stats.setdefault(namespace, Counter())["invalidations"] += 1
+        self._namespaces.clear()
+        self._matrices.clear()
+
+
+_semantic_cache: Optional[SemanticCache] = None
+_semantic_cache_lock = threading.Lock()
+
+
+def get_semantic_cache() -> SemanticCache:
+    global _semantic_cache
+    if _semantic_cache is None:
+        with _semantic_cache_lock:
+            if _semantic_cache is None:
+                _semantic_cache = SemanticCache()
+    return _semantic_cache
+
+
+def register_semantic_cache_metrics() -> None:
+    """Exports the lookups, removals and size of each semantic cache namespace to the metrics registry."""
+    registry = get_metrics_registry()
+
+    def collect(names: Dict[str, str]) -> Dict[LabelValues, float]:
+        namespaces = get_semantic_cache().get_stats()["namespaces"]
+        return {(namespace, label): stats.get(name, 0) for namespace, stats in namespaces.items() for name, label in names.items()}
+
+    registry.register(CollectedMetric(
+        "maia_semantic_cache_lookups_total", "Semantic cache lookups, by namespace and result.", ["namespace", "result"],
+        lambda: collect({"hits": "hit", "misses": "miss"}), "counter",
+    ))
+    registry.register(CollectedMetric(
+        "maia_semantic_cache_removals_total", "Semantic cache entries removed for expiring or to make room, by namespace and reason.", ["namespace", "reason"],
+        lambda: collect({"expired": "expired", "evictions": "evicted"}), "counter",
+    ))
+    registry.register(CollectedMetric(
+        "maia_semantic_cache_invalidations_total", "Times a semantic cache namespace was cleared by a knowledge base change, by namespace.", ["namespace"],
+        lambda: {(namespace,): stats.get("invalidations", 0) for namespace, stats in get_semantic_cache().get_stats()["namespaces"].items()}, "counter",
+    ))
+    registry.register(CollectedMetric(
+        "maia_semantic_cache_entries", "Answers held in each semantic cache namespace.", ["namespace"],
+        lambda: {(namespace,): stats.get("entries", 0) for namespace, stats in get_semantic_cache().get_stats()["namespaces"].items()},
+    ))
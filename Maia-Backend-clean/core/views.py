@@ -9,7 +9,8 @@ from core.models import CustomerEngagement, Customer, KbEmbedding
 from core.serializers import CustomerEngagementSerializer, CustomerSerializer, KbEmbeddingSerializer
 from rest_framework.permissions import IsAuthenticated
 from django.db.models import Q
-from django.http import JsonResponse
+from django.http import JsonResponse, HttpResponse
+from core.utils.metrics_utils import get_metrics_registry
 from typing import Dict, Any
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
@@ -36,6 +37,11 @@ def health_check(request: Request) -> Dict[str, Any]:
     return JsonResponse(data)
 
 
+def metrics(request: Request) -> HttpResponse:
+    # Scraped by Prometheus, so it is not documented in the API schema
+    return HttpResponse(get_metrics_registry().render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 @method_decorator(csrf_exempt, name='dispatch')
 class CustomerEngagementAPIView(APIView):
     permission_classes = [IsAuthenticated]
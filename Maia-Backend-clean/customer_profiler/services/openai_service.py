@@ -1,4 +1,5 @@
 from core.utils.openai_utils import get_openai_llm_client
+from core.utils.metrics_utils import track_stage
 from ..utils.data_models import LLMResponse
 from langchain_core.prompts import ChatPromptTemplate
 from typing import List
@@ -34,9 +35,10 @@ def get_llm_response(summaries: List[str], notes: str) -> LLMResponse:
     llm = get_openai_llm_client().with_structured_output(LLMResponse, method="json_mode")
     chain = prompt_template | llm
 
-    json_response = chain.invoke({
-        "input": past_engagements,
-    })
+    with track_stage("llm_generation", past_engagements) as tracker:
+        json_response = chain.invoke({
+            "input": past_engagements,
+        }, config=tracker.callbacks())
     
     logger.info("User profiling completed by OpenAI")
     
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from document_processor.services.ingestion_job_service import IngestionWorkerPool, INGESTION_WORKERS, INGESTION_POLL_INTERVAL
+
+
+class Command(BaseCommand):
+    help = "Run ingestion workers that drain queued knowledge base uploads from the database."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=INGESTION_WORKERS, help='Number of worker threads')
+        parser.add_argument('--poll-interval', type=float, default=INGESTION_POLL_INTERVAL, help='Seconds between queue polls')
+
+    def handle(self, *args, **options):
+        worker_pool = IngestionWorkerPool(num_workers=options['workers'], poll_interval=options['poll_interval'])
+        worker_pool.start()
+        self.stdout.write(f"Running {options['workers']} ingestion workers, press Ctrl+C to stop")
+
+        try:
+            worker_pool.join()
+        except KeyboardInterrupt:
+            worker_pool.stop()
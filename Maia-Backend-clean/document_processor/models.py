@@ -0,0 +1,41 @@
+from django.db import models
+from django.contrib.auth.models import User
+from core.models import KbResource
+
+class IngestionJob(models.Model):
+    STATUS_QUEUED = 0
+    STATUS_RUNNING = 1
+    STATUS_COMPLETED = 2
+    STATUS_FAILED = 3
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'queued'),
+        (STATUS_RUNNING, 'running'),
+        (STATUS_COMPLETED, 'completed'),
+        (STATUS_FAILED, 'failed'),
+    ]
+
+    file_path = models.CharField(max_length=1024)
+    name = models.CharField(max_length=255)
+    category = models.CharField(max_length=255, blank = True, null=True)
+    sub_category = models.CharField(max_length=255, blank = True, null=True)
+    sub_subcategory = models.CharField(max_length=255, blank = True, null=True)
+    tag = models.CharField(max_length=255, blank = True, null=True)
+    status = models.IntegerField(choices=STATUS_CHOICES, default=STATUS_QUEUED, db_index=True)
+    kb_resource = models.ForeignKey(KbResource, on_delete=models.SET_NULL, blank = True, null=True)
+    total_chunks = models.IntegerField(default=0)
+    embedded_chunks = models.IntegerField(default=0)
+    indexed_chunks = models.IntegerField(default=0)
+    failed_chunks = models.IntegerField(default=0)
+    error = models.TextField(blank=True, null=True)
+    worker = models.CharField(max_length=255, blank = True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    heartbeat_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null = True)
+
+    class Meta:
+        db_table = 'ingestion_job'
+
+    def __str__(self):
+        return f'IngestionJob {self.id} - {self.get_status_display()}'
@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from .models import IngestionJob
 
 class FileUploadSerializer(serializers.Serializer):
     file = serializers.FileField()
@@ -7,4 +8,14 @@ class FileUploadSerializer(serializers.Serializer):
     sub_category = serializers.CharField(max_length=255, required = False)
     sub_subcategory = serializers.CharField(max_length=255, required = False)
     tag = serializers.CharField(max_length=255, required = False)
-    
\ No newline at end of file
+    
+
+class IngestionJobSerializer(serializers.ModelSerializer):
+    status = serializers.CharField(source='get_status_display')
+
+    class Meta:
+        model = IngestionJob
+        fields = [
+            'id', 'name', 'status', 'kb_resource', 'total_chunks', 'embedded_chunks', 'indexed_chunks',
+            'failed_chunks', 'error', 'created_at', 'started_at', 'finished_at',
+        ]
@@ -1,4 +1,5 @@
 from core.utils import kb_embedding_utils, kb_resource_utils
+from core.utils.semantic_cache_utils import get_semantic_cache
 import logging
 
 logger = logging.getLogger("django")
@@ -7,5 +8,6 @@ def delete_resource(kb_resource_id: int) -> bool:
     result = kb_embedding_utils.delete_kb_embedding_by_resource_id(kb_resource_id)
     if result["status"] == "deleted":
         kb_resource_utils.delete_kb_resource(kb_resource_id)
+        get_semantic_cache().invalidate()
         return True
     return False
\ No newline at end of file
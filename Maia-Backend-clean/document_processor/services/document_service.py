@@ -1,19 +1,27 @@
-from core.utils.openai_utils import get_embedding
-from core.utils.opensearch_utils import add_document, get_opensearch_cluster_client, delete_opensearch_index, create_index, create_index_mapping
+from core.utils.openai_utils import get_embeddings
+from core.utils.opensearch_utils import add_documents_bulk, get_opensearch_cluster_client, delete_opensearch_index, create_index, create_index_mapping
+from core.utils.opensearch_utils import OPENSEARCH_DOMAIN, OPENSEARCH_REGION, OPENSEARCH_INDEX
 from core.utils import kb_embedding_utils, kb_resource_utils
-from ..utils.data_models import TextChunk, KbResource
+from core.utils.semantic_cache_utils import get_semantic_cache
+from ..utils.data_models import TextChunk, KbResource, IngestionStats
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from openpyxl import load_workbook
-from typing import List
+from typing import List, Optional, Tuple, Callable
 from opensearchpy import OpenSearch
+import contextvars
 import os
 import logging
 import time
 
 logger = logging.getLogger('django')
 
+INGESTION_EMBEDDING_BATCH_SIZE = int(os.getenv("INGESTION_EMBEDDING_BATCH_SIZE", "100"))
+INGESTION_BULK_SIZE = int(os.getenv("INGESTION_BULK_SIZE", "500"))
+INGESTION_CONCURRENCY = int(os.getenv("INGESTION_CONCURRENCY", "4"))
+INGESTION_MAX_RETRIES = int(os.getenv("INGESTION_MAX_RETRIES", "3"))
 
-def process_document(file_path: str, kb_resource: KbResource):
+
+def process_document(file_path: str, kb_resource: KbResource, on_progress: Optional[Callable[[int, IngestionStats], None]] = None) -> Optional[IngestionStats]:
 
     file_extension = Path(file_path).suffix
     
@@ -30,14 +38,17 @@ def process_document(file_path: str, kb_resource: KbResource):
     
     kb_resource_id = add_kb_resource(kb_resource=kb_resource)
     
+    stats = None
     if kb_resource_id != 0:
-        add_chunks(text_chunks, metadata, kb_resource_id)
+        stats = add_chunks(text_chunks, metadata, kb_resource_id, on_progress)
+        # Other processes see the change through the knowledge base version
+        get_semantic_cache().invalidate()
     
     if os.path.exists(file_path):
         os.remove(file_path)
         logger.info("File deleted successfully")
     
-    return None
+    return stats
 
 
 def add_kb_resource(kb_resource: KbResource) -> int:
@@ -76,6 +87,9 @@ def read_pdf(file_path):
 
 
 def read_excel(file_path: str) -> List[List[TextChunk]]:
+    # Only needed by ingestion, so it is not imported with the views
+    from openpyxl import load_workbook
+
     workbook = load_workbook(filename=file_path, read_only=True)
     text_chunks = []
     
@@ -100,30 +114,101 @@ def read_excel(file_path: str) -> List[List[TextChunk]]:
     finally:
         workbook.close()
         logger.info("Excel document processed successfully")
-        time.sleep(5)
             
     return text_chunks
 
 
-def add_chunks(text_chunks: List[List[TextChunk]], metadata: str, kb_resource_id: int) -> None:
-    opensearch_client = get_opensearch_cluster_client("vector-kb", "ap-southeast-1")
-    
-    for page in text_chunks:
-        for text_chunk in page:
-            add_chunk(text_chunk, opensearch_client, metadata, kb_resource_id)
-    return None
+def add_chunks(text_chunks: List[List[TextChunk]], metadata: str, kb_resource_id: int, on_progress: Optional[Callable[[int, IngestionStats], None]] = None) -> IngestionStats:
+    opensearch_client = get_opensearch_cluster_client(OPENSEARCH_DOMAIN, OPENSEARCH_REGION)
 
+    contents = [text_chunk.content for page in text_chunks for text_chunk in page]
+    batches = [contents[i:i + INGESTION_EMBEDDING_BATCH_SIZE] for i in range(0, len(contents), INGESTION_EMBEDDING_BATCH_SIZE)]
+    stats = IngestionStats(total=len(contents))
+    if on_progress:
+        on_progress(kb_resource_id, stats)
 
-def add_chunk(text_chunk: TextChunk, opensearch_client: OpenSearch, metadata: str, kb_resource_id: int) -> None:
-    embedding = get_embedding(f'{metadata} {text_chunk.content}')
-    
-    data = {
-        "kb_resource": kb_resource_id,
-        "content": text_chunk.content,
-    }
-    kb_embedding_row = kb_embedding_utils.create_kb_embedding(data)
-    logger.info(f'Kb_embedding {kb_embedding_row["id"]} added successfully to Postgres DB')
+    # Embedding batches run concurrently while earlier batches are written to Postgres and Opensearch
+    with ThreadPoolExecutor(max_workers=INGESTION_CONCURRENCY) as executor:
+        # Each batch runs in a copy of this context so its logs and metrics keep the job's trace ID
+        futures = [executor.submit(contextvars.copy_context().run, embed_batch, batch, metadata) for batch in batches]
+        results = (future.result() for future in futures)
+
+        for batch, (embeddings, seconds, retries) in zip(batches, results):
+            stats.add_time("embed", seconds)
+            stats.retries += retries
+
+            if embeddings is None:
+                stats.failed += len(batch)
+            else:
+                stats.embedded += len(batch)
+                add_batch(batch, embeddings, opensearch_client, kb_resource_id, stats)
+
+            if on_progress:
+                on_progress(kb_resource_id, stats)
+
+    logger.info(f"Ingestion of kb_resource {kb_resource_id} completed: {stats.to_json()}")
+    return stats
 
-    opensearch_id = add_document(opensearch_client, "vector-kb-index", embedding, text_chunk.content, kb_embedding_row["id"])
 
-    return
\ No newline at end of file
+def embed_batch(contents: List[str], metadata: str) -> Tuple[Optional[List[List[float]]], float, int]:
+    start = time.perf_counter()
+
+    for attempt in range(INGESTION_MAX_RETRIES + 1):
+        try:
+            embeddings = get_embeddings([f'{metadata} {content}' for content in contents])
+            return embeddings, time.perf_counter() - start, attempt
+        except Exception as e:
+            logger.error(f"Error encountered when embedding batch, attempt {attempt + 1}: {str(e)}")
+            if attempt < INGESTION_MAX_RETRIES:
+                time.sleep(2 ** attempt)
+
+    return None, time.perf_counter() - start, INGESTION_MAX_RETRIES
+
+
+def add_batch(contents: List[str], embeddings: List[List[float]], opensearch_client: OpenSearch, kb_resource_id: int, stats: IngestionStats) -> None:
+    start = time.perf_counter()
+    try:
+        kb_embedding_ids = kb_embedding_utils.bulk_create_kb_embeddings(kb_resource_id, contents)
+    except Exception as e:
+        logger.error("Error encountered when adding to kb_embedding table: %s", str(e))
+        stats.failed += len(contents)
+        return
+    finally:
+        stats.add_time("insert", time.perf_counter() - start)
+
+    stats.inserted += len(kb_embedding_ids)
+    logger.info(f'{len(kb_embedding_ids)} kb_embeddings added successfully to Postgres DB')
+
+    documents = {
+        kb_embedding_id: {"embedding": embedding, "content": content, "postgresql_id": kb_embedding_id}
+        for kb_embedding_id, content, embedding in zip(kb_embedding_ids, contents, embeddings)
+    }
+    vector_db_ids = {}
+    pending = list(documents.keys())
+
+    start = time.perf_counter()
+    for attempt in range(INGESTION_MAX_RETRIES + 1):
+        try:
+            indexed_ids, _ = add_documents_bulk(opensearch_client, OPENSEARCH_INDEX, [documents[i] for i in pending], chunk_size=INGESTION_BULK_SIZE)
+        except Exception as e:
+            logger.error(f"Error encountered when adding batch to opensearch, attempt {attempt + 1}: {str(e)}")
+            indexed_ids = []
+
+        for indexed_id in indexed_ids:
+            vector_db_ids[int(indexed_id)] = indexed_id
+
+        pending = [i for i in pending if i not in vector_db_ids]
+        if not pending or attempt == INGESTION_MAX_RETRIES:
+            break
+
+        stats.retries += 1
+        time.sleep(2 ** attempt)
+    stats.add_time("index", time.perf_counter() - start)
+
+    stats.indexed += len(vector_db_ids)
+    stats.failed += len(pending)
+    if pending:
+        logger.error(f"Kb_embeddings {pending} could not be added to opensearch")
+
+    if vector_db_ids:
+        kb_embedding_utils.bulk_update_vector_db_ids(vector_db_ids)
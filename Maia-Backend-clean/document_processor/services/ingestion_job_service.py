@@ -0,0 +1,188 @@
+from django.db import transaction, close_old_connections
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from ..models import IngestionJob
+from ..serializers import IngestionJobSerializer
+from ..utils.data_models import KbResource, IngestionStats
+from .document_service import process_document
+from core.utils.metrics_utils import set_trace_id, set_endpoint
+from datetime import timedelta
+from typing import Optional, Dict, Any, List
+import threading
+import socket
+import logging
+import os
+
+logger = logging.getLogger('django')
+
+INGESTION_WORKERS = int(os.getenv("INGESTION_WORKERS", "2"))
+INGESTION_POLL_INTERVAL = float(os.getenv("INGESTION_POLL_INTERVAL", "5"))
+INGESTION_STALE_AFTER = int(os.getenv("INGESTION_STALE_AFTER", "600"))
+INGESTION_IN_PROCESS = os.getenv("INGESTION_IN_PROCESS", "true").lower() == "true"
+
+
+def enqueue_ingestion_job(file_path: str, kb_resource: KbResource, user_id: Optional[int] = None) -> Dict[str, Any]:
+    job = IngestionJob.objects.create(
+        file_path=file_path,
+        name=kb_resource.name,
+        category=kb_resource.category,
+        sub_category=kb_resource.sub_category,
+        sub_subcategory=kb_resource.sub_subcategory,
+        tag=kb_resource.tag,
+        user_id=user_id,
+    )
+    logger.info(f"Ingestion job {job.id} queued")
+
+    worker_pool = get_worker_pool()
+    if INGESTION_IN_PROCESS:
+        worker_pool.start()
+    worker_pool.notify()
+    return IngestionJobSerializer(job).data
+
+
+def get_ingestion_job_by_id(job_id: int) -> Dict[str, Any]:
+    try:
+        job = IngestionJob.objects.get(id=job_id)
+        return IngestionJobSerializer(job).data
+    except IngestionJob.DoesNotExist:
+        raise ValidationError({'error': 'Ingestion job not found'})
+
+
+def claim_next_job(worker_name: str) -> Optional[IngestionJob]:
+    # SKIP LOCKED lets several workers, in one process or many, drain the same table without double-claiming
+    with transaction.atomic():
+        job = (
+            IngestionJob.objects.select_for_update(skip_locked=True)
+            .filter(status=IngestionJob.STATUS_QUEUED)
+            .order_by('created_at')
+            .first()
+        )
+        if job is None:
+            return None
+
+        now = timezone.now()
+        job.status = IngestionJob.STATUS_RUNNING
+        job.worker = worker_name
+        job.started_at = now
+        job.heartbeat_at = now
+        job.save(update_fields=['status', 'worker', 'started_at', 'heartbeat_at'])
+        return job
+
+
+def fail_stale_jobs() -> int:
+    cutoff = timezone.now() - timedelta(seconds=INGESTION_STALE_AFTER)
+    count = IngestionJob.objects.filter(status=IngestionJob.STATUS_RUNNING, heartbeat_at__lt=cutoff).update(
+        status=IngestionJob.STATUS_FAILED,
+        error="Ingestion worker stopped responding",
+        finished_at=timezone.now(),
+    )
+    if count:
+        logger.error(f"{count} stale ingestion jobs marked as failed")
+    return count
+
+
+def run_job(job: IngestionJob) -> None:
+    set_trace_id(f"job-{job.id}")
+    set_endpoint("ingestion")
+
+    def update_progress(kb_resource_id: int, stats: IngestionStats) -> None:
+        IngestionJob.objects.filter(id=job.id).update(
+            kb_resource_id=kb_resource_id,
+            total_chunks=stats.total,
+            embedded_chunks=stats.embedded,
+            indexed_chunks=stats.indexed,
+            failed_chunks=stats.failed,
+            heartbeat_at=timezone.now(),
+        )
+
+    kb_resource = KbResource(
+        id=None,
+        name=job.name,
+        category=job.category,
+        sub_category=job.sub_category,
+        sub_subcategory=job.sub_subcategory,
+        tag=job.tag,
+    )
+
+    try:
+        stats = process_document(job.file_path, kb_resource, update_progress)
+    except Exception as e:
+        logger.error(f"Ingestion job {job.id} failed: {e}")
+        stats, error = None, str(e)
+    else:
+        error = None if stats is not None else "File could not be processed"
+    finally:
+        if os.path.exists(job.file_path):
+            os.remove(job.file_path)
+
+    IngestionJob.objects.filter(id=job.id).update(
+        status=IngestionJob.STATUS_FAILED if error else IngestionJob.STATUS_COMPLETED,
+        error=error,
+        finished_at=timezone.now(),
+    )
+    logger.info(f"Ingestion job {job.id} finished")
+
+
+class IngestionWorkerPool:
+    def __init__(self, num_workers: int = INGESTION_WORKERS, poll_interval: float = INGESTION_POLL_INTERVAL):
+        self.num_workers = num_workers
+        self.poll_interval = poll_interval
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        with self._lock:
+            if self._threads:
+                return
+            self._stop.clear()
+            for i in range(self.num_workers):
+                name = f"{socket.gethostname()}-{os.getpid()}-ingestion-{i}"
+                thread = threading.Thread(target=self._run, args=(name,), name=name, daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        logger.info(f"Started {self.num_workers} ingestion workers")
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        self._wakeup.set()
+        with self._lock:
+            for thread in self._threads:
+                thread.join(timeout)
+            self._threads = []
+
+    def notify(self) -> None:
+        self._wakeup.set()
+
+    def join(self) -> None:
+        for thread in list(self._threads):
+            thread.join()
+
+    def _run(self, worker_name: str) -> None:
+        while not self._stop.is_set():
+            close_old_connections()
+            try:
+                fail_stale_jobs()
+                job = claim_next_job(worker_name)
+                if job is not None:
+                    run_job(job)
+                    continue
+            except Exception as e:
+                logger.error(f"Ingestion worker {worker_name} error: {e}")
+
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+
+_worker_pool: Optional[IngestionWorkerPool] = None
+_worker_pool_lock = threading.Lock()
+
+
+def get_worker_pool() -> IngestionWorkerPool:
+    global _worker_pool
+    if _worker_pool is None:
+        with _worker_pool_lock:
+            if _worker_pool is None:
+                _worker_pool = IngestionWorkerPool()
+    return _worker_pool
@@ -1,8 +1,9 @@
 from django.urls import path, include
-from .views import FileUploadView, ResourceView
+from .views import FileUploadView, ResourceView, IngestionJobView
 
 urlpatterns = [
     path('file/', FileUploadView.as_view(), name='File Upload'),
+    path('jobs/<int:pk>/', IngestionJobView.as_view(), name='Ingestion Job Detail'),
     path('resource/', ResourceView.as_view(), name='Resource List'),
     path('resource/<int:pk>/', ResourceView.as_view(), name='Resouce Detail'),
 ]
\ No newline at end of file
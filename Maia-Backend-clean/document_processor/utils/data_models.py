@@ -1,4 +1,5 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field, asdict
+from typing import Dict, Any
 
 @dataclass
 class KbResource():
@@ -26,4 +27,29 @@ class KbResource():
 @dataclass
 class TextChunk():
     content: str
-    
\ No newline at end of file
+
+
+@dataclass
+class IngestionStats():
+    total: int = 0
+    embedded: int = 0
+    inserted: int = 0
+    indexed: int = 0
+    failed: int = 0
+    retries: int = 0
+    stage_seconds: Dict[str, float] = field(default_factory=lambda: {"embed": 0.0, "insert": 0.0, "index": 0.0})
+
+    def add_time(self, stage: str, seconds: float) -> None:
+        self.stage_seconds[stage] += seconds
+
+    def get_throughput(self) -> Dict[str, float]:
+        counts = {"embed": self.embedded, "insert": self.inserted, "index": self.indexed}
+        return {
+            stage: round(counts[stage] / seconds, 2) if seconds > 0 else 0.0
+            for stage, seconds in self.stage_seconds.items()
+        }
+
+    def to_json(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["throughput"] = self.get_throughput()
+        return data
@@ -7,7 +7,7 @@ from rest_framework.response import Response
 from rest_framework.exceptions import ValidationError
 from .serializers import FileUploadSerializer
 from .utils.data_models import KbResource
-from .services.document_service import process_document
+from .services.ingestion_job_service import enqueue_ingestion_job, get_ingestion_job_by_id
 from .services.delete_service import delete_resource
 from rest_framework.permissions import IsAuthenticated
 from drf_yasg.utils import swagger_auto_schema
@@ -31,12 +31,13 @@ class FileUploadView(APIView):
         operation_description="Upload a file and process it.",
         request_body=FileUploadSerializer,
         responses={
-            200: openapi.Response(
-                description="File received",
+            202: openapi.Response(
+                description="File received and queued for ingestion",
                 schema=openapi.Schema(
                     type=openapi.TYPE_OBJECT,
                     properties={
-                        'message': openapi.Schema(type=openapi.TYPE_STRING, description='Response message')
+                        'message': openapi.Schema(type=openapi.TYPE_STRING, description='Response message'),
+                        'job_id': openapi.Schema(type=openapi.TYPE_INTEGER, description='ID of the ingestion job')
                     }
                 )
             ),
@@ -66,9 +67,9 @@ class FileUploadView(APIView):
                 name = file.name.split('.')[0]
             
             kb_resource = KbResource(id=None, name=name, category=category, sub_category=sub_category, sub_subcategory=sub_subcategory, tag=tag)
-            process_document(file_path, kb_resource)
+            job = enqueue_ingestion_job(file_path, kb_resource, request.user.id)
             
-            return Response({'message': 'File received'}, status=status.HTTP_200_OK)
+            return Response({'message': 'File received', 'job_id': job['id']}, status=status.HTTP_202_ACCEPTED)
         else:
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
@@ -98,6 +99,48 @@ class FileUploadView(APIView):
         return file_name
         
 
+@method_decorator(csrf_exempt, name='dispatch')
+class IngestionJobView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description="Retrieve the progress of a file ingestion job.",
+        responses={
+            200: openapi.Response(
+                description="Ingestion job progress",
+                schema=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        'id': openapi.Schema(type=openapi.TYPE_INTEGER, description='ID of the ingestion job'),
+                        'status': openapi.Schema(type=openapi.TYPE_STRING, description='queued, running, completed or failed'),
+                        'kb_resource': openapi.Schema(type=openapi.TYPE_INTEGER, description='ID of the created KB resource'),
+                        'total_chunks': openapi.Schema(type=openapi.TYPE_INTEGER, description='Number of chunks in the file'),
+                        'embedded_chunks': openapi.Schema(type=openapi.TYPE_INTEGER, description='Number of chunks embedded'),
+                        'indexed_chunks': openapi.Schema(type=openapi.TYPE_INTEGER, description='Number of chunks indexed in Opensearch'),
+                        'failed_chunks': openapi.Schema(type=openapi.TYPE_INTEGER, description='Number of chunks that failed'),
+                        'error': openapi.Schema(type=openapi.TYPE_STRING, description='Error message if the job failed')
+                    }
+                )
+            ),
+            404: openapi.Response(
+                description="Ingestion job not found",
+                schema=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        'error': openapi.Schema(type=openapi.TYPE_STRING, description='Error message')
+                    }
+                )
+            )
+        }
+    )
+    def get(self, request, pk):
+        try:
+            data = get_ingestion_job_by_id(pk)
+            return Response(data, status=status.HTTP_200_OK)
+        except ValidationError as e:
+            return Response(e.detail, status=status.HTTP_404_NOT_FOUND)
+
+
 @method_decorator(csrf_exempt, name='dispatch')
 class ResourceView(APIView):
     permission_classes = [IsAuthenticated]
@@ -0,0 +1,239 @@
+"""
+Benchmarks the redaction engine against the previous implementation on a synthetic corpus.
+
+Run from the project root:
+    python -m query_classifier.custom_tests.redaction_benchmark --size 2000
+    python -m query_classifier.custom_tests.redaction_benchmark --no-ner    # rule tiers only, no spaCy model needed
+"""
+from query_classifier.services.redact_service import RedactionEngine, REDACTION_SPACY_MODEL
+from spacy.matcher import Matcher
+from spacy.tokens import Span
+from spacy.util import filter_spans
+from typing import List, Tuple, Any, Callable
+import argparse
+import string
+import random
+import time
+import re
+
+FIRST_NAMES = ["John", "Mei Ling", "Ahmad", "Priya", "Wei Jie", "Siti", "David", "Rajesh", "Hui Min", "Nurul"]
+LAST_NAMES = ["Tan", "Lim", "Ibrahim", "Nair", "Ng", "Rahman", "Wong", "Kumar", "Goh", "Chua"]
+STREETS = ["Ang Mo Kio Ave 3", "Tampines St 81", "Jurong West St 42", "Bedok North Rd", "Yishun Ring Rd"]
+
+PII_TEMPLATES = [
+    "Caller {name} asked about the status of her application, NRIC {nric}, contact {phone}.",
+    "Customer called to update his email to {email} and mailing address to Blk 123 {street} {unit} Singapore {postal}.",
+    "Mr {last} wants to know why his payout has not been credited. Call back at {phone}.",
+    "Passport holder {passport} enquired about eligibility for the scheme, reachable via {email}.",
+    "My name is {name}, I moved to {unit} {street} S{postal} and need to change my address.",
+    "Please contact the member at {phone} or ({phone_short}) regarding the appeal, ref {nric}.",
+    # No title or introduction before the name, which the "auto" NER policy's pre-check must still catch
+    "{name} wants to change his address to {unit} {street} Singapore {postal}.",
+    "Hello. {first} here, need help with the refund sent to {email}.",
+    "customer {lower_name} asked why the payout was late, contact {phone}.",
+    "Payout query. {name} says the amount credited was wrong.",
+]
+
+NAME_FIELDS = ("name", "last", "first", "lower_name")
+
+PLAIN_TEMPLATES = [
+    "customer asked how to withdraw savings after reaching the payout eligibility age.",
+    "caller wanted to know the documents required to apply for the housing grant.",
+    "enquiry on why the monthly contribution was lower than expected this year.",
+    "member requested a breakdown of the account balances and interest earned.",
+    "customer unable to log in to the portal after resetting the password twice.",
+    "asked whether the top up can be made by cheque and how long it takes to reflect.",
+    "wants to nominate beneficiaries and asked if a witness is needed for the form.",
+]
+
+LEGACY_PATTERNS = {
+    'NAME': [[{'ENT_TYPE': 'PERSON'}]],
+    'NRIC': [[{"TEXT": {"REGEX": r"^[sStT]\d{7}[a-zA-Z]$"}}]],
+    'PASSPORT': [[{"TEXT": {"REGEX": r"^[eE]\d{7}[a-zA-Z]$"}}]],
+    'EMAIL': [[{'LIKE_EMAIL': True}]],
+}
+
+
+def build_corpus(size: int, pii_ratio: float, seed: int) -> Tuple[List[str], List[List[str]]]:
+    """Synthetic texts, and for each text the names written into it."""
+    rng = random.Random(seed)
+    corpus, names = [], []
+    for _ in range(size):
+        text_names = []
+        if rng.random() < pii_ratio:
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            template = rng.choice(PII_TEMPLATES)
+            values = dict(
+                name=f"{first} {last}",
+                last=last,
+                first=first,
+                lower_name=f"{first} {last}".lower(),
+                nric=f"{rng.choice('ST')}{rng.randint(0, 9999999):07d}{rng.choice('ABCDEFGHIZJ')}",
+                passport=f"E{rng.randint(0, 9999999):07d}{rng.choice('ABCDEFGH')}",
+                phone=f"+65 {rng.randint(8000, 9999)} {rng.randint(0, 9999):04d}",
+                phone_short=f"6{rng.randint(0, 9999999):07d}",
+                email=f"{first.split()[0].lower()}.{last.lower()}{rng.randint(1, 99)}@example.com",
+                street=rng.choice(STREETS),
+                unit=f"#{rng.randint(1, 30):02d}-{rng.randint(1, 999)}",
+                postal=f"{rng.randint(100000, 829999)}",
+            )
+            text = template.format(**values)
+            text_names = [values[field] for _, field, _, _ in string.Formatter().parse(template) if field in NAME_FIELDS]
+        else:
+            text = " ".join(rng.choice(PLAIN_TEMPLATES) for _ in range(rng.randint(1, 3))).capitalize()
+        corpus.append(text)
+        names.append(text_names)
+    return corpus, names
+
+
+def find_missed_names(output: List[str], names: List[List[str]]) -> List[Tuple[int, str]]:
+    return [(i, name) for i, (text, text_names) in enumerate(zip(output, names)) for name in text_names if name in text]
+
+
+def report_name_recall(engine: RedactionEngine, corpus: List[str], names: List[List[str]], show: int) -> None:
+    """Names left in the output by each NER policy, compared with running NER on every text."""
+    total = sum(len(text_names) for text_names in names)
+    missed = {}
+    engine_policy = engine.ner_policy
+    try:
+        for policy in ("always", "auto"):
+            engine.ner_policy = policy
+            missed[policy] = find_missed_names(engine.redact_many(corpus), names)
+            ner_texts = sum(engine.needs_ner(text) for text in corpus)
+            print(f"{policy:<10} {len(missed[policy])} of {total} names left unredacted, NER on {ner_texts} of {len(corpus)} texts")
+    finally:
+        engine.ner_policy = engine_policy
+
+    only_auto = sorted(set(missed["auto"]) - set(missed["always"]))
+    print(f"auto       {len(only_auto)} names missed that \"always\" redacts")
+    for i, name in only_auto[:show]:
+        print(f"  {name!r} in: {corpus[i]}")
+
+
+# Previous implementation, kept here as the baseline
+
+def legacy_redact_phone_numbers(text: str) -> str:
+    def find_phone_numbers(text: str) -> List[Tuple[Any]]:
+        phone_numbers = []
+        temp_num_str = ""
+        temp_start = 0
+
+        for i in range(len(text)):
+            ch = text[i]
+            if ch.isdigit() or ch in "+(":
+                if temp_num_str == "":
+                    temp_start = i
+                if ch.isdigit():
+                    temp_num_str += ch
+            elif ch in " -().":
+                continue
+            else:
+                if 7 <= len(temp_num_str) <= 15:
+                    phone_numbers.append((temp_start, i))
+                temp_num_str = ""
+
+        if 7 <= len(temp_num_str) <= 15:
+            phone_numbers.append((temp_start, len(text)))
+
+        return phone_numbers
+
+    phone_numbers = find_phone_numbers(text)
+    phone_numbers.sort(reverse=True)
+
+    for start, end in phone_numbers:
+        text = text[:start] + '[PHONE_NUMBER]' + text[end:]
+
+    return text
+
+
+def legacy_redact_addresses(text: str) -> str:
+    matches = [(match.start(), match.end()) for match in re.finditer(r'#\d{2}[-\s]?\d{1,3}', text)]
+    matches += [(match.start(), match.end()) for match in re.finditer(r'(Singapore\s\d{6})|(S\d{6})|(S\(\d{6}\))', text, re.IGNORECASE)]
+    matches.sort(reverse=True)
+
+    for start, end in matches:
+        text = text[:start] + '[ADDRESS]' + text[end+1:]
+
+    return text
+
+
+def legacy_clean(text: str) -> str:
+    text = re.sub(r'\d+', '', text)
+    for placeholder in ('NAME', 'ADDRESS'):
+        text = re.sub(rf'(\[{placeholder}\])(\s*\[{placeholder}\])+', rf'[{placeholder}]', text)
+    return text
+
+
+def build_legacy_redactor(engine: RedactionEngine, use_ner: bool) -> Callable[[List[str]], List[str]]:
+    if use_ner:
+        matcher = Matcher(engine.nlp.vocab)
+        for label, pattern in LEGACY_PATTERNS.items():
+            matcher.add(label, pattern)
+
+    def redact_entities(text: str) -> str:
+        if not use_ner:
+            return text
+        doc = engine.nlp(text)
+        spans = filter_spans([Span(doc, start, end, label=match_id) for match_id, start, end in matcher(doc)])
+        redacted_text, last_end = [], 0
+        for span in sorted(spans, key=lambda span: span.start_char):
+            redacted_text.append(doc.text[last_end:span.start_char])
+            redacted_text.append(f"[{span.label_}]")
+            last_end = span.end_char
+        redacted_text.append(doc.text[last_end:])
+        return ''.join(redacted_text)
+
+    def redact_many(texts: List[str]) -> List[str]:
+        return [legacy_clean(legacy_redact_phone_numbers(legacy_redact_addresses(redact_entities(text)))) for text in texts]
+
+    return redact_many
+
+
+def time_redactor(name: str, redact_many: Callable[[List[str]], List[str]], corpus: List[str], repeat: int) -> Tuple[List[str], float]:
+    best = float("inf")
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        output = redact_many(corpus)
+        best = min(best, time.perf_counter() - start_time)
+    print(f"{name:<10} {best:8.3f}s  {best * 1000 / len(corpus):8.3f} ms/text  {len(corpus) / best:10.1f} texts/s")
+    return output, best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=1000, help="number of synthetic texts")
+    parser.add_argument("--pii-ratio", type=float, default=0.3, help="share of texts containing personal information")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per implementation, the fastest is reported")
+    parser.add_argument("--model", default=REDACTION_SPACY_MODEL)
+    parser.add_argument("--policy", default="always", choices=["always", "auto", "never"], help="NER policy of the new engine")
+    parser.add_argument("--no-ner", action="store_true", help="compare the rule tiers only, without loading a spaCy model")
+    parser.add_argument("--show-diffs", type=int, default=3, help="number of differing outputs to print")
+    args = parser.parse_args()
+
+    corpus, names = build_corpus(args.size, args.pii_ratio, args.seed)
+    engine = RedactionEngine(model_name=args.model, ner_policy="never" if args.no_ner else args.policy)
+    if not args.no_ner:
+        engine.nlp  # Loading the model is not part of either measurement
+
+    print(f"{len(corpus)} texts, {args.pii_ratio:.0%} with personal information, NER {'off' if args.no_ner else 'on'}")
+    legacy_output, legacy_time = time_redactor("legacy", build_legacy_redactor(engine, not args.no_ner), corpus, args.repeat)
+    engine.reset_stats()
+    engine_output, engine_time = time_redactor("engine", engine.redact_many, corpus, args.repeat)
+
+    stats = engine.get_stats()
+    print(f"speedup    {legacy_time / engine_time:8.1f}x")
+    print(f"NER runs   {stats.get('ner_texts', 0) // args.repeat} of {len(corpus)} texts (policy: {engine.ner_policy})")
+    print(f"stages     {stats['ms_per_text']} ms/text")
+
+    diffs = [(before, after) for before, after in zip(legacy_output, engine_output) if ''.join(before.split()) != ''.join(after.split())]
+    print(f"outputs    {len(diffs)} of {len(corpus)} differ other than in whitespace")
+    for before, after in diffs[:args.show_diffs]:
+        print(f"  legacy: {before}\n  engine: {after}")
+
+    if not args.no_ner:
+        report_name_recall(engine, corpus, names, args.show_diffs)
+
+
+if __name__ == "__main__":
+    main()
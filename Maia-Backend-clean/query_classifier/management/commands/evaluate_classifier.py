@@ -0,0 +1,114 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from core.utils.provider_registry_utils import get_provider_registry
+from query_classifier.services.category_index_service import CATEGORY_SHORTLIST_ENABLED, CATEGORY_SHORTLIST_TOP_K
+from query_classifier.services.prompt_asset_service import get_prompt_registry
+from query_classifier.services.evaluation_service import (
+    ClassifierEvaluation, EvaluationConfig, EVALUATION_RESULTS_DIR, LEVELS,
+    read_dataset, get_dataset_hash, get_results_path, load_results, save_results, list_results,
+)
+from core.utils.query_planner_utils import QUERY_PLANNER_ENABLED
+import json
+import os
+
+
+class Command(BaseCommand):
+    help = (
+        "Evaluate the text classifier in this process over a labelled CSV or Excel dataset. Reports accuracy at the "
+        "category, sub-category and sub-subcategory levels with latency, per-stage timings and token cost. Results "
+        "are saved per prompt version, dataset and pipeline options, and reused until the prompt assets change."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', help='CSV or Excel file with case_information, category, sub_category and sub_subcategory columns')
+        parser.add_argument('--workers', type=int, default=4, help='Cases classified concurrently')
+        parser.add_argument('--limit', type=int, help='Only evaluate the first N cases')
+        parser.add_argument('--shortlist', choices=['on', 'off'], help=f'Shortlist categories by embedding similarity, defaults to {"on" if CATEGORY_SHORTLIST_ENABLED else "off"}')
+        parser.add_argument('--shortlist-top-k', type=int, default=CATEGORY_SHORTLIST_TOP_K, help='Categories kept by the shortlist')
+        parser.add_argument('--query-planner', choices=['on', 'off'], help=f'Skip the summary of short single-question cases, defaults to {"on" if QUERY_PLANNER_ENABLED else "off"}')
+        parser.add_argument('--semantic-cache', action='store_true', help='Keep the semantic response cache, which is disabled by default so every case is classified')
+        parser.add_argument('--fake-providers', action='store_true', help='Use the fake OpenAI and in-memory vector store providers, to check the harness itself')
+        parser.add_argument('--refresh', action='store_true', help='Evaluate again even if results for this prompt version, dataset and options are saved')
+        parser.add_argument('--results-dir', default=EVALUATION_RESULTS_DIR, help='Directory of the saved results')
+        parser.add_argument('--compare', action='store_true', help='Also list the saved results of other options for this prompt version and dataset')
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+
+    def handle(self, *args, **options):
+        try:
+            cases = read_dataset(options['dataset'])
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Could not read {options['dataset']}: {e}")
+        if options['limit']:
+            cases = cases[:options['limit']]
+        if not cases:
+            raise CommandError(f"No labelled cases in {options['dataset']}")
+
+        if options['fake_providers']:
+            # Clients are created on first use, so the local stand-ins can still be selected here
+            settings.AI_PROVIDER, settings.VECTOR_STORE_PROVIDER = "fake", "memory"
+            get_provider_registry().reset()
+
+        config = EvaluationConfig(
+            shortlist_categories=options['shortlist'] == 'on' if options['shortlist'] else CATEGORY_SHORTLIST_ENABLED,
+            shortlist_top_k=options['shortlist_top_k'],
+            query_planner=options['query_planner'] == 'on' if options['query_planner'] else QUERY_PLANNER_ENABLED,
+            semantic_cache=options['semantic_cache'],
+        )
+        prompt_version = get_prompt_registry().get().version
+        dataset_hash = get_dataset_hash(cases)
+        # Results from fake providers say nothing about accuracy, so they are kept apart
+        results_dir = os.path.join(options['results_dir'], "fake") if options['fake_providers'] else options['results_dir']
+        path = get_results_path(prompt_version, dataset_hash, config, results_dir)
+
+        results = None if options['refresh'] else load_results(path)
+        if results is not None:
+            self.stdout.write(f"Using saved results from {path}, pass --refresh to evaluate again")
+        else:
+            self.stdout.write(f"Evaluating {len(cases)} cases with {config.get_name()}, prompt version {prompt_version}, {options['workers']} workers")
+            evaluation = ClassifierEvaluation(cases, config, options['workers'])
+            results = evaluation.run(on_progress=self.print_progress)
+            save_results(path, results)
+
+        if options['json']:
+            self.stdout.write(json.dumps({key: value for key, value in results.items() if key != "predictions"}, indent=2))
+        else:
+            self.print_summary(results)
+        if options['compare']:
+            self.print_comparison(list_results(prompt_version, dataset_hash, results_dir))
+        self.stdout.write(f"Results saved to {path}")
+
+    def print_progress(self, done: int, total: int) -> None:
+        if done % 10 == 0 or done == total:
+            self.stdout.write(f"  {done}/{total} cases")
+
+    def print_summary(self, results):
+        self.stdout.write(f"\n{results['config']['name']}: {results['cases']} cases, {results['errors']} errors, {results['cases_per_second']} cases/s")
+        for level in LEVELS:
+            accuracy = results['accuracy'][level]
+            value = f"{accuracy['accuracy'] * 100:.1f}%" if accuracy['accuracy'] is not None else "-"
+            self.stdout.write(f"  {level:<18} {value:>7}  ({accuracy['correct']}/{accuracy['total']})")
+
+        latency = results['latency_ms']
+        if latency['count']:
+            self.stdout.write(f"  latency ms         p50 {latency['p50']}  p95 {latency['p95']}  p99 {latency['p99']}")
+        for stage, timings in results['stages_ms'].items():
+            self.stdout.write(f"    {stage:<16} p50 {timings['p50']}  p95 {timings['p95']}")
+
+        tokens = results['tokens']
+        if tokens is None:
+            self.stdout.write("  tokens             not recorded, METRICS_ENABLED is false")
+        else:
+            self.stdout.write(f"  tokens             {tokens['prompt']} prompt, {tokens['completion']} completion, {tokens['per_case']} per case, ${tokens['cost_per_1000_cases_usd']} per 1000 cases")
+            for stage, counts in tokens['stages'].items():
+                self.stdout.write(f"    {stage:<16} {counts['prompt']} prompt, {counts['completion']} completion")
+
+    def print_comparison(self, all_results):
+        self.stdout.write(f"\n{'options':<32} {'category':>9} {'sub':>7} {'subsub':>7} {'p50 ms':>8} {'p95 ms':>8} {'$/1000':>8}")
+        for results in all_results:
+            accuracies = [results['accuracy'][level]['accuracy'] for level in LEVELS]
+            cost = results['tokens']['cost_per_1000_cases_usd'] if results['tokens'] else None
+            self.stdout.write(
+                f"{results['config']['name']:<32} "
+                + " ".join(f"{accuracy * 100:>{width}.1f}" if accuracy is not None else f"{'-':>{width}}" for accuracy, width in zip(accuracies, (9, 7, 7)))
+                + f" {results['latency_ms'].get('p50', '-'):>8} {results['latency_ms'].get('p95', '-'):>8} {cost if cost is not None else '-':>8}"
+            )
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from query_classifier.services.redact_service import RedactionEngine, warmup_redaction_engine
+from query_classifier.services.redaction_server_service import RedactionServer, REDACTION_SERVER_SOCKET
+import os
+
+REDACTION_SERVER_PROCESSES = int(os.getenv("REDACTION_SERVER_PROCESSES", "1"))
+
+
+class Command(BaseCommand):
+    help = (
+        "Load the redaction spaCy model once and serve name detection to the HTTP workers over a Unix socket. "
+        "Start the workers with the same REDACTION_SERVER_SOCKET so they use this server instead of loading the model."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--socket', default=REDACTION_SERVER_SOCKET, help='Path of the Unix socket, defaults to REDACTION_SERVER_SOCKET')
+        parser.add_argument('--processes', type=int, default=REDACTION_SERVER_PROCESSES, help='Server processes sharing the model, each handles one request at a time')
+
+    def handle(self, *args, **options):
+        if not options['socket']:
+            raise CommandError("Pass --socket or set REDACTION_SERVER_SOCKET")
+        if options['processes'] > 1 and not hasattr(os, "fork"):
+            raise CommandError("More than one process needs os.fork, which is not available on this platform")
+
+        # Loaded and run once before the socket is opened, so clients never wait on a cold model
+        engine = RedactionEngine(ner_policy="always")
+        warmup_redaction_engine(engine)
+
+        server = RedactionServer(options['socket'], engine)
+        self.stdout.write(f"Serving {engine.model_name} on {options['socket']} with {options['processes']} processes, press Ctrl+C to stop")
+        server.serve(options['processes'])
@@ -32,4 +32,25 @@ class CategoryExcelProcessorSerializer(serializers.Serializer):
         valid_extensions = ['.xls', '.xlsx']
         if ext.lower() not in valid_extensions:
             raise ValidationError("File is not in Excel format.")
-        return value
\ No newline at end of file
+        return value
+
+class BatchQueryClassifierSerializer(serializers.Serializer):
+    cases = serializers.ListField(child=serializers.CharField(), required=False)
+    file = serializers.FileField(required=False)
+    response_format = serializers.CharField(required=False)
+    response_template = serializers.CharField(required=False)
+    domain_knowledge = serializers.CharField(required=False)
+    past_responses = serializers.CharField(required=False)
+    extra_information = serializers.CharField(required=False)
+
+    def validate_file(self, value):
+        ext = os.path.splitext(value.name)[1]
+        valid_extensions = ['.csv', '.xlsx']
+        if ext.lower() not in valid_extensions:
+            raise ValidationError("File is not in CSV or Excel format.")
+        return value
+
+    def validate(self, data):
+        if bool(data.get('cases')) == bool(data.get('file')):
+            raise serializers.ValidationError("Provide either a list of cases or a file.")
+        return data
@@ -0,0 +1,217 @@
+from .openai_service import get_query_summary, get_classifier_completions, get_system_message
+from .redact_service import redact_texts
+from .prompt_asset_service import get_prompt_registry
+from .category_index_service import get_category_index, CATEGORY_SHORTLIST_ENABLED
+from .classifier_service import get_cache_namespace, get_cache_key, get_cache_entry, get_cached_response
+from core.utils.opensearch_utils import search_vector_db_batch
+from core.utils.openai_utils import get_embeddings
+from core.utils.semantic_cache_utils import get_semantic_cache, get_query_vector
+from ..utils.data_models import QueryRequest, QueryResponse, PromptAssets, BatchStats
+from concurrent.futures import ThreadPoolExecutor, Future, as_completed
+from dataclasses import asdict, replace
+from django.db import close_old_connections
+from typing import Any, Callable, Dict, IO, Iterator, List
+from pathlib import Path
+import contextvars
+import logging
+import copy
+import time
+import csv
+import io
+import os
+
+logger = logging.getLogger('django')
+
+CLASSIFIER_BATCH_SIZE = int(os.getenv("CLASSIFIER_BATCH_SIZE", "50"))
+CLASSIFIER_BATCH_CONCURRENCY = int(os.getenv("CLASSIFIER_BATCH_CONCURRENCY", "8"))
+CLASSIFIER_BATCH_MAX_CASES = int(os.getenv("CLASSIFIER_BATCH_MAX_CASES", "5000"))
+CASE_COLUMN = "case_information"
+
+Event = Dict[str, Any]
+
+
+def read_cases_file(file: IO[bytes], file_name: str) -> List[str]:
+    """
+    Reads case descriptions from a .csv or .xlsx file: the `case_information` column if the first row
+    names one, otherwise every row of the first column. Empty cells are skipped.
+    """
+    match Path(file_name).suffix.lower():
+        case ".csv":
+            rows = list(csv.reader(io.StringIO(file.read().decode('utf-8-sig'))))
+        case ".xlsx":
+            # Only needed for uploads, so it is not imported with the views
+            from openpyxl import load_workbook
+
+            workbook = load_workbook(filename=file, read_only=True)
+            try:
+                rows = [list(row) for row in workbook.worksheets[0].iter_rows(values_only=True)]
+            finally:
+                workbook.close()
+        case _:
+            raise ValueError("File is not in CSV or Excel format.")
+
+    column = 0
+    header = [str(value).strip().lower() if value is not None else "" for value in rows[0]] if rows else []
+    if CASE_COLUMN in header:
+        column = header.index(CASE_COLUMN)
+        rows = rows[1:]
+
+    cases = [str(row[column]).strip() for row in rows if len(row) > column and row[column] is not None]
+    return [case for case in cases if case]
+
+
+class BatchClassifier:
+    """
+    Classifies many cases with the same options, `batch_size` cases at a time.
+
+    Within a batch every stage runs once for all of its cases where the backend allows it: one redaction
+    call, one embedding call for the summarised queries of every case, one semantic cache lookup per case
+    and one multi-search over the distinct queries that missed the cache. Summaries and classifications
+    are LLM calls per distinct case, run on a pool of `concurrency` threads so the number of requests in flight
+    to OpenAI stays bounded however large the upload is.
+
+    `classify` yields a `result` or `error` event per case as soon as it is known, so results arrive out
+    of order and carry the index of the case, then a `batch` event with the batch's stats and finally a
+    `done` event with the totals. A case that fails does not stop the others.
+    """
+
+    def __init__(self, options: QueryRequest, shortlist_categories: bool = CATEGORY_SHORTLIST_ENABLED, batch_size: int = CLASSIFIER_BATCH_SIZE, concurrency: int = CLASSIFIER_BATCH_CONCURRENCY):
+        self.options = options
+        self.shortlist_categories = shortlist_categories
+        self.batch_size = max(batch_size, 1)
+        self.concurrency = max(concurrency, 1)
+
+    def classify(self, cases: List[str]) -> Iterator[Event]:
+        totals = BatchStats()
+        start_time = time.perf_counter()
+        batches = [cases[i:i + self.batch_size] for i in range(0, len(cases), self.batch_size)]
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="batch-classifier") as executor:
+            for batch_number, batch in enumerate(batches):
+                stats = BatchStats(cases=len(batch))
+                batch_start = time.perf_counter()
+                yield from self.classify_batch(batch, batch_number * self.batch_size, stats, executor)
+                stats.seconds = time.perf_counter() - batch_start
+                totals.add(stats)
+                logger.info(f"Classification batch {batch_number + 1}/{len(batches)} completed: {stats.to_json()}")
+                yield {"type": "batch", "batch": batch_number + 1, "batches": len(batches), **stats.to_json()}
+
+        totals.seconds = time.perf_counter() - start_time
+        logger.info(f"Batch classification of {totals.cases} cases completed: {totals.to_json()}")
+        yield {"type": "done", **totals.to_json()}
+
+    def classify_batch(self, cases: List[str], offset: int, stats: BatchStats, executor: ThreadPoolExecutor) -> Iterator[Event]:
+        # Cases are tracked by their redacted text, so repeated tickets are summarised and classified once
+        groups: Dict[str, List[int]] = {}
+        pending: List[str] = []
+
+        def fail(texts: List[str], stage: str, error: Exception) -> Iterator[Event]:
+            indices = [i for text in texts for i in groups[text]]
+            logger.error(f"Batch classification failed at {stage} for {len(indices)} cases: {error}")
+            stats.add_error(stage, len(indices))
+            for text in texts:
+                pending.remove(text)
+            for i in sorted(indices):
+                yield {"type": "error", "index": offset + i, "stage": stage, "error": type(error).__name__}
+
+        def succeed(text: str, query_response: QueryResponse, cached: bool) -> Iterator[Event]:
+            pending.remove(text)
+            for i in groups[text]:
+                if cached:
+                    stats.cached += 1
+                else:
+                    stats.classified += 1
+                yield self.result_event(offset + i, copy.deepcopy(query_response), cached)
+
+        try:
+            prompt_assets = get_prompt_registry().get()
+            # Nothing unredacted is sent to OpenAI, so if redaction fails the whole batch fails
+            redacted = redact_texts(cases)
+        except Exception as e:
+            redacted = None
+            redaction_error = e
+
+        for i, text in enumerate(redacted or cases):
+            groups.setdefault(text, []).append(i)
+        pending.extend(groups)
+        if redacted is None:
+            yield from fail(list(pending), "redaction", redaction_error)
+            return
+
+        query_lists: Dict[str, List[str]] = {}
+        futures = {self.submit(executor, get_query_summary, text): text for text in pending}
+        for future in as_completed(futures):
+            text = futures[future]
+            try:
+                query_lists[text] = future.result()
+            except Exception as e:
+                yield from fail([text], "summary", e)
+
+        try:
+            queries = [query for text in pending for query in query_lists[text]]
+            embeddings = dict(zip(queries, get_embeddings(queries)))
+        except Exception as e:
+            yield from fail(list(pending), "embeddings", e)
+            return
+
+        namespace = get_cache_namespace(self.options, prompt_assets, self.shortlist_categories)
+        semantic_cache = get_semantic_cache()
+        vectors = {}
+        for text in list(pending):
+            vectors[text] = get_query_vector([embeddings[query] for query in query_lists[text]])
+            cached = semantic_cache.get(namespace, vectors[text], get_cache_key(text))
+            if cached is not None:
+                yield from succeed(text, get_cached_response(self.get_query_data(text), cached), cached=True)
+
+        if not pending:
+            return
+
+        try:
+            # Cases in a queue often ask the same thing, each distinct query is searched once
+            contexts = search_vector_db_batch([query for text in pending for query in query_lists[text]])
+        except Exception as e:
+            yield from fail(list(pending), "retrieval", e)
+            return
+
+        futures = {}
+        for text in pending:
+            context = {query: contexts.get(query, []) for query in query_lists[text]}
+            futures[self.submit(executor, self.classify_case, text, query_lists[text], context, prompt_assets, vectors[text], namespace)] = text
+
+        for future in as_completed(futures):
+            text = futures[future]
+            try:
+                query_response = future.result()
+            except Exception as e:
+                yield from fail([text], "classification", e)
+                continue
+            yield from succeed(text, query_response, cached=False)
+
+    def classify_case(self, case_information: str, queries: List[str], context: Dict[str, Any], prompt_assets: PromptAssets, vector: Any, namespace: str) -> QueryResponse:
+        categories = get_category_index().shortlist(prompt_assets, queries) if self.shortlist_categories else None
+        query_response = get_classifier_completions(self.get_query_data(case_information), context, categories, prompt_assets)
+        cache_entry = get_cache_entry(query_response, context, get_system_message(prompt_assets, categories))
+        get_semantic_cache().set(namespace, vector, cache_entry, get_cache_key(case_information))
+        return query_response
+
+    def get_query_data(self, case_information: str) -> QueryRequest:
+        return replace(self.options, case_information=case_information, history=None)
+
+    def submit(self, executor: ThreadPoolExecutor, func: Callable[..., Any], *args: Any) -> Future:
+        # Each call runs in a copy of the request's context so its logs and metrics keep the trace ID
+        return executor.submit(contextvars.copy_context().run, self.run_in_worker, func, *args)
+
+    @staticmethod
+    def run_in_worker(func: Callable[..., Any], *args: Any) -> Any:
+        try:
+            return func(*args)
+        finally:
+            close_old_connections()
+
+    @staticmethod
+    def result_event(index: int, query_response: QueryResponse, cached: bool = False) -> Event:
+        return {"type": "result", "index": index, "cached": cached, "result": asdict(query_response)}
+
+
+def classify_batch(cases: List[str], options: QueryRequest, shortlist_categories: bool = CATEGORY_SHORTLIST_ENABLED) -> Iterator[Event]:
+    return BatchClassifier(options, shortlist_categories).classify(cases)
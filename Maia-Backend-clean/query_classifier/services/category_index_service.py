@@ -0,0 +1,91 @@
+from core.utils.openai_utils import get_embeddings
+from ..utils.data_models import PromptAssets
+from django.db import close_old_connections
+from typing import List, Optional
+import numpy as np
+import threading
+import logging
+import os
+
+logger = logging.getLogger('django')
+
+# Off until `evaluate_classifier --shortlist on --compare` shows its accuracy cost is acceptable
+CATEGORY_SHORTLIST_ENABLED = os.getenv("CATEGORY_SHORTLIST_ENABLED", "false").lower() == "true"
+CATEGORY_SHORTLIST_TOP_K = int(os.getenv("CATEGORY_SHORTLIST_TOP_K", "20"))
+
+
+class CategoryIndex:
+    """
+    Embeds every category path once and keeps the unit vectors in one in-process matrix, so a query
+    can be matched against the whole taxonomy with a single matrix product.
+
+    The index follows the prompt asset version and is rebuilt on a background thread when the
+    categories change. `shortlist` returns None until the index matches the current assets, and
+    callers fall back to the full category list.
+    """
+
+    def __init__(self, top_k: int = CATEGORY_SHORTLIST_TOP_K):
+        self.top_k = top_k
+        self.version: Optional[str] = None
+        self._categories: List[str] = []
+        self._matrix: Optional[np.ndarray] = None
+        self._building = threading.Lock()
+
+    def is_ready(self, prompt_assets: PromptAssets) -> bool:
+        if self.version == prompt_assets.version:
+            return True
+        self.build_in_background(prompt_assets)
+        return False
+
+    def build_in_background(self, prompt_assets: PromptAssets) -> None:
+        if not self._building.acquire(blocking=False):
+            return
+        threading.Thread(target=self._build, args=(prompt_assets,), name="category-index-build", daemon=True).start()
+
+    def build(self, prompt_assets: PromptAssets) -> None:
+        categories = list(prompt_assets.categories)
+        matrix = normalize(np.asarray(get_embeddings(categories), dtype=np.float32)) if categories else None
+
+        # Categories, matrix and version are swapped together so readers never see them out of step
+        self._categories, self._matrix, self.version = categories, matrix, prompt_assets.version
+        logger.info(f"Category index built for prompt version {prompt_assets.version} with {len(categories)} categories")
+
+    def _build(self, prompt_assets: PromptAssets) -> None:
+        try:
+            self.build(prompt_assets)
+        except Exception as e:
+            logger.error(f"Error building category index: {e}")
+        finally:
+            close_old_connections()
+            self._building.release()
+
+    def shortlist(self, prompt_assets: PromptAssets, queries: List[str], top_k: Optional[int] = None) -> Optional[List[str]]:
+        top_k = top_k or self.top_k
+        if len(prompt_assets.categories) <= top_k or not queries or not self.is_ready(prompt_assets):
+            return None
+
+        categories, matrix = self._categories, self._matrix
+        query_matrix = normalize(np.asarray(get_embeddings(queries), dtype=np.float32))
+        # A category's score is its best cosine similarity to any of the summarised queries
+        scores = (query_matrix @ matrix.T).max(axis=0)
+        top_indices = np.argpartition(-scores, top_k - 1)[:top_k]
+        top_indices = top_indices[np.argsort(-scores[top_indices])]
+        return [categories[i] for i in top_indices]
+
+
+def normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+_category_index: Optional[CategoryIndex] = None
+_category_index_lock = threading.Lock()
+
+
+def get_category_index() -> CategoryIndex:
+    global _category_index
+    if _category_index is None:
+        with _category_index_lock:
+            if _category_index is None:
+                _category_index = CategoryIndex()
+    return _category_index
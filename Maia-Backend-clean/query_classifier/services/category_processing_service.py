@@ -1,11 +1,13 @@
 from typing import Tuple
-import pandas as pd
 import os
 import logging
 
 logger = logging.getLogger("django")
 
 def process_excel(file_path: str) -> Tuple[bool, str]:
+    # pandas is only needed for category uploads, so it is not imported with the views
+    import pandas as pd
+
     try:
         df = pd.read_excel(file_path)
 
@@ -20,14 +22,13 @@ def process_excel(file_path: str) -> Tuple[bool, str]:
         logger.info("Excel file read successfully")
         
         categories_file = os.path.join('query_classifier', 'config', 'categories.csv')
-        if os.path.exists(categories_file):
-            with open(categories_file, 'w', encoding='utf-8') as f:
-                f.write("CATEGORIES\n")
-
-        categories_file = os.path.join('query_classifier', 'config', 'categories.csv')
-        with open(categories_file, 'a', encoding='utf-8') as f:
+        # Written to a temporary file and swapped in, so the prompt registry never reads a partial file
+        temp_file = f"{categories_file}.tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            f.write("CATEGORIES\n")
             for processed_value in processed_values:
                 f.write(f"{processed_value}\n")
+        os.replace(temp_file, categories_file)
                 
         logger.info("Categories written into CSV file successfully")
 
@@ -1,23 +1,91 @@
 from .openai_service import get_query_summary
-from core.utils.opensearch_utils import search_vector_db
-from .openai_service import get_classifier_completions
+from core.utils.opensearch_utils import search_vector_db_batch
+from core.utils.openai_utils import get_embeddings
+from core.utils.execution_graph_utils import ExecutionGraph
+from core.utils.semantic_cache_utils import get_semantic_cache, get_query_vector
+from .openai_service import get_classifier_completions, get_cached_classifier_response, get_prompt_history, get_system_message
 from .redact_service import redact_text
-from ..utils.data_models import QueryRequest, QueryResponse
+from .prompt_asset_service import get_prompt_registry
+from .category_index_service import get_category_index, CATEGORY_SHORTLIST_ENABLED
+from ..utils.data_models import QueryRequest, QueryResponse, PromptAssets
+from dataclasses import asdict
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+import hashlib
 import logging
+import json
 
 logger = logging.getLogger('django')
 
-def query_classifier(query_data: QueryRequest) -> QueryResponse:
-    query_data.case_information = redact_text(query_data.case_information)
-    
-    if query_data.history != None or query_data.history!=[]:
-        query_list = get_query_summary(query_data.case_information)
-    
-        contexts = {}
-        for summarised_query in query_list:
-            context = search_vector_db(summarised_query)
-            contexts[summarised_query] = context
-        
-    query_response = get_classifier_completions(query_data, contexts)
-    
-    return query_response
\ No newline at end of file
+CacheLookup = Tuple[Optional[np.ndarray], Optional[Dict[str, Any]]]
+
+def get_cache_namespace(query_data: QueryRequest, prompt_assets: PromptAssets, shortlist_categories: bool) -> str:
+    # Requests only share answers when everything besides the case text that reaches the prompt is identical
+    options = json.dumps([
+        query_data.response_format,
+        query_data.response_template,
+        query_data.domain_knowledge,
+        query_data.past_responses,
+        query_data.extra_information,
+    ])
+    options_hash = hashlib.sha256(options.encode('utf-8')).hexdigest()[:12]
+    # Shortlists of different sizes offer the model different categories, so their answers are not shared
+    shortlist = f"top{get_category_index().top_k}" if shortlist_categories else "all"
+    return f"classifier:{prompt_assets.version}:{shortlist}:{options_hash}"
+
+def get_cache_key(case_information: str) -> str:
+    # The title, description and suggested reply of an answer describe its own case, so answers are only
+    # served again for the same redacted case text, never for a similar case from another customer
+    return hashlib.sha256(case_information.encode('utf-8')).hexdigest()
+
+def get_cache_entry(query_response: QueryResponse, context, system_message: str) -> Dict[str, Any]:
+    # The log is left out, responses served from the cache get one built from their own request
+    answer = {key: value for key, value in asdict(query_response).items() if key != "log"}
+    return {"answer": answer, "context": context, "system_message": system_message}
+
+def get_cached_response(query_data: QueryRequest, cached: Dict[str, Any]) -> QueryResponse:
+    return get_cached_classifier_response(query_data, cached["system_message"], cached["context"], cached["answer"])
+
+def build_classifier_graph(query_data: QueryRequest, shortlist_categories: bool) -> ExecutionGraph:
+    def cache(case_information: str, prompt_assets: PromptAssets, embeddings: List[List[float]]) -> CacheLookup:
+        if query_data.history:
+            return None, None
+        vector = get_query_vector(embeddings)
+        return vector, get_semantic_cache().get(get_cache_namespace(query_data, prompt_assets, shortlist_categories), vector, get_cache_key(case_information))
+
+    def retrieval(query_list: List[str], cache_lookup: CacheLookup):
+        return search_vector_db_batch(query_list) if cache_lookup[1] is None else None
+
+    def shortlist(prompt_assets: PromptAssets, query_list: List[str], cache_lookup: CacheLookup) -> Optional[List[str]]:
+        if not shortlist_categories or cache_lookup[1] is not None:
+            return None
+        return get_category_index().shortlist(prompt_assets, query_list)
+
+    def classify(case_information: str, prompt_assets: PromptAssets, contexts, categories: Optional[List[str]], cache_lookup: CacheLookup, prompt_history: Optional[List[Tuple[str, str]]]) -> QueryResponse:
+        query_data.case_information = case_information
+        vector, cached = cache_lookup
+        if cached is not None:
+            return get_cached_response(query_data, cached)
+
+        query_response = get_classifier_completions(query_data, contexts, categories, prompt_assets, prompt_history)
+        if vector is not None:
+            cache_entry = get_cache_entry(query_response, contexts, get_system_message(prompt_assets, categories))
+            get_semantic_cache().set(get_cache_namespace(query_data, prompt_assets, shortlist_categories), vector, cache_entry, get_cache_key(case_information))
+        return query_response
+
+    graph = ExecutionGraph("query_classifier")
+    # Prompt assets load while the text is redacted; nothing unredacted is sent to OpenAI
+    graph.add_stage("redaction", lambda: redact_text(query_data.case_information))
+    graph.add_stage("prompt_assets", lambda: get_prompt_registry().get())
+    graph.add_stage("history", lambda: get_prompt_history(query_data.history) if query_data.history else None)
+    graph.add_stage("summary", get_query_summary, depends_on=["redaction"])
+    # Embedded once up front so the cache lookup, retrieval and the category shortlist all read them from the cache
+    graph.add_stage("embeddings", get_embeddings, depends_on=["summary"])
+    graph.add_stage("cache", cache, depends_on=["redaction", "prompt_assets", "embeddings"])
+    graph.add_stage("retrieval", retrieval, depends_on=["summary", "cache"])
+    graph.add_stage("shortlist", shortlist, depends_on=["prompt_assets", "summary", "cache"])
+    graph.add_stage("classification", classify, depends_on=["redaction", "prompt_assets", "retrieval", "shortlist", "cache", "history"])
+    return graph
+
+def query_classifier(query_data: QueryRequest, shortlist_categories: bool = CATEGORY_SHORTLIST_ENABLED) -> QueryResponse:
+    return build_classifier_graph(query_data, shortlist_categories).run()["classification"]
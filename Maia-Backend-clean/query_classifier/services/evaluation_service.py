@@ -0,0 +1,262 @@
+from .classifier_service import query_classifier
+from .prompt_asset_service import get_prompt_registry
+from .category_index_service import get_category_index, CATEGORY_SHORTLIST_ENABLED, CATEGORY_SHORTLIST_TOP_K
+from core.utils.benchmark_utils import StageRecorder, summarise, get_git_commit
+from core.utils.metrics_utils import get_metrics_registry, set_endpoint, set_trace_id, METRICS_ENABLED
+from core.utils.query_planner_utils import get_query_planner, QUERY_PLANNER_ENABLED
+from core.utils.semantic_cache_utils import get_semantic_cache
+from ..utils.data_models import LabelledCase, QueryRequest, QueryResponse
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+from datetime import datetime, timezone
+from django.db import close_old_connections
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from pathlib import Path
+import contextvars
+import hashlib
+import logging
+import json
+import time
+import csv
+import os
+
+logger = logging.getLogger('django')
+
+EVALUATION_RESULTS_DIR = os.getenv("EVALUATION_RESULTS_DIR", "evaluation_results")
+# US dollars per million tokens, defaults are the gpt-4o list prices
+EVALUATION_PROMPT_TOKEN_COST = float(os.getenv("EVALUATION_PROMPT_TOKEN_COST", "2.5"))
+EVALUATION_COMPLETION_TOKEN_COST = float(os.getenv("EVALUATION_COMPLETION_TOKEN_COST", "10"))
+EVALUATION_ENDPOINT = "evaluation"
+LEVELS = ["category", "sub_category", "sub_subcategory"]
+CASE_COLUMN = "case_information"
+
+
+@dataclass(frozen=True)
+class EvaluationConfig:
+    """Pipeline options that trade accuracy for speed; each combination is evaluated and cached separately."""
+    shortlist_categories: bool = CATEGORY_SHORTLIST_ENABLED
+    shortlist_top_k: int = CATEGORY_SHORTLIST_TOP_K
+    query_planner: bool = QUERY_PLANNER_ENABLED
+    semantic_cache: bool = False
+
+    def get_name(self) -> str:
+        parts = [
+            f"shortlist{self.shortlist_top_k}" if self.shortlist_categories else "fullcategories",
+            "planner" if self.query_planner else "summaries",
+        ]
+        if self.semantic_cache:
+            parts.append("cache")
+        return "-".join(parts)
+
+
+def read_dataset(file_path: str) -> List[LabelledCase]:
+    """
+    Reads labelled cases from a .csv or .xlsx file with a header row naming the columns `case_information`,
+    `category` and, optionally, `sub_category` and `sub_subcategory`. Rows without a case are skipped.
+    """
+    match Path(file_path).suffix.lower():
+        case ".csv":
+            with open(file_path, newline='', encoding='utf-8-sig') as dataset_file:
+                rows = list(csv.reader(dataset_file))
+        case ".xlsx":
+            from openpyxl import load_workbook
+
+            workbook = load_workbook(filename=file_path, read_only=True)
+            try:
+                rows = [list(row) for row in workbook.worksheets[0].iter_rows(values_only=True)]
+            finally:
+                workbook.close()
+        case _:
+            raise ValueError("Dataset is not in CSV or Excel format.")
+
+    if not rows:
+        return []
+    header = [str(value).strip().lower() if value is not None else "" for value in rows[0]]
+    missing = [column for column in (CASE_COLUMN, "category") if column not in header]
+    if missing:
+        raise ValueError(f"Dataset has no {', '.join(missing)} column")
+
+    def cell(row: List[Any], column: str) -> Optional[str]:
+        if column not in header:
+            return None
+        index = header.index(column)
+        value = row[index] if index < len(row) else None
+        return str(value).strip() if value is not None and str(value).strip() else None
+
+    cases = []
+    for row in rows[1:]:
+        case_information = cell(row, CASE_COLUMN)
+        if case_information:
+            cases.append(LabelledCase(case_information, cell(row, "category") or "", cell(row, "sub_category"), cell(row, "sub_subcategory")))
+    return cases
+
+
+def get_dataset_hash(cases: List[LabelledCase]) -> str:
+    return hashlib.sha256(json.dumps([asdict(case) for case in cases]).encode('utf-8')).hexdigest()[:12]
+
+
+def normalise_label(label: Optional[str]) -> str:
+    return " ".join((label or "").lower().split())
+
+
+def score_case(case: LabelledCase, query_response: QueryResponse) -> Dict[str, Optional[bool]]:
+    """
+    A level counts as correct only if it and every level above it match, since a sub-category under the
+    wrong category is still a misrouted ticket. Levels without an expected label are not scored.
+    """
+    scores = {}
+    correct = True
+    for level in LEVELS:
+        expected = normalise_label(getattr(case, level))
+        correct = correct and expected == normalise_label(getattr(query_response, level))
+        scores[level] = correct if expected else None
+    return scores
+
+
+def get_accuracy(predictions: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    accuracy = {}
+    for level in LEVELS:
+        scores = [prediction["scores"][level] for prediction in predictions if prediction.get("scores") and prediction["scores"][level] is not None]
+        correct = sum(scores)
+        accuracy[level] = {"correct": correct, "total": len(scores), "accuracy": round(correct / len(scores), 4) if scores else None}
+    return accuracy
+
+
+def get_token_counts() -> Dict[str, Dict[str, float]]:
+    counts: Dict[str, Dict[str, float]] = {}
+    for (endpoint, stage, token_type), value in get_metrics_registry().tokens.get_values().items():
+        if endpoint == EVALUATION_ENDPOINT:
+            counts.setdefault(stage, {"prompt": 0.0, "completion": 0.0})[token_type] = value
+    return counts
+
+
+def get_token_usage(before: Dict[str, Dict[str, float]], after: Dict[str, Dict[str, float]], cases: int) -> Dict[str, Any]:
+    stages = {
+        stage: {token_type: int(value - before.get(stage, {}).get(token_type, 0.0)) for token_type, value in counts.items()}
+        for stage, counts in after.items()
+    }
+    prompt_tokens = sum(counts["prompt"] for counts in stages.values())
+    completion_tokens = sum(counts["completion"] for counts in stages.values())
+    cost = (prompt_tokens * EVALUATION_PROMPT_TOKEN_COST + completion_tokens * EVALUATION_COMPLETION_TOKEN_COST) / 1_000_000
+    return {
+        "stages": stages,
+        "prompt": prompt_tokens,
+        "completion": completion_tokens,
+        "per_case": round((prompt_tokens + completion_tokens) / cases, 1) if cases else None,
+        "cost_usd": round(cost, 4),
+        "cost_per_1000_cases_usd": round(cost * 1000 / cases, 4) if cases else None,
+    }
+
+
+@contextmanager
+def configured(config: EvaluationConfig) -> Iterator[None]:
+    """Applies the options of `config` to the shared pipeline components, and restores them afterwards."""
+    planner, semantic_cache, category_index = get_query_planner(), get_semantic_cache(), get_category_index()
+    previous = (planner.enabled, semantic_cache.enabled, category_index.top_k)
+    planner.enabled, semantic_cache.enabled, category_index.top_k = config.query_planner, config.semantic_cache, config.shortlist_top_k
+    try:
+        yield
+    finally:
+        planner.enabled, semantic_cache.enabled, category_index.top_k = previous
+
+
+class ClassifierEvaluation:
+    """
+    Runs `query_classifier` in this process over labelled cases on a pool of `workers` threads, and reports
+    accuracy at each category level together with latency, per-stage timings and token cost.
+
+    Stage timings come from the reports of the classifier's execution graph and token counts from the
+    metrics registry, so they are the same numbers production requests record.
+    """
+
+    def __init__(self, cases: List[LabelledCase], config: EvaluationConfig, workers: int = 4):
+        self.cases = cases
+        self.config = config
+        self.workers = max(workers, 1)
+
+    def run(self, on_progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+        prompt_assets = get_prompt_registry().get()
+        if self.config.shortlist_categories and get_category_index().version != prompt_assets.version:
+            # Built up front, so early cases are not classified against the full list while it builds in the background
+            get_category_index().build(prompt_assets)
+
+        recorder = StageRecorder()
+        tokens_before = get_token_counts()
+        start_time = time.perf_counter()
+        with configured(self.config), ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="evaluation") as executor:
+            recorder.start()
+            try:
+                futures = [executor.submit(contextvars.copy_context().run, self.evaluate_case, index, case) for index, case in enumerate(self.cases)]
+                predictions = []
+                for future in futures:
+                    predictions.append(future.result())
+                    if on_progress:
+                        on_progress(len(predictions), len(self.cases))
+            finally:
+                recorder.stop()
+        seconds = time.perf_counter() - start_time
+
+        classified = [prediction for prediction in predictions if "error" not in prediction]
+        stages = recorder.summary().get("query_classifier", {}).get("stages", {})
+        return {
+            "prompt_version": prompt_assets.version,
+            "dataset": get_dataset_hash(self.cases),
+            "config": {"name": self.config.get_name(), **asdict(self.config)},
+            "commit": get_git_commit(),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "workers": self.workers,
+            "cases": len(self.cases),
+            "errors": len(self.cases) - len(classified),
+            "accuracy": get_accuracy(classified),
+            "latency_ms": summarise([prediction["latency_ms"] for prediction in classified]),
+            "cases_per_second": round(len(self.cases) / seconds, 2) if seconds > 0 else 0.0,
+            "stages_ms": stages,
+            "tokens": get_token_usage(tokens_before, get_token_counts(), len(classified)) if METRICS_ENABLED else None,
+            "predictions": predictions,
+        }
+
+    def evaluate_case(self, index: int, case: LabelledCase) -> Dict[str, Any]:
+        # Token counts are read from the metrics registry by this endpoint label, separately from live traffic
+        set_endpoint(EVALUATION_ENDPOINT)
+        set_trace_id(f"eval-{index}")
+        prediction: Dict[str, Any] = {"index": index, "expected": {level: getattr(case, level) for level in LEVELS}}
+        start_time = time.perf_counter()
+        try:
+            query_response = query_classifier(QueryRequest(case_information=case.case_information), self.config.shortlist_categories)
+        except Exception as e:
+            logger.error(f"Evaluation of case {index} failed: {e}")
+            prediction["error"] = str(e)
+            return prediction
+        finally:
+            close_old_connections()
+
+        prediction["latency_ms"] = round((time.perf_counter() - start_time) * 1000, 1)
+        prediction["predicted"] = {level: getattr(query_response, level) for level in LEVELS}
+        prediction["scores"] = score_case(case, query_response)
+        return prediction
+
+
+def get_results_path(prompt_version: str, dataset_hash: str, config: EvaluationConfig, results_dir: str = EVALUATION_RESULTS_DIR) -> str:
+    return os.path.join(results_dir, prompt_version, f"{dataset_hash}-{config.get_name()}.json")
+
+
+def load_results(path: str) -> Optional[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return None
+    with open(path) as results_file:
+        return json.load(results_file)
+
+
+def save_results(path: str, results: Dict[str, Any]) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as results_file:
+        json.dump(results, results_file, indent=2)
+
+
+def list_results(prompt_version: str, dataset_hash: str, results_dir: str = EVALUATION_RESULTS_DIR) -> List[Dict[str, Any]]:
+    """Cached results of every configuration evaluated on this dataset with this prompt version."""
+    directory = Path(results_dir) / prompt_version
+    if not directory.is_dir():
+        return []
+    return [load_results(str(path)) for path in sorted(directory.glob(f"{dataset_hash}-*.json"))]
@@ -1,45 +1,23 @@
 from langchain_core.prompts import ChatPromptTemplate
-from ..utils.data_models import QueryResponse, QueryRequest
+from ..utils.data_models import QueryResponse, QueryRequest, PromptAssets
 from core.utils.openai_utils import get_openai_llm_client
+from core.utils.query_planner_utils import get_query_planner
+from core.utils.chat_history_utils import get_history_manager
+from core.utils.metrics_utils import track_stage
+from .prompt_asset_service import get_prompt_registry, render_system_message
 from typing import List, Optional, Dict, Any, Tuple
 import logging
 import json
+import time
 import re
-import csv
-import os
 
 logger = logging.getLogger('django')
 
-def read_csv_file(file_type: str) -> List[str]:
-    file_name = ''
-    
-    if file_type == "website":
-        file_name = 'websites_kb.csv'
-    elif file_type == "category":
-        file_name = 'categories.csv'
-        
-    values = []
-    csv_file_path = os.path.join('query_classifier', 'config', file_name)
-    
-    with open(csv_file_path, 'r', encoding='utf-8') as file:
-        reader = csv.reader(file)
-        next(reader)
-        for row in reader:
-            values.append(row[0])
-    
-    return values
-
-def read_prompt_file() -> Optional[str]:
-    prompt_file_path = os.path.join('query_classifier', 'config', 'prompt.txt')
-
-    try:
-        with open(prompt_file_path, 'r', encoding='utf-8') as file:
-            chunk_of_text = file.read()
-            return chunk_of_text
-    except FileNotFoundError:
-        return None
-
 def get_query_summary(query: str) -> List[str]:
+    query_plan = get_query_planner().plan(query)
+    if not query_plan.needs_summary:
+        return query_plan.queries
+
     prompt = ChatPromptTemplate.from_messages(
         [
             (
@@ -53,11 +31,15 @@ def get_query_summary(query: str) -> List[str]:
     llm = get_openai_llm_client()
     chain = prompt | llm
     
-    response = chain.invoke(
-        {
-            "query": query,
-        }
-    )
+    start_time = time.perf_counter()
+    with track_stage("summarisation", query) as tracker:
+        response = chain.invoke(
+            {
+                "query": query,
+            }
+        )
+        tracker.record_usage(response.usage_metadata)
+    get_query_planner().record_summary(time.perf_counter() - start_time, response.usage_metadata)
     
     # format queries
     query_list = response.content.split("|")
@@ -79,6 +61,17 @@ def escape_characters(conversation: List[List[str]]) -> List[List[str]]:
         
     return conversation
 
+def get_prompt_history(history: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    # The system message with the categories is kept as it is, the conversation after it is compacted
+    pinned = [tuple(message) for message in history[:1] if message[0] == "system"]
+    compacted_history = get_history_manager().compact([{"role": role, "content": content} for role, content in history[len(pinned):]])
+
+    messages = list(pinned)
+    if compacted_history.summary:
+        messages += [tuple(message) for message in escape_characters([["system", f"Summary of the earlier conversation: {compacted_history.summary}"]])]
+    messages += [(turn["role"], turn["content"]) for turn in compacted_history.turns]
+    return messages
+
 def format_openai_response(openai_response: Dict[str, Any], messages: List[Tuple[str]], context: str, query: str) -> QueryResponse:
     
     case_title = openai_response.get("case_title", "Unknown")
@@ -118,24 +111,21 @@ def format_openai_response(openai_response: Dict[str, Any], messages: List[Tuple
     )
 
 
-def get_classifier_completions(query_data: QueryRequest,  context: Optional[List[str]] = None) -> QueryResponse:
-    delimiter = "####"
-    websites = read_csv_file("website")
-    categories = read_csv_file("category")
-    system_message = read_prompt_file()
-    
-    system_message = system_message.replace("{delimiter}", delimiter)
-    system_message = system_message.replace("{websites}", ", ".join(websites))
-    system_message = system_message.replace("{categories}", "\n".join(categories))
-    
-    openai_input = query_data.history if query_data.history else [("system", system_message)]
+def get_system_message(prompt_assets: PromptAssets, categories: Optional[List[str]] = None) -> str:
+    if categories:
+        # Only the shortlisted categories are offered to the model
+        return render_system_message(prompt_assets.prompt_template, categories)
+    return prompt_assets.system_message
+
+def get_classifier_input(query_data: QueryRequest, system_message: str, context: Optional[List[str]], prompt_history: Optional[List[Tuple[str, str]]]) -> Tuple[List[Tuple[str, str]], Dict[str, Any]]:
+    openai_input = list(prompt_history) if query_data.history else [("system", system_message)]
     
     input_list = ["CASE_INFORMATION: {case_information}"]
     openai_json_call = {"case_information": query_data.case_information}    
     
     if query_data.history:
         input_list.append("HISTORY: {history}")
-        openai_json_call["history"] = query_data.history
+        openai_json_call["history"] = prompt_history
 
     else:
         input_list.append("CONTEXT: {context}")
@@ -163,19 +153,38 @@ def get_classifier_completions(query_data: QueryRequest,  context: Optional[List
         openai_json_call["extra_information"] = query_data.extra_information
 
     openai_input.append(("user", ", ".join(input_list)))
+    return openai_input, openai_json_call
+
+def format_classifier_response(query_data: QueryRequest, openai_input: List[Tuple[str, str]], context: Optional[List[str]], openai_response: Dict[str, Any]) -> QueryResponse:
+    # The log keeps the full conversation, compaction only applies to what is sent to OpenAI
+    messages = (list(query_data.history) if query_data.history else openai_input[:1]) + openai_input[-1:]
+    return format_openai_response(openai_response, messages, json.dumps(context), query_data.case_information)
+
+def get_cached_classifier_response(query_data: QueryRequest, system_message: str, context: Optional[List[str]], openai_response: Dict[str, Any]) -> QueryResponse:
+    """Builds the response to a request from an answer cached for an earlier one, with a log of this request's messages."""
+    openai_input, _ = get_classifier_input(query_data, system_message, context, None)
+    return format_classifier_response(query_data, openai_input, context, openai_response)
+
+def get_classifier_completions(query_data: QueryRequest,  context: Optional[List[str]] = None, categories: Optional[List[str]] = None, prompt_assets: Optional[PromptAssets] = None, prompt_history: Optional[List[Tuple[str, str]]] = None) -> QueryResponse:
+    prompt_assets = prompt_assets or get_prompt_registry().get()
+    system_message = get_system_message(prompt_assets, categories)
     
-    context = json.dumps(context)
+    if query_data.history and prompt_history is None:
+        prompt_history = get_prompt_history(query_data.history)
+    openai_input, openai_json_call = get_classifier_input(query_data, system_message, context, prompt_history)
     
     prompt = ChatPromptTemplate.from_messages(openai_input)
     llm = get_openai_llm_client().with_structured_output(QueryResponse, method="json_mode")
 
     chain = prompt | llm
     
-    openai_response = chain.invoke(
-        openai_json_call
-    )
-    query_response = format_openai_response(openai_response, openai_input, context, query_data.case_information)
+    with track_stage("llm_generation", list(openai_json_call.values())) as tracker:
+        openai_response = chain.invoke(
+            openai_json_call,
+            config=tracker.callbacks(),
+        )
+    query_response = format_classifier_response(query_data, openai_input, context, openai_response)
     
-    logger.info("Classification completed by OpenAI")
+    logger.info(f"Classification completed by OpenAI with prompt version {prompt_assets.version} and {len(categories) if categories else len(prompt_assets.categories)} categories")
 
-    return query_response
\ No newline at end of file
+    return query_response
@@ -0,0 +1,142 @@
+from ..utils.data_models import PromptAssets
+from typing import List, Optional, Dict
+import threading
+import hashlib
+import logging
+import time
+import csv
+import os
+
+logger = logging.getLogger('django')
+
+PROMPT_CONFIG_DIR = os.path.join('query_classifier', 'config')
+PROMPT_ASSET_FILES = {
+    "prompt": 'prompt.txt',
+    "category": 'categories.csv',
+    "website": 'websites_kb.csv',
+}
+PROMPT_ASSET_CHECK_INTERVAL = float(os.getenv("PROMPT_ASSET_CHECK_INTERVAL", "5"))
+PROMPT_DELIMITER = "####"
+
+
+def read_csv_file(file_path: str) -> List[str]:
+    values = []
+    with open(file_path, 'r', encoding='utf-8') as file:
+        reader = csv.reader(file)
+        next(reader, None)
+        for row in reader:
+            if row:
+                values.append(row[0])
+    return values
+
+
+def read_prompt_file(file_path: str) -> str:
+    with open(file_path, 'r', encoding='utf-8') as file:
+        return file.read()
+
+
+def render_prompt_template(prompt: str, websites: List[str]) -> str:
+    prompt_template = prompt.replace("{delimiter}", PROMPT_DELIMITER)
+    return prompt_template.replace("{websites}", ", ".join(websites))
+
+
+def render_system_message(prompt_template: str, categories: List[str]) -> str:
+    return prompt_template.replace("{categories}", "\n".join(categories))
+
+
+class PromptAssetRegistry:
+    """
+    Holds the classifier's rendered system message, categories and websites. The prompt template is kept
+    with only `{categories}` left unrendered, for prompts built from a shortlist of categories.
+
+    Assets are loaded and rendered once, then swapped in as a whole when a file's mtime changes or
+    `invalidate` is called. Reloads run on a background thread, so requests keep getting the previous
+    snapshot until the new one is ready; only the very first load is waited on.
+    """
+
+    def __init__(self, config_dir: str = PROMPT_CONFIG_DIR, check_interval: float = PROMPT_ASSET_CHECK_INTERVAL):
+        self.config_dir = config_dir
+        self.check_interval = check_interval
+        self._assets: Optional[PromptAssets] = None
+        self._mtimes: Dict[str, Optional[int]] = {}
+        self._last_check = 0.0
+        self._load_lock = threading.Lock()
+        self._reloading = threading.Lock()
+
+    def get_path(self, asset: str) -> str:
+        return os.path.join(self.config_dir, PROMPT_ASSET_FILES[asset])
+
+    def get(self) -> PromptAssets:
+        assets = self._assets
+        if assets is None:
+            with self._load_lock:
+                if self._assets is None:
+                    self._load()
+            return self._assets
+
+        now = time.monotonic()
+        if now - self._last_check >= self.check_interval:
+            self._last_check = now
+            if self._get_mtimes() != self._mtimes:
+                self.reload_in_background()
+        return assets
+
+    def invalidate(self) -> None:
+        self.reload_in_background()
+
+    def reload_in_background(self) -> None:
+        # A reload already in progress will pick up the latest files, so a second one is not started
+        if not self._reloading.acquire(blocking=False):
+            return
+        threading.Thread(target=self._reload, name="prompt-asset-reload", daemon=True).start()
+
+    def _reload(self) -> None:
+        try:
+            with self._load_lock:
+                self._load()
+        except Exception as e:
+            logger.error(f"Error reloading classifier prompt assets, keeping version {self._assets.version if self._assets else None}: {e}")
+        finally:
+            self._reloading.release()
+
+    def _get_mtimes(self) -> Dict[str, Optional[int]]:
+        mtimes = {}
+        for asset in PROMPT_ASSET_FILES:
+            try:
+                mtimes[asset] = os.stat(self.get_path(asset)).st_mtime_ns
+            except FileNotFoundError:
+                mtimes[asset] = None
+        return mtimes
+
+    def _load(self) -> None:
+        mtimes = self._get_mtimes()
+        prompt = read_prompt_file(self.get_path("prompt"))
+        categories = read_csv_file(self.get_path("category"))
+        websites = read_csv_file(self.get_path("website"))
+        prompt_template = render_prompt_template(prompt, websites)
+        system_message = render_system_message(prompt_template, categories)
+
+        version = hashlib.sha256(system_message.encode('utf-8')).hexdigest()[:12]
+        self._assets = PromptAssets(
+            prompt_template=prompt_template,
+            system_message=system_message,
+            categories=categories,
+            websites=websites,
+            version=version,
+            loaded_at=time.time(),
+        )
+        self._mtimes = mtimes
+        logger.info(f"Classifier prompt assets loaded, version {version}, {len(categories)} categories")
+
+
+_prompt_registry: Optional[PromptAssetRegistry] = None
+_prompt_registry_lock = threading.Lock()
+
+
+def get_prompt_registry() -> PromptAssetRegistry:
+    global _prompt_registry
+    if _prompt_registry is None:
+        with _prompt_registry_lock:
+            if _prompt_registry is None:
+                _prompt_registry = PromptAssetRegistry()
+    return _prompt_registry
@@ -1,124 +1,231 @@
-from spacy.matcher import Matcher
-from typing import List, Tuple, Any
-import spacy
+from core.utils.metrics_utils import track_stage
+from core.utils.provider_registry_utils import get_provider_registry
+from .redaction_server_service import RedactionClient, REDACTION_SERVER_SOCKET
+from collections import Counter
+from typing import List, Tuple, Any, Dict, Optional, Iterable, TYPE_CHECKING
+import threading
+import logging
+import time
+import os
 import re
 
-nlp = spacy.load('en_core_web_trf')
-matcher = Matcher(nlp.vocab)
-
-def redact_phone_numbers(text: str) -> str:
-    def find_phone_numbers(text: str) -> List[Tuple[Any]]:
-        phone_numbers = []
-        temp_num_str = ""
-        temp_start = 0
-        
-        for i in range(len(text)):
-            ch = text[i]
-            if ch.isdigit() or ch in "+(":
-                if temp_num_str == "":
-                    temp_start = i
-                if ch.isdigit():
-                    temp_num_str += ch
-            elif ch in " -().":
-                continue
-            else:
-                if 7 <= len(temp_num_str) <= 15:
-                    phone_numbers.append((temp_start, i))
-                temp_num_str = ""
-        
-        if 7 <= len(temp_num_str) <= 15:
-            phone_numbers.append((temp_start, len(text)))
-        
-        return phone_numbers
-    
-    phone_numbers = find_phone_numbers(text)
-    phone_numbers.sort(reverse=True)
-    
-    for start, end in phone_numbers:
-        text = text[:start] + '[PHONE_NUMBER]' + text[end:]
-    
-    return text
-
-def redact_addresses(text: str) -> str:
-    def find_unit_numbers(text) -> List[Tuple[Any]]:
-        pattern = r'#\d{2}[-\s]?\d{1,3}'
-        matches = re.finditer(pattern, text)
-        result = [(match.start(), match.end()) for match in matches]
-        return result
-    
-    def find_postal_codes(text) -> List[Tuple[Any]]:
-        pattern = r'(Singapore\s\d{6})|(S\d{6})|(S\(\d{6}\))'
-        matches = re.finditer(pattern, text, re.IGNORECASE)
-        result = [(match.start(), match.end()) for match in matches]
-        return result
-    
-    matches = find_unit_numbers(text)
-    matches += find_postal_codes(text)
-        
-    matches.sort(reverse=True)
-    
-    for start, end in matches:
-        text = text[:start] + '[ADDRESS]' + text[end+1:]
-
-    return text
-
-
-def redact_entities_spacy(text: str) -> str:
-    patterns = {
-        'NAME': [
-            [
-                {'ENT_TYPE': 'PERSON'}
-            ]
-        ],
-        'NRIC': [
-            [
-                {"TEXT": {"REGEX": "^[sStT]\d{7}[a-zA-Z]$"}}
-            ]
-        ],
-        'PASSPORT': [
-            [
-                {"TEXT": {"REGEX": "^[eE]\\d{7}[a-zA-Z]$"}} # SG only
-            ]
-        ],
-        'EMAIL': [
-            [
-                {'LIKE_EMAIL': True}
-            ]
-        ],
-    }
-
-    for label, pattern in patterns.items():
-        matcher.add(label, pattern)
-
-    doc = nlp(text)
+if TYPE_CHECKING:
+    import spacy
+
+logger = logging.getLogger('django')
+
+REDACTION_SPACY_MODEL = os.getenv("REDACTION_SPACY_MODEL", "en_core_web_trf")
+REDACTION_BATCH_SIZE = int(os.getenv("REDACTION_BATCH_SIZE", "32"))
+REDACTION_N_PROCESS = int(os.getenv("REDACTION_N_PROCESS", "1"))
+# always: run NER on every text, auto: only when the text may contain a name, never: rules only.
+# Measure the recall of "auto" against "always" with custom_tests/redaction_benchmark.py before enabling it
+REDACTION_NER_POLICY = os.getenv("REDACTION_NER_POLICY", "always")
+# Only the transformer and NER are needed to find names, the rest of the pipeline is never loaded
+REDACTION_EXCLUDED_PIPES = ["tagger", "parser", "attribute_ruler", "lemmatizer", "senter"]
+
+# Alternatives are tried in order at each position, so identifiers win over the looser phone number rule
+RULE_PATTERN = re.compile(r"""
+    (?P<EMAIL>(?<![\w.+-])[\w.+-]+@[\w-]+(?:\.[\w-]+)+)
+    | (?P<NRIC>\b[ST]\d{7}[A-Z]\b)
+    | (?P<PASSPORT>\bE\d{7}[A-Z]\b)                     # SG only
+    | (?P<UNIT_NUMBER>\#\d{2}[-\s]?\d{1,3})
+    | (?P<POSTAL_CODE>\bSingapore\s\d{6}\b|\bS\d{6}\b|\bS\(\d{6}\))
+    | (?P<PHONE_NUMBER>(?<!\w)(?:\+|(?P<PAREN>\())?\d(?:[\s\-().]*\d){6,14}(?!\d)(?(PAREN)\)?))
+""", re.IGNORECASE | re.VERBOSE)
+
+RULE_LABELS = {
+    'EMAIL': 'EMAIL',
+    'NRIC': 'NRIC',
+    'PASSPORT': 'PASSPORT',
+    'UNIT_NUMBER': 'ADDRESS',
+    'POSTAL_CODE': 'ADDRESS',
+    'PHONE_NUMBER': 'PHONE_NUMBER',
+}
+
+# Consecutive placeholders of these labels are collapsed into one, e.g. a first and last name
+MERGED_LABELS = {'NAME', 'ADDRESS'}
+
+# Cheap check for whether NER is worth running. It fails open: a title or introduction, any capitalised
+# word that is not a common sentence opener, wherever it is, or text with no capitals at all runs NER
+NAME_HINT_PATTERN = re.compile(r"(?i:\b(?:mr|mrs|ms|mdm|madam|miss|dr|name|named|called|this is|i am|i'm|speaking)\b)")
+CAPITALISED_WORD_PATTERN = re.compile(r"\b[A-Z][\w'-]*")
+SENTENCE_OPENERS = frozenset("""
+    a an the i i'm i've i'd i'll my me we our us you your he his him she her they their them it its
+    this that these those there here what when where why which who how whether if is are was were be
+    do does did can could would will should may might must have has had not no yes ok okay also and
+    but or so then please kindly thanks thank hello hi dear good regarding re for from to in on at
+    with about after before as since just customer caller member client user applicant enquiry query
+    request issue case complaint payout payment refund account
+""".split())
+
+DIGIT_PATTERN = re.compile(r'\d+')
+RULE_HINT_PATTERN = re.compile(r'[\d@]')
+
+Span = Tuple[int, int, str]
+
+
+def find_rule_spans(text: str) -> List[Span]:
+    # Every rule needs a digit or an @, most case descriptions have neither
+    if not RULE_HINT_PATTERN.search(text):
+        return []
+    return [(match.start(), match.end(), RULE_LABELS[match.lastgroup]) for match in RULE_PATTERN.finditer(text)]
+
+
+def may_contain_name(text: str) -> bool:
+    if NAME_HINT_PATTERN.search(text):
+        return True
+    capitalised_words = CAPITALISED_WORD_PATTERN.findall(text)
+    if not capitalised_words:
+        # Without capitals there is nothing to tell a lowercase name from other words
+        return any(char.isalpha() for char in text)
+    return any(word.lower() not in SENTENCE_OPENERS for word in capitalised_words)
+
+
+def apply_redactions(text: str, spans: List[Span]) -> str:
+    """
+    Replaces every span with its placeholder and strips the remaining digits in a single join.
+    Overlapping spans keep the one that starts first (the longest, on a tie).
+    """
     redacted_text = []
     last_end = 0
+    last_label = None
+
+    for start, end, label in sorted(spans, key=lambda span: (span[0], -span[1])):
+        if start < last_end:
+            continue
 
-    matches = matcher(doc)
-    for match_id, start, end in matches:
-        label = nlp.vocab.strings[match_id]
-        redacted_text.append(doc[last_end:start].text)
-        redacted_text.append(f"[{label}]")
+        gap = DIGIT_PATTERN.sub('', text[last_end:start])
+        if not (label == last_label and label in MERGED_LABELS and not gap.strip()):
+            redacted_text.append(gap)
+            redacted_text.append(f"[{label}]")
         last_end = end
+        last_label = label
+
+    redacted_text.append(DIGIT_PATTERN.sub('', text[last_end:]))
+    return ''.join(redacted_text)
+
+
+class RedactionEngine:
+    """
+    Redacts personal information from single texts or batches.
+
+    Identifiers, emails, phone numbers and addresses are found by one compiled regex in a single scan.
+    The spaCy model is only loaded, and only run, for texts that may contain a name under the configured
+    `ner_policy`. With a `ner_client`, names are found by a redaction server and the model is never loaded
+    in this process. Time spent in each stage is accumulated and available from `get_stats`.
+    """
+
+    def __init__(self, model_name: str = REDACTION_SPACY_MODEL, batch_size: int = REDACTION_BATCH_SIZE, n_process: int = REDACTION_N_PROCESS, ner_policy: str = REDACTION_NER_POLICY, ner_client: Optional[RedactionClient] = None):
+        if ner_policy not in ("always", "auto", "never"):
+            raise ValueError(f"Unknown redaction NER policy: {ner_policy}")
 
-    redacted_text.append(doc[last_end:].text)
-    redacted_text = ''.join(redacted_text)
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.n_process = n_process
+        self.ner_policy = ner_policy
+        self.ner_client = ner_client
+        self._nlp = None
+        self._lock = threading.Lock()
+        self._timings = Counter()
+        self._counts = Counter()
 
-    return redacted_text
+    @property
+    def nlp(self) -> "spacy.language.Language":
+        if self._nlp is None:
+            with self._lock:
+                if self._nlp is None:
+                    # spaCy itself takes most of a second to import, so it is only imported with the model
+                    import spacy
 
-def combine_placeholders(text: str, placeholder: str) -> str:
-    cleaned_text = re.sub(rf'(\[{placeholder}\])(\s*\[{placeholder}\])+', rf'[{placeholder}]', text)
-    return cleaned_text
+                    start_time = time.perf_counter()
+                    self._nlp = spacy.load(self.model_name, exclude=REDACTION_EXCLUDED_PIPES)
+                    logger.info(f"Redaction engine loaded {self.model_name} with {self._nlp.pipe_names} in {time.perf_counter() - start_time:.2f}s")
+        return self._nlp
+
+    def needs_ner(self, text: str) -> bool:
+        if self.ner_policy == "always":
+            return True
+        if self.ner_policy == "never":
+            return False
+        return may_contain_name(text)
+
+    def find_name_spans(self, texts: List[str], batch_size: Optional[int] = None, n_process: Optional[int] = None) -> List[List[Span]]:
+        if self.ner_client is not None:
+            return self.ner_client.find_name_spans(texts)
+        docs = self.nlp.pipe(texts, batch_size=batch_size or self.batch_size, n_process=n_process or self.n_process)
+        return [[(ent.start_char, ent.end_char, 'NAME') for ent in doc.ents if ent.label_ == 'PERSON'] for doc in docs]
+
+    def redact(self, text: str) -> str:
+        return self.redact_many([text])[0]
+
+    def redact_many(self, texts: Iterable[str], batch_size: Optional[int] = None, n_process: Optional[int] = None) -> List[str]:
+        texts = list(texts)
+        if not texts:
+            return []
+
+        stage_start = time.perf_counter()
+        spans = [find_rule_spans(text) for text in texts]
+        ner_indices = [i for i, text in enumerate(texts) if self.needs_ner(text)]
+        rules_time = time.perf_counter() - stage_start
+
+        stage_start = time.perf_counter()
+        if ner_indices:
+            name_spans = self.find_name_spans([texts[i] for i in ner_indices], batch_size, n_process)
+            for i, text_name_spans in zip(ner_indices, name_spans):
+                spans[i].extend(text_name_spans)
+        ner_time = time.perf_counter() - stage_start
+
+        stage_start = time.perf_counter()
+        redacted = [apply_redactions(text, text_spans) for text, text_spans in zip(texts, spans)]
+        apply_time = time.perf_counter() - stage_start
+
+        with self._lock:
+            self._timings["rules"] += rules_time
+            self._timings["ner"] += ner_time
+            self._timings["apply"] += apply_time
+            self._counts["texts"] += len(texts)
+            self._counts["ner_texts"] += len(ner_indices)
+            self._counts["batches"] += 1
+        logger.debug(f"Redacted {len(texts)} texts, {len(ner_indices)} with NER: rules {rules_time:.3f}s, ner {ner_time:.3f}s, apply {apply_time:.3f}s")
+        return redacted
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._counts)
+            stats["seconds"] = {stage: round(seconds, 4) for stage, seconds in self._timings.items()}
+        texts = stats.get("texts", 0)
+        stats["ms_per_text"] = {stage: round(seconds * 1000 / texts, 3) for stage, seconds in stats["seconds"].items()} if texts else {}
+        return stats
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self._timings.clear()
+            self._counts.clear()
+
+
+def warmup_redaction_engine(engine: RedactionEngine) -> None:
+    # Runs the model once, so the first request does not pay for initialising its weights
+    if engine.ner_policy != "never":
+        engine.find_name_spans(["My name is John Tan."])
+
+
+def create_redaction_engine() -> RedactionEngine:
+    # With a redaction server, the workers share its model instead of each loading their own
+    ner_client = RedactionClient(REDACTION_SERVER_SOCKET) if REDACTION_SERVER_SOCKET else None
+    return RedactionEngine(ner_client=ner_client)
+
+
+get_provider_registry().register("redaction_engine", create_redaction_engine, warmup=warmup_redaction_engine)
+
+
+def get_redaction_engine() -> RedactionEngine:
+    return get_provider_registry().get("redaction_engine")
 
-def remove_digits(text: str) -> str:
-    return re.sub(r'\d+', '', text)
 
 def redact_text(text: str) -> str:
-    redacted_text_spacy = redact_entities_spacy(text)
-    redacted_text_wo_address = redact_addresses(redacted_text_spacy)
-    redacted_text_wo_phone_num = redact_phone_numbers(redacted_text_wo_address)
-    redacted_text_wo_digits = remove_digits(redacted_text_wo_phone_num)
-    final_redacted_text = combine_placeholders(redacted_text_wo_digits, 'NAME')
-    final_redacted_text = combine_placeholders(final_redacted_text, 'ADDRESS')
-
-    return final_redacted_text
+    with track_stage("redaction", text):
+        return get_redaction_engine().redact(text)
+
+def redact_texts(texts: List[str]) -> List[str]:
+    with track_stage("redaction", texts):
+        return get_redaction_engine().redact_many(texts)
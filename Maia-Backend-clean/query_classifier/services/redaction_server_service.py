@@ -0,0 +1,194 @@
+from typing import Any, Dict, List, Optional, Tuple
+import socketserver
+import gc
+import logging
+import socket
+import struct
+import signal
+import time
+import json
+import sys
+import os
+
+logger = logging.getLogger('django')
+
+REDACTION_SERVER_SOCKET = os.getenv("REDACTION_SERVER_SOCKET", "")
+REDACTION_SERVER_TIMEOUT = float(os.getenv("REDACTION_SERVER_TIMEOUT", "10"))
+HEADER = struct.Struct("!I")
+MAX_MESSAGE_BYTES = 64 * 1024 * 1024
+CHILD_RESTART_DELAY = 1.0
+
+Span = Tuple[int, int, str]
+
+
+class RedactionServerError(Exception):
+    pass
+
+
+def send_message(connection: socket.socket, message: Dict[str, Any]) -> None:
+    payload = json.dumps(message).encode('utf-8')
+    connection.sendall(HEADER.pack(len(payload)) + payload)
+
+
+def recv_exactly(connection: socket.socket, size: int) -> Optional[bytes]:
+    chunks = bytearray()
+    while len(chunks) < size:
+        chunk = connection.recv(size - len(chunks))
+        if not chunk:
+            return None
+        chunks.extend(chunk)
+    return bytes(chunks)
+
+
+def recv_message(connection: socket.socket) -> Optional[Dict[str, Any]]:
+    # Messages are length-prefixed JSON; None means the other side closed the connection
+    header = recv_exactly(connection, HEADER.size)
+    if header is None:
+        return None
+    (size,) = HEADER.unpack(header)
+    if size > MAX_MESSAGE_BYTES:
+        raise RedactionServerError(f"Message of {size} bytes exceeds the {MAX_MESSAGE_BYTES} byte limit")
+    payload = recv_exactly(connection, size)
+    if payload is None:
+        return None
+    return json.loads(payload)
+
+
+class RedactionClient:
+    """
+    Finds names through a redaction server over a Unix socket, instead of loading the spaCy model in this process.
+
+    Each request opens its own connection, which costs microseconds on a Unix socket and lets every server process
+    pick up the next request. Errors are raised rather than skipped, so a text is never sent on with its names unredacted.
+    """
+
+    def __init__(self, socket_path: str = REDACTION_SERVER_SOCKET, timeout: float = REDACTION_SERVER_TIMEOUT):
+        self.socket_path = socket_path
+        self.timeout = timeout
+
+    def find_name_spans(self, texts: List[str]) -> List[List[Span]]:
+        if not texts:
+            return []
+        response = self.request({"texts": texts})
+        return [[tuple(span) for span in text_spans] for text_spans in response["spans"]]
+
+    def request(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+                connection.settimeout(self.timeout)
+                connection.connect(self.socket_path)
+                send_message(connection, message)
+                response = recv_message(connection)
+        except (OSError, ValueError) as e:
+            raise RedactionServerError(f"Redaction server at {self.socket_path} failed: {e}") from e
+
+        if response is None:
+            raise RedactionServerError(f"Redaction server at {self.socket_path} closed the connection")
+        if "error" in response:
+            raise RedactionServerError(response["error"])
+        return response
+
+
+class RedactionRequestHandler(socketserver.BaseRequestHandler):
+    def handle(self) -> None:
+        try:
+            message = recv_message(self.request)
+        except (OSError, ValueError, RedactionServerError) as e:
+            logger.error(f"Redaction server could not read a request: {e}")
+            return
+        if message is None:
+            return
+
+        try:
+            response = {"spans": self.server.engine.find_name_spans(message["texts"])}
+        except Exception as e:
+            logger.error(f"Redaction server failed to find names: {e}")
+            response = {"error": str(e)}
+
+        try:
+            send_message(self.request, response)
+        except OSError as e:
+            logger.error(f"Redaction server could not send a response: {e}")
+
+
+class RedactionServer(socketserver.UnixStreamServer):
+    """
+    Serves name detection for the redaction engine over a Unix socket, so HTTP workers do not each load the model.
+
+    The model is loaded once, before `serve` forks the worker processes. The children share its memory
+    copy-on-write and accept connections from the same listening socket, so redaction capacity is set by the
+    number of server processes, independently of the number of HTTP workers. Each process handles one
+    request at a time, because spaCy pipelines are not safe to share between threads.
+    """
+
+    def __init__(self, socket_path: str, engine: Any):
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        super().__init__(socket_path, RedactionRequestHandler)
+        self.socket_path = socket_path
+        self.engine = engine
+        # Process IDs of the workers and when they were started
+        self.children: Dict[int, float] = {}
+
+    def serve(self, processes: int = 1) -> None:
+        if processes <= 1:
+            try:
+                self.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                self.server_close()
+            return
+
+        # Moves the loaded model out of the garbage collector's reach, so collections in the children do not
+        # write to, and so copy, the pages they share with the parent
+        gc.freeze()
+        for _ in range(processes):
+            self.start_child()
+
+        logger.info(f"Redaction server started {processes} processes on {self.socket_path}")
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        try:
+            while self.children:
+                pid, status = os.wait()
+                if pid not in self.children:
+                    continue
+                started_at = self.children.pop(pid)
+                # A worker killed for running out of memory, or by a crash in spaCy, is replaced so the
+                # server keeps its capacity; one that dies straight after starting is restarted more slowly
+                logger.error(f"Redaction server process {pid} exited with status {status}, starting a replacement")
+                if time.monotonic() - started_at < CHILD_RESTART_DELAY:
+                    time.sleep(CHILD_RESTART_DELAY)
+                self.start_child()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop_children()
+            self.server_close()
+
+    def start_child(self) -> int:
+        pid = os.fork()
+        if pid == 0:
+            # Children stop when the parent sends SIGTERM; Ctrl+C in a terminal is handled by the parent
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            try:
+                self.serve_forever()
+            finally:
+                os._exit(0)
+        self.children[pid] = time.monotonic()
+        return pid
+
+    def stop_children(self) -> None:
+        for pid in self.children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+                os.waitpid(pid, 0)
+            except (ProcessLookupError, ChildProcessError):
+                pass
+        self.children = {}
+
+    def server_close(self) -> None:
+        super().server_close()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
@@ -1,5 +1,5 @@
-from dataclasses import dataclass
-from typing import List, Optional
+from dataclasses import dataclass, field, asdict
+from typing import Any, Dict, List, Optional
 
 @dataclass
 class QueryRequest:
@@ -26,3 +26,50 @@ class QueryResponse:
     log: list
     
 
+@dataclass(frozen=True)
+class PromptAssets:
+    prompt_template: str
+    system_message: str
+    categories: List[str]
+    websites: List[str]
+    version: str
+    loaded_at: float
+
+
+@dataclass
+class LabelledCase:
+    case_information: str
+    category: str
+    sub_category: Optional[str] = None
+    sub_subcategory: Optional[str] = None
+
+
+@dataclass
+class BatchStats:
+    cases: int = 0
+    classified: int = 0
+    cached: int = 0
+    failed: int = 0
+    seconds: float = 0.0
+    errors: Dict[str, int] = field(default_factory=dict)
+
+    def add_error(self, stage: str, count: int = 1) -> None:
+        self.failed += count
+        self.errors[stage] = self.errors.get(stage, 0) + count
+
+    def add(self, other: "BatchStats") -> None:
+        self.cases += other.cases
+        self.classified += other.classified
+        self.cached += other.cached
+        self.failed += other.failed
+        for stage, count in other.errors.items():
+            self.errors[stage] = self.errors.get(stage, 0) + count
+
+    def get_throughput(self) -> float:
+        return round((self.classified + self.cached) / self.seconds, 2) if self.seconds > 0 else 0.0
+
+    def to_json(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["seconds"] = round(self.seconds, 3)
+        data["cases_per_second"] = self.get_throughput()
+        return data
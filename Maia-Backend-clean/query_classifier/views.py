@@ -3,20 +3,26 @@ from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
-from .serializers import TextQueryClassifierSerializer, AudioQueryClassifierSerializer, CategoryExcelProcessorSerializer
+from .serializers import TextQueryClassifierSerializer, AudioQueryClassifierSerializer, CategoryExcelProcessorSerializer, BatchQueryClassifierSerializer
 from .services.classifier_service import query_classifier
+from .services.batch_classifier_service import classify_batch, read_cases_file, CLASSIFIER_BATCH_MAX_CASES
 from rest_framework.views import APIView
 from rest_framework import status
 from rest_framework.response import Response
+from django.http import StreamingHttpResponse
+from asgiref.sync import sync_to_async
 from dataclasses import asdict
 from core.utils.openai_utils import get_transcription
 from .services import category_processing_service
+from .services.prompt_asset_service import get_prompt_registry
 from .utils.data_models import QueryRequest
 from rest_framework.permissions import IsAuthenticated
 from django.core.files.uploadedfile import UploadedFile
 from drf_yasg.utils import swagger_auto_schema
+from typing import Any, AsyncIterator, Dict, List
 import logging
 import tempfile
+import json
 import os
 
 logger = logging.getLogger('django')
@@ -138,8 +144,8 @@ class AudioQueryClassifierView(APIView):
             past_responses=serializer.validated_data.get('past_responses', None)
             extra_information=serializer.validated_data.get('extra_information', None)
             
-            file_path = self.save_audio_to_wav_file(audio_query)
-            text_query = get_transcription(file_path)
+            file_name = audio_query.name if os.path.splitext(audio_query.name or "")[1] else "audio.wav"
+            text_query = get_transcription((file_name, audio_query.read()))
             
             query_data = QueryRequest(
                 case_information=text_query,
@@ -156,15 +162,76 @@ class AudioQueryClassifierView(APIView):
         else:
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
-    def save_audio_to_wav_file(self, audio_data: UploadedFile) -> str:
-        temp_file = tempfile.NamedTemporaryFile(suffix='.wav', delete=False)
-        file_path = temp_file.name
+@method_decorator(csrf_exempt, name='dispatch')
+class BatchQueryClassifierView(APIView):
+    permission_classes = [IsAuthenticated]
 
-        with open(file_path, 'wb', encoding='utf-8') as f:
-            f.write(audio_data.read())
-            
-        logger.info("Audio file saved as temporary file")
-        return file_path
+    @swagger_auto_schema(
+        operation_description="Classify a list of text queries, or the `case_information` column (else the first column) of an uploaded CSV or Excel file, with the same options. Results are streamed as server-sent events: a `result` or `error` event per case with its index, in the order they finish, a `batch` event with the counts, errors and throughput of each batch, then a `done` event with the totals.",
+        request_body=BatchQueryClassifierSerializer,
+        responses={
+            200: openapi.Response(description="Event stream (text/event-stream)"),
+            400: openapi.Response(
+                description="Invalid request data",
+                schema=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        'error': openapi.Schema(type=openapi.TYPE_STRING, description='Error message')
+                    }
+                )
+            )
+        }
+    )
+    def post(self, request, *args, **kwargs):
+        serializer = BatchQueryClassifierSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        cases = serializer.validated_data.get('cases', None)
+        file = serializer.validated_data.get('file', None)
+        if file:
+            try:
+                cases = read_cases_file(file, file.name)
+            except Exception as e:
+                logger.error(f"Error reading cases file: {e}")
+                return Response({"error": "File could not be read."}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not cases:
+            return Response({"error": "No cases to classify."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(cases) > CLASSIFIER_BATCH_MAX_CASES:
+            return Response({"error": f"At most {CLASSIFIER_BATCH_MAX_CASES} cases can be classified per request."}, status=status.HTTP_400_BAD_REQUEST)
+
+        options = QueryRequest(
+            case_information="",
+            response_format=serializer.validated_data.get('response_format', None),
+            response_template=serializer.validated_data.get('response_template', None),
+            domain_knowledge=serializer.validated_data.get('domain_knowledge', None),
+            past_responses=serializer.validated_data.get('past_responses', None),
+            extra_information=serializer.validated_data.get('extra_information', None),
+        )
+
+        response = StreamingHttpResponse(self.stream_events(cases, options), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    async def stream_events(self, cases: List[str], options: QueryRequest) -> AsyncIterator[str]:
+        # The pipeline is synchronous; each event is pulled on a worker thread so the ASGI server can
+        # flush it as soon as it is produced instead of buffering the whole response
+        events = classify_batch(cases, options)
+        pull = sync_to_async(next, thread_sensitive=False)
+        try:
+            while (event := await pull(events, None)) is not None:
+                yield self.format_event(event)
+        except Exception as e:
+            logger.error(f"Error streaming batch classification: {e}")
+            yield self.format_event({"type": "error", "error": "An error has occurred."})
+        finally:
+            # Stops the remaining batches if the client disconnects
+            await sync_to_async(events.close, thread_sensitive=False)()
+
+    def format_event(self, event: Dict[str, Any]) -> str:
+        return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
 
 class CategoryExcelProcessorView(APIView):
     permission_classes = [IsAuthenticated]
@@ -212,6 +279,7 @@ class CategoryExcelProcessorView(APIView):
             
             success, message = category_processing_service.process_excel(file_path)
             if success:
+                get_prompt_registry().invalidate()
                 return Response({"message": message, "file_path": file_path}, status=status.HTTP_200_OK)
             else:
                 return Response({"error": message}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -1,29 +1,190 @@
-from .openai_service import get_llm_response, get_query_summary
-from core.utils.opensearch_utils import search_vector_db
-from typing import List, Any, Dict
+from .openai_service import get_llm_response, get_query_summary, aget_llm_response, aget_query_summary, astream_llm_response
+from core.utils.opensearch_utils import search_vector_db_batch, asearch_vector_db_batch
+from core.utils.execution_graph_utils import ExecutionGraph
+from core.utils.openai_utils import get_embeddings, aget_embeddings
+from core.utils.semantic_cache_utils import get_semantic_cache, get_query_vector
+from core.utils.chat_history_utils import get_history_manager, CompactedHistory
+from typing import List, Any, Dict, Tuple, Optional, AsyncIterator
+import numpy as np
 import logging
+import time
 
 logger = logging.getLogger('django')
 
+Contexts = Dict[str, List[Tuple[int, str]]]
+# Query vector and cached answer; the vector is None when the conversation is not cacheable
+CacheLookup = Tuple[Optional[np.ndarray], Optional[Dict[str, Any]]]
+
+
+def get_missing_queries(query_list: List[str], prefetched: Contexts) -> List[str]:
+    return [query for query in query_list if query not in prefetched]
+
+
+def merge_contexts(query_list: List[str], retrieved: Contexts, prefetched: Contexts) -> Contexts:
+    """
+    Contexts for each summarised query, plus any documents found for the raw message that none of
+    the summarised queries retrieved.
+    """
+    contexts = {query: retrieved[query] if query in retrieved else prefetched.get(query, []) for query in query_list}
+
+    seen_ids = {document_id for documents in contexts.values() for document_id, _ in documents}
+    for query, documents in prefetched.items():
+        extra_documents = [(document_id, content) for document_id, content in documents if document_id not in seen_ids]
+        if query not in contexts and extra_documents:
+            contexts[query] = extra_documents
+    return contexts
+
+
+def get_no_context_response(contexts: Contexts, call_assistant: bool) -> Optional[str]:
+    if len(contexts) == 0 and not call_assistant:
+        return "I'm sorry, but I don't have the information on that topic right now."
+    return None
+
+
+def get_cache_namespace(call_assistant: bool) -> str:
+    return f"chat:call_assistant={call_assistant}"
+
+
+def is_cacheable(chat_history: List[Dict[str, Any]], call_assistant: bool) -> bool:
+    # An answer also depends on earlier messages, which reach the cache key only through a lossy summary, so
+    # only opening questions are cached; a call assistant suggestion depends on the whole live transcript
+    return len(chat_history) == 1
+
+
+def build_chat_graph(chat_history: List[Dict[str, Any]], call_assistant: bool) -> ExecutionGraph:
+    graph = ExecutionGraph("chat")
+    if call_assistant:
+        graph.add_stage("summary", lambda: get_query_summary(chat_history))
+        graph.add_stage("prefetch", lambda: {})
+    else:
+        # The raw message is searched while it is being summarised
+        query_text = chat_history[-1]['content'].strip()
+        graph.add_stage("summary", lambda: get_query_summary(query_text))
+        graph.add_stage("prefetch", lambda: search_vector_db_batch([query_text]))
+    # Older turns are summarised to fit the prompt's token budget while the query is looked up
+    graph.add_stage("history", lambda: get_history_manager().compact(chat_history))
+
+    def cache(query_list: List[str]) -> CacheLookup:
+        if not is_cacheable(chat_history, call_assistant):
+            return None, None
+        vector = get_query_vector(get_embeddings(query_list))
+        return vector, get_semantic_cache().get(get_cache_namespace(call_assistant), vector)
+
+    def retrieval(query_list: List[str], prefetched: Contexts, cache_lookup: CacheLookup) -> Contexts:
+        if cache_lookup[1] is not None:
+            return {}
+        return merge_contexts(query_list, search_vector_db_batch(get_missing_queries(query_list, prefetched)), prefetched)
+
+    graph.add_stage("cache", cache, depends_on=["summary"])
+    graph.add_stage("retrieval", retrieval, depends_on=["summary", "prefetch", "cache"])
+    return graph
+
 
 def chat(chat_history: List[Dict[str, Any]], call_assistant: bool) -> str:
-        
+    def answer(query_list: List[str], contexts: Contexts, cache_lookup: CacheLookup, history: CompactedHistory) -> str:
+        vector, cached = cache_lookup
+        if cached is not None:
+            return cached["response"]
+
+        response = get_no_context_response(contexts, call_assistant) or get_llm_response(query_list, contexts, history.to_turns(), call_assistant)
+        if vector is not None:
+            get_semantic_cache().set(get_cache_namespace(call_assistant), vector, {"response": response, "context_ids": get_context_ids(contexts)})
+        return response
+
+    graph = build_chat_graph(chat_history, call_assistant)
+    graph.add_stage("answer", answer, depends_on=["summary", "retrieval", "cache", "history"])
+    return graph.run()["answer"]
+
+
+def build_async_chat_graph(chat_history: List[Dict[str, Any]], call_assistant: bool) -> ExecutionGraph:
+    graph = ExecutionGraph("achat")
     if call_assistant:
-        query_list = get_query_summary(chat_history)
-        
+        async def summary() -> List[str]:
+            return await aget_query_summary(chat_history)
+
+        async def prefetch() -> Contexts:
+            return {}
     else:
-        query_text = chat_history[-1]['content']
-        query_list = get_query_summary(query_text)
-    
-    contexts = {}
-    for summarised_query in query_list:
-        context = search_vector_db(summarised_query)
-        contexts[summarised_query] = context
+        query_text = chat_history[-1]['content'].strip()
 
-    if len(contexts) == 0 and not call_assistant:
-        response = "I'm sorry, but I don't have the information on that topic right now."
-        
-    if len(contexts) > 0 or call_assistant:
-        response = get_llm_response(query_list, contexts, chat_history, call_assistant)
-    
-    return response
+        async def summary() -> List[str]:
+            return await aget_query_summary(query_text)
+
+        async def prefetch() -> Contexts:
+            return await asearch_vector_db_batch([query_text])
+
+    async def history() -> CompactedHistory:
+        return await get_history_manager().acompact(chat_history)
+
+    async def cache(query_list: List[str]) -> CacheLookup:
+        if not is_cacheable(chat_history, call_assistant):
+            return None, None
+        vector = get_query_vector(await aget_embeddings(query_list))
+        return vector, await get_semantic_cache().aget(get_cache_namespace(call_assistant), vector)
+
+    async def retrieval(query_list: List[str], prefetched: Contexts, cache_lookup: CacheLookup) -> Contexts:
+        if cache_lookup[1] is not None:
+            return {}
+        return merge_contexts(query_list, await asearch_vector_db_batch(get_missing_queries(query_list, prefetched)), prefetched)
+
+    graph.add_stage("summary", summary)
+    graph.add_stage("prefetch", prefetch)
+    graph.add_stage("history", history)
+    graph.add_stage("cache", cache, depends_on=["summary"])
+    graph.add_stage("retrieval", retrieval, depends_on=["summary", "prefetch", "cache"])
+    return graph
+
+
+async def achat(chat_history: List[Dict[str, Any]], call_assistant: bool) -> str:
+    async def answer(query_list: List[str], contexts: Contexts, cache_lookup: CacheLookup, history: CompactedHistory) -> str:
+        vector, cached = cache_lookup
+        if cached is not None:
+            return cached["response"]
+
+        response = get_no_context_response(contexts, call_assistant) or await aget_llm_response(query_list, contexts, history.to_turns(), call_assistant)
+        if vector is not None:
+            get_semantic_cache().set(get_cache_namespace(call_assistant), vector, {"response": response, "context_ids": get_context_ids(contexts)})
+        return response
+
+    graph = build_async_chat_graph(chat_history, call_assistant)
+    graph.add_stage("answer", answer, depends_on=["summary", "retrieval", "cache", "history"])
+    return (await graph.arun())["answer"]
+
+
+def get_context_ids(contexts: Contexts) -> List[int]:
+    return list(dict.fromkeys(document_id for documents in contexts.values() for document_id, _ in documents))
+
+
+async def astream_chat(chat_history: List[Dict[str, Any]], call_assistant: bool) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Yields a `context` event with the retrieved document IDs, then a `token` event per chunk of the
+    answer as the model produces it, then a `done` event with the time to first token.
+    """
+    start_time = time.perf_counter()
+    results = await build_async_chat_graph(chat_history, call_assistant).arun()
+    query_list, contexts = results["summary"], results["retrieval"]
+    vector, cached = results["cache"]
+    yield {"type": "context", "ids": cached["context_ids"] if cached is not None else get_context_ids(contexts)}
+
+    first_token_time = None
+    if cached is not None:
+        first_token_time = time.perf_counter()
+        yield {"type": "token", "content": cached["response"]}
+    elif no_context_response := get_no_context_response(contexts, call_assistant):
+        first_token_time = time.perf_counter()
+        yield {"type": "token", "content": no_context_response}
+    else:
+        tokens = []
+        async for token in astream_llm_response(query_list, contexts, results["history"].to_turns(), call_assistant):
+            if first_token_time is None:
+                first_token_time = time.perf_counter()
+            tokens.append(token)
+            yield {"type": "token", "content": token}
+        if vector is not None:
+            get_semantic_cache().set(get_cache_namespace(call_assistant), vector, {"response": "".join(tokens), "context_ids": get_context_ids(contexts)})
+
+    end_time = time.perf_counter()
+    time_to_first_token_ms = round(((first_token_time or end_time) - start_time) * 1000, 1)
+    total_ms = round((end_time - start_time) * 1000, 1)
+    logger.info(f"Streamed chat response: time to first token {time_to_first_token_ms}ms, total {total_ms}ms")
+    yield {"type": "done", "time_to_first_token_ms": time_to_first_token_ms, "total_ms": total_ms}
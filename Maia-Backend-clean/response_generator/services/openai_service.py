@@ -1,14 +1,17 @@
 from core.utils.openai_utils import get_openai_llm_client
+from core.utils.query_planner_utils import get_query_planner
+from core.utils.metrics_utils import track_stage
 from langchain_core.prompts import ChatPromptTemplate
-from typing import List, Dict, Any
+from typing import List, Dict, Any, AsyncIterator
 import logging
 import json
+import time
 
 logger = logging.getLogger('django')
 
 
-def get_query_summary(query: str) -> List[str]:
-    prompt = ChatPromptTemplate.from_messages(
+def get_query_summary_prompt() -> ChatPromptTemplate:
+    return ChatPromptTemplate.from_messages(
         [
             (
                 "system",
@@ -18,22 +21,53 @@ def get_query_summary(query: str) -> List[str]:
         ]
     )
 
-    llm = get_openai_llm_client()
-    chain = prompt | llm
 
-    response = chain.invoke(
-        {
-            "query": query,
-        }
-    )
+def get_query_summary(query: str) -> List[str]:
+    query_plan = get_query_planner().plan(query)
+    if not query_plan.needs_summary:
+        return query_plan.queries
+
+    chain = get_query_summary_prompt() | get_openai_llm_client()
+
+    start_time = time.perf_counter()
+    with track_stage("summarisation", query) as tracker:
+        response = chain.invoke(
+            {
+                "query": query,
+            }
+        )
+        tracker.record_usage(response.usage_metadata)
+    get_query_planner().record_summary(time.perf_counter() - start_time, response.usage_metadata)
 
     query_list = response.content.split("|")
     logger.info("Summarisation of queries completed by OpenAI")
     return query_list
 
 
-def get_llm_response(query: str, contexts: Dict[str, Any], chat_history: List[Dict[str, Any]], call_assistant: bool) -> str:
-    prompt = ChatPromptTemplate.from_messages(
+async def aget_query_summary(query: str) -> List[str]:
+    query_plan = get_query_planner().plan(query)
+    if not query_plan.needs_summary:
+        return query_plan.queries
+
+    chain = get_query_summary_prompt() | get_openai_llm_client()
+
+    start_time = time.perf_counter()
+    with track_stage("summarisation", query) as tracker:
+        response = await chain.ainvoke(
+            {
+                "query": query,
+            }
+        )
+        tracker.record_usage(response.usage_metadata)
+    get_query_planner().record_summary(time.perf_counter() - start_time, response.usage_metadata)
+
+    query_list = response.content.split("|")
+    logger.info("Summarisation of queries completed by OpenAI")
+    return query_list
+
+
+def get_llm_response_prompt() -> ChatPromptTemplate:
+    return ChatPromptTemplate.from_messages(
         [
             (
                 "system",
@@ -82,20 +116,48 @@ def get_llm_response(query: str, contexts: Dict[str, Any], chat_history: List[Di
         ]
     )
 
+
+def get_llm_response_inputs(query: str, contexts: Dict[str, Any], chat_history: List[Dict[str, Any]], call_assistant: bool) -> Dict[str, Any]:
     contexts = json.dumps(contexts)
 
-    chat_history_str = json.dumps(chat_history, indent=4)
+    chat_history_str = json.dumps(chat_history)
 
-    llm = get_openai_llm_client()
-    chain = prompt | llm
+    return {
+        "query": query,
+        "context": contexts if len(contexts) > 0 else "",
+        "chat_history": chat_history_str,
+        "call_assistant": call_assistant,
+    }
 
-    response = chain.invoke(
-        {
-            "query": query,
-            "context": contexts if len(contexts) > 0 else "",
-            "chat_history": chat_history_str,
-            "call_assistant": call_assistant,
-        }
-    )
+
+def get_llm_response(query: str, contexts: Dict[str, Any], chat_history: List[Dict[str, Any]], call_assistant: bool) -> str:
+    chain = get_llm_response_prompt() | get_openai_llm_client()
+
+    inputs = get_llm_response_inputs(query, contexts, chat_history, call_assistant)
+    with track_stage("llm_generation", list(inputs.values())) as tracker:
+        response = chain.invoke(inputs)
+        tracker.record_usage(response.usage_metadata)
+
+    return response.content
+
+
+async def aget_llm_response(query: str, contexts: Dict[str, Any], chat_history: List[Dict[str, Any]], call_assistant: bool) -> str:
+    chain = get_llm_response_prompt() | get_openai_llm_client()
+
+    inputs = get_llm_response_inputs(query, contexts, chat_history, call_assistant)
+    with track_stage("llm_generation", list(inputs.values())) as tracker:
+        response = await chain.ainvoke(inputs)
+        tracker.record_usage(response.usage_metadata)
 
     return response.content
+
+
+async def astream_llm_response(query: str, contexts: Dict[str, Any], chat_history: List[Dict[str, Any]], call_assistant: bool) -> AsyncIterator[str]:
+    # OpenAI only reports token usage for streams when asked to
+    chain = get_llm_response_prompt() | get_openai_llm_client().bind(stream_options={"include_usage": True})
+
+    inputs = get_llm_response_inputs(query, contexts, chat_history, call_assistant)
+    with track_stage("llm_generation", list(inputs.values())) as tracker:
+        async for chunk in chain.astream(inputs, config=tracker.callbacks()):
+            if chunk.content:
+                yield chunk.content
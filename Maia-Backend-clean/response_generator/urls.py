@@ -1,6 +1,7 @@
 from django.urls import path, include
-from .views import ResponseGeneratorView
+from .views import ResponseGeneratorView, ResponseGeneratorStreamView
 
 urlpatterns = [
     path('chat/', ResponseGeneratorView.as_view(), name='chatbot response generator'),
+    path('chat/stream/', ResponseGeneratorStreamView.as_view(), name='chatbot response generator stream'),
 ]
\ No newline at end of file
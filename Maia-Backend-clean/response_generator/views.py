@@ -4,7 +4,9 @@ from django.utils.decorators import method_decorator
 from rest_framework.views import APIView
 from rest_framework import status
 from rest_framework.response import Response
-from .services.chat_service import chat
+from .services.chat_service import chat, astream_chat
+from django.http import StreamingHttpResponse
+from typing import List, Dict, Any, AsyncIterator
 from rest_framework.permissions import IsAuthenticated
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
@@ -58,4 +60,60 @@ class ResponseGeneratorView(APIView):
             
             return Response({'response': response}, status=status.HTTP_200_OK)
         except:
-            return Response({'response': 'An error has occurred.'}, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+            return Response({'response': 'An error has occurred.'}, status=status.HTTP_400_BAD_REQUEST)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class ResponseGeneratorStreamView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description="Stream a response based on chat history as server-sent events: a `context` event with the retrieved document IDs, `token` events as the answer is generated, then a `done` event with the time to first token.",
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                'chat_history': openapi.Schema(
+                    type=openapi.TYPE_ARRAY,
+                    items=openapi.Schema(type=openapi.TYPE_STRING),
+                    description="List of chat messages"
+                )
+            },
+            required=['chat_history']
+        ),
+        responses={
+            200: openapi.Response(description="Event stream (text/event-stream)"),
+            400: openapi.Response(
+                description="Invalid request data",
+                schema=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        'response': openapi.Schema(type=openapi.TYPE_STRING, description='Error message')
+                    }
+                )
+            )
+        }
+    )
+    def post(self, request, *args, **kwargs):
+        try:
+            data = json.loads(request.body)
+            chat_history = data["chat_history"]
+        except:
+            return Response({'response': 'An error has occurred.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        response = StreamingHttpResponse(self.stream_events(chat_history), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    async def stream_events(self, chat_history: List[Dict[str, Any]]) -> AsyncIterator[str]:
+        # An async iterator lets the ASGI server flush each event as soon as it is produced
+        try:
+            async for event in astream_chat(chat_history, False):
+                yield self.format_event(event)
+        except Exception as e:
+            logger.error(f"Error streaming chat response: {e}")
+            yield self.format_event({"type": "error", "response": "An error has occurred."})
+
+    def format_event(self, event: Dict[str, Any]) -> str:
+        return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+